@@ -1,3 +1,11 @@
+from .backend import (
+    BaseCacheBackend,
+    SqliteCacheBackend,
+    LogCacheBackend,
+    PickleDirCacheBackend,
+)
+from .lru import CacheStats, LRUCacheTier
+from .write_behind import WriteBehindQueue
 from .prompt_cache import PromptCache
 from .generator_cache import GeneratorCache
 from .metric_cache import MetricCache
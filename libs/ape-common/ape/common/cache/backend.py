@@ -0,0 +1,317 @@
+import os
+import pickle
+import sqlite3
+import struct
+from abc import ABC, abstractmethod
+from datetime import datetime
+from threading import Lock
+from typing import Any, Dict, Iterable, Iterator, Optional, Tuple
+
+
+class BaseCacheBackend(ABC):
+    """
+    Storage backend used by PromptCache, GeneratorCache and MetricCache.
+
+    A backend stores cache entries (plain dictionaries) under their hash key.
+    Implementations must support point reads, so that opening a cache does not
+    require reading every entry.
+    """
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        Read a single entry.
+
+        Args:
+            key (str): The hash key of the entry.
+
+        Returns:
+            Optional[Dict[str, Any]]: The stored entry, or None if it does not exist.
+        """
+        pass
+
+    @abstractmethod
+    def set(self, key: str, data: Dict[str, Any]) -> None:
+        """
+        Write a single entry, replacing any existing entry with the same key.
+
+        Args:
+            key (str): The hash key of the entry.
+            data (Dict[str, Any]): The entry to store.
+        """
+        pass
+
+    @abstractmethod
+    def __contains__(self, key: str) -> bool:
+        pass
+
+    @abstractmethod
+    def __len__(self) -> int:
+        pass
+
+    @abstractmethod
+    def items(self) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """Iterate over all stored (key, entry) pairs."""
+        pass
+
+    def set_many(self, items: Iterable[Tuple[str, Dict[str, Any]]]) -> None:
+        """
+        Write several entries. Backends that support transactions should override this
+        to commit all entries at once.
+        """
+        for key, data in items:
+            self.set(key, data)
+
+    def close(self) -> None:
+        """Release any resources held by the backend."""
+        pass
+
+
+class SqliteCacheBackend(BaseCacheBackend):
+    """
+    Cache backend storing all entries in a single SQLite database in WAL mode.
+
+    Opening the database is O(1) regardless of the number of entries, and lookups are
+    primary key point reads.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "hash TEXT PRIMARY KEY, created_at TEXT NOT NULL, data BLOB NOT NULL)"
+        )
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute("SELECT data FROM entries WHERE hash = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        return pickle.loads(row[0])
+
+    def set(self, key: str, data: Dict[str, Any]) -> None:
+        self.set_many([(key, data)])
+
+    def set_many(self, items: Iterable[Tuple[str, Dict[str, Any]]]) -> None:
+        timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
+        rows = [(key, timestamp, pickle.dumps(data)) for key, data in items]
+        if not rows:
+            return
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO entries (hash, created_at, data) VALUES (?, ?, ?)",
+                    rows,
+                )
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def __contains__(self, key: str) -> bool:
+        with self._lock:
+            row = self._conn.execute("SELECT 1 FROM entries WHERE hash = ?", (key,)).fetchone()
+        return row is not None
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+    def items(self) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        with self._lock:
+            rows = self._conn.execute("SELECT hash, data FROM entries").fetchall()
+        for key, data in rows:
+            yield key, pickle.loads(data)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class PickleDirCacheBackend(BaseCacheBackend):
+    """
+    Legacy cache backend writing one `{timestamp}-{hash}.pkl` file per entry.
+
+    The hash is recovered from the file name, so opening the directory only lists it
+    and entries are unpickled on demand.
+    """
+
+    def __init__(self, cache_dir: str):
+        self.cache_dir = cache_dir
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._lock = Lock()
+        self._files: Dict[str, str] = {}
+        for filename in os.listdir(self.cache_dir):
+            key = parse_pickle_filename(filename)
+            if key is not None:
+                self._files[key] = filename
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        filename = self._files.get(key)
+        if filename is None:
+            return None
+        with open(os.path.join(self.cache_dir, filename), "rb") as f:
+            return pickle.load(f)
+
+    def set(self, key: str, data: Dict[str, Any]) -> None:
+        timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
+        filename = f"{timestamp}-{key}.pkl"
+        with open(os.path.join(self.cache_dir, filename), "wb") as f:
+            pickle.dump(data, f)
+        with self._lock:
+            self._files[key] = filename
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._files
+
+    def __len__(self) -> int:
+        return len(self._files)
+
+    def items(self) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        for key in list(self._files):
+            data = self.get(key)
+            if data is not None:
+                yield key, data
+
+
+class LogCacheBackend(BaseCacheBackend):
+    """
+    Cache backend storing entries in an append-only log file.
+
+    Only a compact hash -> (offset, length) index is kept in memory; payloads are read
+    from disk with a positional read on lookup. Rewriting a key appends a new record,
+    and `compact()` drops superseded records.
+    """
+
+    _header = struct.Struct("<HI")
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = Lock()
+        # key -> (offset << 32) | length, packed to keep the index small
+        self._index: Dict[str, int] = {}
+        self._file = open(path, "a+b")
+        self._load_index()
+
+    def _load_index(self):
+        size = os.fstat(self._file.fileno()).st_size
+        offset = 0
+        fd = self._file.fileno()
+        while offset + self._header.size <= size:
+            key_len, data_len = self._header.unpack(os.pread(fd, self._header.size, offset))
+            data_offset = offset + self._header.size + key_len
+            if data_offset + data_len > size:
+                break
+            key = os.pread(fd, key_len, offset + self._header.size).decode()
+            self._index[key] = (data_offset << 32) | data_len
+            offset = data_offset + data_len
+        if offset < size:
+            # Drop a partially written trailing record
+            self._file.truncate(offset)
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        packed = self._index.get(key)
+        if packed is None:
+            return None
+        return pickle.loads(os.pread(self._file.fileno(), packed & 0xFFFFFFFF, packed >> 32))
+
+    def set(self, key: str, data: Dict[str, Any]) -> None:
+        self.set_many([(key, data)])
+
+    def set_many(self, items: Iterable[Tuple[str, Dict[str, Any]]]) -> None:
+        records = [(key.encode(), pickle.dumps(data)) for key, data in items]
+        if not records:
+            return
+        with self._lock:
+            self._file.seek(0, os.SEEK_END)
+            offset = self._file.tell()
+            chunks = []
+            for key_bytes, payload in records:
+                chunks.append(self._header.pack(len(key_bytes), len(payload)))
+                chunks.append(key_bytes)
+                chunks.append(payload)
+                data_offset = offset + self._header.size + len(key_bytes)
+                self._index[key_bytes.decode()] = (data_offset << 32) | len(payload)
+                offset = data_offset + len(payload)
+            self._file.write(b"".join(chunks))
+            self._file.flush()
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._index
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def items(self) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        for key in list(self._index):
+            data = self.get(key)
+            if data is not None:
+                yield key, data
+
+    def compact(self) -> None:
+        """Rewrite the log keeping only the latest record of each key."""
+        tmp_path = self.path + ".compact"
+        with self._lock:
+            fd = self._file.fileno()
+            new_index: Dict[str, int] = {}
+            offset = 0
+            with open(tmp_path, "wb") as out:
+                for key, packed in self._index.items():
+                    key_bytes = key.encode()
+                    payload = os.pread(fd, packed & 0xFFFFFFFF, packed >> 32)
+                    out.write(self._header.pack(len(key_bytes), len(payload)))
+                    out.write(key_bytes)
+                    out.write(payload)
+                    data_offset = offset + self._header.size + len(key_bytes)
+                    new_index[key] = (data_offset << 32) | len(payload)
+                    offset = data_offset + len(payload)
+            self._file.close()
+            os.replace(tmp_path, self.path)
+            self._file = open(self.path, "a+b")
+            self._index = new_index
+
+    def close(self) -> None:
+        with self._lock:
+            self._file.close()
+
+
+def parse_pickle_filename(filename: str) -> Optional[str]:
+    """Return the hash key encoded in a legacy `{timestamp}-{hash}.pkl` file name."""
+    if not filename.endswith(".pkl"):
+        return None
+    return filename[: -len(".pkl")].rsplit("-", 1)[-1]
+
+
+def has_pickle_files(cache_dir: str) -> bool:
+    """Check whether a directory contains legacy `*.pkl` cache entries."""
+    if not os.path.isdir(cache_dir):
+        return False
+    with os.scandir(cache_dir) as entries:
+        return any(entry.name.endswith(".pkl") for entry in entries)
+
+
+def create_backend(backend: str, cache_dir: str) -> BaseCacheBackend:
+    """
+    Create a backend by name.
+
+    Args:
+        backend (str): "sqlite", "log" or "pickle".
+        cache_dir (str): The cache directory.
+
+    Returns:
+        BaseCacheBackend: The created backend.
+    """
+    if backend == "sqlite":
+        return SqliteCacheBackend(os.path.join(cache_dir, "cache.db"))
+    if backend == "log":
+        return LogCacheBackend(os.path.join(cache_dir, "cache.log"))
+    if backend == "pickle":
+        return PickleDirCacheBackend(cache_dir)
+    raise ValueError(f"Unknown cache backend: {backend}")
@@ -0,0 +1,155 @@
+import os
+from typing import Any, Dict, Optional, Union
+from threading import Lock
+
+from ape.common.cache.backend import BaseCacheBackend, create_backend, has_pickle_files
+from ape.common.cache.lru import CacheStats, LRUCacheTier
+from ape.common.cache.write_behind import WriteBehindQueue
+from ape.common.utils import logger
+
+
+class BaseCache:
+    """
+    Singleton base class shared by PromptCache, GeneratorCache and MetricCache.
+
+    Entries are persisted through a pluggable BaseCacheBackend. By default all entries
+    of a cache live in a single SQLite database inside `cache_dir`; `backend="log"` keeps
+    only a hash -> offset index in memory and reads payloads from an append-only log.
+    In both cases outputs are loaded on demand, and only the most recently used ones are
+    kept in a bounded in-memory LRU tier. Writes go through a write-behind queue that
+    group-commits them from a background thread, so `set` never blocks the event loop.
+
+    Args:
+        cache_dir (Optional[str]): Directory of the cache. Defaults to `.cache/<name>`.
+        backend (Union[str, BaseCacheBackend]): "sqlite", "log", "pickle" or a backend instance.
+        memory_max_entries (Optional[int]): Maximum number of outputs held in memory.
+        memory_max_bytes (Optional[int]): Maximum total size of outputs held in memory.
+        write_behind (bool): Whether to persist entries asynchronously. Defaults to True.
+        flush_interval (float): Seconds between write-behind flushes. Defaults to 0.5.
+    """
+
+    _instance: Optional["BaseCache"] = None
+    _lock: Lock = Lock()
+    _default_dir_name: str = "cache"
+
+    def __new__(
+        cls,
+        cache_dir: Optional[str] = None,
+        backend: Union[str, BaseCacheBackend] = "sqlite",
+        memory_max_entries: Optional[int] = 10_000,
+        memory_max_bytes: Optional[int] = 64 << 20,
+        write_behind: bool = True,
+        flush_interval: float = 0.5,
+    ):
+        with cls._lock:
+            if cls._instance is None:
+                cls._instance = super().__new__(cls)
+                cls._instance._initialize(
+                    cache_dir,
+                    backend,
+                    memory_max_entries,
+                    memory_max_bytes,
+                    write_behind,
+                    flush_interval,
+                )
+        return cls._instance
+
+    def _initialize(
+        self,
+        cache_dir: Optional[str] = None,
+        backend: Union[str, BaseCacheBackend] = "sqlite",
+        memory_max_entries: Optional[int] = 10_000,
+        memory_max_bytes: Optional[int] = 64 << 20,
+        write_behind: bool = True,
+        flush_interval: float = 0.5,
+    ):
+        if cache_dir is None:
+            cache_dir = os.path.join(os.getcwd(), ".cache", self._default_dir_name)
+        self.cache_dir = cache_dir
+        os.makedirs(self.cache_dir, exist_ok=True)
+        if isinstance(backend, str):
+            is_new_store = backend == "sqlite" and not os.path.exists(
+                os.path.join(self.cache_dir, "cache.db")
+            )
+            if is_new_store and has_pickle_files(self.cache_dir):
+                logger.warning(
+                    f"Found legacy *.pkl entries in {self.cache_dir}. Import them with "
+                    f"`python -m ape.common.cache.migrate {self.cache_dir}`"
+                )
+            backend = create_backend(backend, self.cache_dir)
+        self.backend: BaseCacheBackend = backend
+        self.memory = LRUCacheTier(max_entries=memory_max_entries, max_bytes=memory_max_bytes)
+        self._stats = CacheStats()
+        self.write_queue: Optional[WriteBehindQueue] = (
+            WriteBehindQueue(self.backend, flush_interval=flush_interval) if write_behind else None
+        )
+        self._closed = False
+
+    @classmethod
+    def get_instance(cls):
+        return cls._instance
+
+    def _get(self, hash_key: str) -> Optional[Any]:
+        output = self.memory.get(hash_key)
+        if output is not None:
+            self._stats.memory_hits += 1
+            return output
+        data = self.write_queue.get(hash_key) if self.write_queue is not None else None
+        if data is None and not self._closed:
+            data = self.backend.get(hash_key)
+        if data is None or data.get("output") is None:
+            self._stats.misses += 1
+            return None
+        self._stats.disk_hits += 1
+        output = data["output"]
+        self.memory.set(hash_key, output)
+        return output
+
+    def _set(self, hash_key: str, data: Dict[str, Any]):
+        self.memory.set(hash_key, data["output"])
+        if self._closed:
+            logger.debug(f"Cache closed, not persisting entry {hash_key}")
+        elif self.write_queue is not None:
+            self.write_queue.put(hash_key, data)
+        else:
+            self.backend.set(hash_key, data)
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Get the hit, miss and eviction counters of the cache.
+
+        Returns:
+            Dict[str, int]: The counters, along with the current size of the memory tier.
+        """
+        self._stats.evictions = self.memory.evictions
+        return {
+            **self._stats.to_dict(),
+            "memory_entries": len(self.memory),
+            "memory_bytes": self.memory.size_bytes,
+        }
+
+    def __len__(self) -> int:
+        if self._closed:
+            # The backend cannot be read anymore, only the memory tier is left
+            return len(self.memory)
+        self.flush()
+        return len(self.backend)
+
+    def flush(self):
+        """Durably write all pending entries to the backend. Does nothing once closed."""
+        if self._closed:
+            return
+        if self.write_queue is not None:
+            self.write_queue.flush()
+
+    def close(self):
+        """
+        Flush pending entries and close the backend. Entries set afterwards are only kept
+        in memory.
+        """
+        if self._closed:
+            return
+        self._closed = True
+        if self.write_queue is not None:
+            self.write_queue.close()
+        self.backend.close()
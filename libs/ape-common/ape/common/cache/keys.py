@@ -0,0 +1,145 @@
+"""
+Canonical cache keys shared by PromptCache, GeneratorCache and MetricCache.
+
+Keys are computed by hashing a canonical JSON encoding (sorted keys, compact separators)
+of the key parts, so they do not depend on dict insertion order, pickle protocol,
+process or Python version.
+"""
+
+import dataclasses
+import datetime
+import enum
+import hashlib
+import json
+from typing import Any, Dict, List, Optional
+
+from pydantic import BaseModel
+
+
+def _json_default(obj: Any) -> Any:
+    if isinstance(obj, BaseModel):
+        return obj.model_dump(mode="json")
+    if isinstance(obj, type) and issubclass(obj, BaseModel):
+        return {"__model__": obj.__qualname__, "schema": obj.model_json_schema()}
+    if isinstance(obj, (set, frozenset)):
+        return sorted(canonical_json(item) for item in obj)
+    if isinstance(obj, bytes):
+        return obj.hex()
+    if isinstance(obj, enum.Enum):
+        return obj.value
+    if isinstance(obj, (datetime.date, datetime.time)):
+        return obj.isoformat()
+    if dataclasses.is_dataclass(obj) and not isinstance(obj, type):
+        return dataclasses.asdict(obj)
+    if hasattr(obj, "fingerprint"):
+        return obj.fingerprint()
+    # `str()` of an arbitrary object may embed its memory address and would give a key
+    # that never hits again, so unsupported types are an error
+    raise TypeError(f"Object of type {type(obj).__qualname__} cannot be used in a cache key")
+
+
+def _stringify_keys(obj: Any) -> Any:
+    if isinstance(obj, dict):
+        return {str(k): _stringify_keys(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_stringify_keys(v) for v in obj]
+    return obj
+
+
+_encoder = json.JSONEncoder(
+    sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=_json_default
+)
+
+
+def canonical_json(obj: Any) -> str:
+    """
+    Encode an object as canonical JSON.
+
+    Args:
+        obj (Any): The object to encode. Besides JSON types, pydantic models and classes,
+            sets, bytes, enums, dates, dataclasses and objects with a `fingerprint()` method
+            are supported.
+
+    Returns:
+        str: The canonical JSON string.
+
+    Raises:
+        TypeError: If the object contains a value of an unsupported type.
+    """
+    try:
+        return _encoder.encode(obj)
+    except TypeError:
+        # Dicts mixing key types cannot be sorted directly
+        return _encoder.encode(_stringify_keys(obj))
+
+
+def fast_hash(text: str) -> str:
+    """
+    Hash a string into a 32 character hex digest.
+
+    blake2b is used because it ships with the standard library on every platform, so the
+    keys of a persisted cache are the same whether or not an optional hashing package is
+    installed. It costs microseconds per key, far below the calls the keys cache.
+    """
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def hash_parts(*parts: Any) -> str:
+    """Hash the canonical JSON encoding of the given parts."""
+    return fast_hash(canonical_json(parts))
+
+
+def prompt_fingerprint(
+    model: Optional[str],
+    messages: List[Dict[str, Any]],
+    fewshot: Optional[List[Dict[str, Any]]] = None,
+    temperature: Optional[float] = None,
+    response_format: Any = None,
+) -> str:
+    """
+    Compute the content fingerprint of a prompt from the fields that affect generation.
+
+    Returns:
+        str: The fingerprint.
+    """
+    return hash_parts(model, messages, fewshot or [], temperature, response_format)
+
+
+def prompt_dump_fingerprint(prompt_dump: Dict[str, Any]) -> str:
+    """Compute the fingerprint of a prompt from its `model_dump()` dictionary."""
+    metadata = prompt_dump.get("metadata", {})
+    return prompt_fingerprint(
+        model=prompt_dump.get("model"),
+        messages=prompt_dump.get("messages", []),
+        fewshot=metadata.get("fewshot"),
+        temperature=metadata.get("temperature"),
+        response_format=metadata.get("response_format"),
+    )
+
+
+def _fingerprint_of(prompt: Any) -> str:
+    if hasattr(prompt, "fingerprint"):
+        return prompt.fingerprint()
+    if isinstance(prompt, dict) and "messages" in prompt:
+        return prompt_dump_fingerprint(prompt)
+    return hash_parts(prompt)
+
+
+def generator_key(prompt: Any, inputs: Dict[str, Any]) -> str:
+    """Cache key of a generator call. `prompt` may be a Prompt or its `model_dump()`."""
+    return hash_parts("generator", _fingerprint_of(prompt), inputs)
+
+
+def metric_key(dataset_item: Dict[str, Any], pred: Any) -> str:
+    """Cache key of a metric call."""
+    return hash_parts("metric", dataset_item, pred)
+
+
+def prompt_key(
+    prompt: Any,
+    lm_config: Dict[str, Any],
+    kwargs: Dict[str, Any],
+    parallel_task_id: int,
+) -> str:
+    """Cache key of a prompt call. `prompt` may be a Prompt or a list of messages."""
+    return hash_parts("prompt", _fingerprint_of(prompt), lm_config, kwargs, parallel_task_id)
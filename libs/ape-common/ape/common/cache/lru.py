@@ -0,0 +1,81 @@
+import pickle
+from collections import OrderedDict
+from dataclasses import dataclass, asdict
+from threading import Lock
+from typing import Any, Dict, Optional, Tuple
+
+
+@dataclass
+class CacheStats:
+    """Counters describing how a cache has been used."""
+
+    memory_hits: int = 0
+    disk_hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+
+    @property
+    def hits(self) -> int:
+        return self.memory_hits + self.disk_hits
+
+    def to_dict(self) -> Dict[str, int]:
+        return {**asdict(self), "hits": self.hits}
+
+
+class LRUCacheTier:
+    """
+    Bounded in-memory tier holding the most recently used cache outputs.
+
+    The tier is capped both by number of entries and by the approximate pickled size
+    of the stored outputs. Least recently used entries are evicted first.
+
+    Args:
+        max_entries (Optional[int]): Maximum number of entries. None means unbounded.
+        max_bytes (Optional[int]): Maximum total size in bytes. None means unbounded.
+    """
+
+    def __init__(self, max_entries: Optional[int] = 10_000, max_bytes: Optional[int] = 64 << 20):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.size_bytes = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[str, Tuple[Any, int]]" = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def set(self, key: str, value: Any, size: Optional[int] = None):
+        if size is None:
+            size = len(pickle.dumps(value))
+        if self.max_bytes is not None and size > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.size_bytes -= previous[1]
+            self._entries[key] = (value, size)
+            self.size_bytes += size
+            while self._entries and (
+                (self.max_entries is not None and len(self._entries) > self.max_entries)
+                or (self.max_bytes is not None and self.size_bytes > self.max_bytes)
+            ):
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.size_bytes -= evicted_size
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size_bytes = 0
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -0,0 +1,135 @@
+"""
+Import legacy one-file-per-entry cache directories into an indexed backend.
+
+Usage:
+    python -m ape.common.cache.migrate .cache/generator_cache [.cache/metric_cache ...]
+"""
+
+import argparse
+import os
+import pickle
+from typing import Callable, Iterator, List, Optional, Tuple, Dict, Any
+
+from ape.common.cache.backend import BaseCacheBackend, SqliteCacheBackend, parse_pickle_filename
+from ape.common.cache.generator_cache import GeneratorCache
+from ape.common.cache.metric_cache import MetricCache
+from ape.common.utils import logger
+
+# Legacy entries were keyed by an MD5 of their pickled inputs. Generator and metric entries
+# store enough of their inputs to recompute the canonical key; prompt entries do not.
+REKEY_FUNCTIONS: Dict[str, Callable[[Dict[str, Any]], str]] = {
+    "generator_cache": GeneratorCache.rekey,
+    "metric_cache": MetricCache.rekey,
+}
+
+
+def iter_pickle_dir(cache_dir: str) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """
+    Iterate over the entries of a legacy pickle cache directory.
+
+    Args:
+        cache_dir (str): The directory containing `{timestamp}-{hash}.pkl` files.
+
+    Yields:
+        Tuple[str, Dict[str, Any]]: The hash key and the unpickled entry.
+    """
+    with os.scandir(cache_dir) as entries:
+        filenames = sorted(entry.name for entry in entries if entry.name.endswith(".pkl"))
+    # Sorted by timestamp prefix, so the newest entry wins on duplicate hashes
+    for filename in filenames:
+        try:
+            with open(os.path.join(cache_dir, filename), "rb") as f:
+                data = pickle.load(f)
+        except Exception as e:
+            logger.warning(f"Skipping unreadable cache entry {filename}: {e}")
+            continue
+        key = data.get("hash") if isinstance(data, dict) else None
+        yield key or parse_pickle_filename(filename), data
+
+
+def migrate_pickle_dir(
+    cache_dir: str,
+    backend: Optional[BaseCacheBackend] = None,
+    batch_size: int = 1000,
+    rekey: Optional[Callable[[Dict[str, Any]], str]] = None,
+) -> int:
+    """
+    Import a legacy pickle cache directory into a backend.
+
+    Args:
+        cache_dir (str): The legacy cache directory.
+        backend (Optional[BaseCacheBackend]): The destination backend. Defaults to a
+            SqliteCacheBackend at `{cache_dir}/cache.db`.
+        batch_size (int): Number of entries written per transaction. Defaults to 1000.
+        rekey (Optional[Callable[[Dict[str, Any]], str]]): Optional function computing the
+            key of an entry from its payload. Defaults to the stored hash.
+
+    Returns:
+        int: The number of imported entries.
+    """
+    if backend is None:
+        backend = SqliteCacheBackend(os.path.join(cache_dir, "cache.db"))
+
+    count = 0
+    batch: List[Tuple[str, Dict[str, Any]]] = []
+    for key, data in iter_pickle_dir(cache_dir):
+        if rekey is not None:
+            try:
+                key = rekey(data)
+            except Exception as e:
+                logger.warning(f"Keeping the stored key of an entry that cannot be rekeyed: {e}")
+            data["hash"] = key
+        batch.append((key, data))
+        if len(batch) >= batch_size:
+            backend.set_many(batch)
+            count += len(batch)
+            batch = []
+    if batch:
+        backend.set_many(batch)
+        count += len(batch)
+    return count
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(
+        prog="python -m ape.common.cache.migrate",
+        description="Import legacy *.pkl cache directories into a single SQLite store.",
+    )
+    parser.add_argument("cache_dirs", nargs="+", help="Legacy cache directories to import.")
+    parser.add_argument(
+        "--delete", action="store_true", help="Delete the *.pkl files after a successful import."
+    )
+    parser.add_argument(
+        "--cache-type",
+        choices=["generator", "metric", "prompt"],
+        default=None,
+        help="Type of the cache, used to recompute keys. Inferred from the directory name.",
+    )
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args(argv)
+
+    for cache_dir in args.cache_dirs:
+        if args.cache_type is not None:
+            cache_name = f"{args.cache_type}_cache"
+        else:
+            cache_name = os.path.basename(os.path.normpath(cache_dir))
+        backend = SqliteCacheBackend(os.path.join(cache_dir, "cache.db"))
+        try:
+            count = migrate_pickle_dir(
+                cache_dir,
+                backend,
+                batch_size=args.batch_size,
+                rekey=REKEY_FUNCTIONS.get(cache_name),
+            )
+        finally:
+            backend.close()
+        print(f"{cache_dir}: imported {count} entries")
+        if args.delete:
+            with os.scandir(cache_dir) as entries:
+                for entry in entries:
+                    if entry.name.endswith(".pkl"):
+                        os.remove(entry.path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+import atexit
+from threading import Event, Lock, Thread
+from typing import Any, Dict, Optional
+
+from ape.common.cache.backend import BaseCacheBackend
+from ape.common.utils import logger
+
+
+class WriteBehindQueue:
+    """
+    Asynchronous write-behind buffer in front of a cache backend.
+
+    `put` only records the entry in memory and returns immediately, so cache writes never
+    block the event loop. A background thread group-commits pending entries to the
+    backend every `flush_interval` seconds, or as soon as `max_batch_size` entries are
+    pending. Pending entries are flushed on `flush()`, `close()` and interpreter exit, and
+    entries put after `close()` are dropped.
+
+    Args:
+        backend (BaseCacheBackend): The backend to write to.
+        flush_interval (float): Seconds between background flushes. Defaults to 0.5.
+        max_batch_size (int): Number of pending entries that triggers an early flush.
+            Defaults to 256.
+    """
+
+    def __init__(
+        self,
+        backend: BaseCacheBackend,
+        flush_interval: float = 0.5,
+        max_batch_size: int = 256,
+    ):
+        self.backend = backend
+        self.flush_interval = flush_interval
+        self.max_batch_size = max_batch_size
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        self._inflight: Dict[str, Dict[str, Any]] = {}
+        self._pending_lock = Lock()
+        self._write_lock = Lock()
+        self._wakeup = Event()
+        self._closed = False
+        self._thread = Thread(target=self._run, name="ape-cache-write-behind", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def put(self, key: str, data: Dict[str, Any]):
+        if self._closed:
+            # The backend is closed right after the queue, e.g. at interpreter exit
+            logger.debug(f"Cache write-behind queue closed, dropping entry {key}")
+            return
+        with self._pending_lock:
+            self._pending[key] = data
+            pending_count = len(self._pending)
+        if pending_count >= self.max_batch_size:
+            self._wakeup.set()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return an entry that has been accepted but not yet written to the backend."""
+        with self._pending_lock:
+            data = self._pending.get(key)
+            if data is None:
+                data = self._inflight.get(key)
+        return data
+
+    def __len__(self) -> int:
+        with self._pending_lock:
+            return len(self._pending) + len(self._inflight)
+
+    def _run(self):
+        while not self._closed:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Error flushing cache entries: {e}")
+
+    def flush(self):
+        """Write all pending entries to the backend and wait until they are committed."""
+        with self._write_lock:
+            with self._pending_lock:
+                if not self._pending:
+                    return
+                batch, self._pending = self._pending, {}
+                self._inflight = batch
+            try:
+                self.backend.set_many(batch.items())
+            except Exception:
+                with self._pending_lock:
+                    # Keep the entries so that a later flush can retry them
+                    self._pending = {**batch, **self._pending}
+                raise
+            finally:
+                with self._pending_lock:
+                    self._inflight = {}
+
+    def close(self):
+        """Flush pending entries and stop the background thread."""
+        if self._closed:
+            return
+        self._closed = True
+        self._wakeup.set()
+        if self._thread.is_alive():
+            self._thread.join(timeout=self.flush_interval + 5)
+        self.flush()
+        atexit.unregister(self.close)
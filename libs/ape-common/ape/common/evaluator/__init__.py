@@ -1,3 +1,3 @@
-from .evaluator import Evaluator
+from .evaluator import Evaluator, EvaluationStream
 
-__all__ = ["Evaluator"]
+__all__ = ["Evaluator", "EvaluationStream"]
@@ -1,15 +1,15 @@
 import sys
 import tqdm
-import asyncio
 import pandas as pd
-from typing import Any, Dict, List, Optional, Tuple, Union
+from typing import Any, AsyncIterable, AsyncIterator, Dict, Iterable, List, Optional, Tuple, Union
 
 from ape.common.generator import BaseGenerator, Generator
 from ape.common.metric import BaseMetric
-from ape.common.global_metric import BaseGlobalMetric, AverageGlobalMetric
+from ape.common.global_metric import BaseGlobalMetric, AverageGlobalMetric, GlobalMetricAccumulator
 from ape.common.types import MetricResult, GlobalMetricResult
 from ape.common.types.dataset_item import DatasetItem
 from ape.common.utils import logger
+from ape.common.utils.concurrency import AdaptiveConcurrencyLimiter, bounded_map
 from ape.common.prompt import Prompt
 
 try:
@@ -45,6 +45,12 @@ class Evaluator:
         self.max_errors = max_errors
         self.batch_size = batch_size
         self.return_only_score = return_only_score
+        # `batch_size` caps the window of the adaptive concurrency limiter. The window counts
+        # items, and a packing generator answers `pack_size` items per request
+        pack_size = getattr(self.generate, "pack_size", 1)
+        self.concurrency = AdaptiveConcurrencyLimiter(
+            initial_limit=min(16, batch_size) * pack_size, max_limit=batch_size * pack_size
+        )
 
         self.error_count = 0
         self.total_score = 0
@@ -74,9 +80,23 @@ class Evaluator:
         if testset is None:
             testset = self.testset
 
-        results: List[Tuple[Union[str, Dict[str, Any]], MetricResult]] = (
-            await self._process_testset(prompt, testset, disply_progress, batch_size, max_errors)
-        )
+        results: List[Optional[Tuple[Union[str, Dict[str, Any]], MetricResult]]] = []
+        self.total_score = 0
+        with tqdm.tqdm(
+            total=len(testset) if hasattr(testset, "__len__") else None,
+            disable=not disply_progress,
+            file=sys.stdout,
+            position=0,
+            leave=True,
+        ) as pbar:
+            async for index, prediction, result in self.stream(
+                prompt, testset, batch_size=batch_size, max_errors=max_errors
+            ):
+                if index >= len(results):
+                    results.extend([None] * (index + 1 - len(results)))
+                results[index] = (prediction, result)
+                self._update_progress(pbar, result.score)
+
         predictions = [result[0] for result in results]
         eval_results = [result[1] for result in results]
         global_result: GlobalMetricResult = await self.global_metric(eval_results)
@@ -89,58 +109,75 @@ class Evaluator:
         else:
             return predictions, eval_results, global_result
 
-    async def _process_testset(
+    def stream(
         self,
         prompt: Prompt,
-        testset: List[DatasetItem],
-        disply_progress: bool,
-        batch_size: int,
-        max_errors: int,
-    ) -> List[Tuple[Union[str, Dict[str, Any]], MetricResult]]:
-        async def process_item(
-            example: DatasetItem,
-        ) -> Tuple[Union[str, Dict[str, Any]], MetricResult]:
-            try:
-                inputs = example["inputs"]
-
-                prediction = await self.generate(prompt=prompt, inputs=inputs)
-                if not prediction:
-                    raise ValueError("Prediction is None")
-                result = await self.metric(dataset_item=example, pred=prediction)
-                return prediction, result
-            except Exception as e:
-                logger.error(f"Error processing example: {e}")
-                self.error_count += 1
-                if self.error_count >= max_errors:
-                    raise e
-                return "", MetricResult(score=0.0)
+        testset: Optional[Union[Iterable[DatasetItem], AsyncIterable[DatasetItem]]] = None,
+        batch_size: Optional[int] = None,
+        max_errors: Optional[int] = None,
+    ) -> "EvaluationStream":
+        """
+        Evaluate a prompt, yielding results as items complete.
 
-        with tqdm.tqdm(
-            total=len(testset),
-            disable=not disply_progress,
-            file=sys.stdout,
-            position=0,
-            leave=True,
-        ) as pbar:
-            tasks = [
-                self._bounded_process_item(process_item, item, pbar, batch_size) for item in testset
-            ]
-            results: List[Tuple[Union[str, Dict[str, Any]], MetricResult]] = await asyncio.gather(
-                *tasks
-            )
-            return results
+        Items are pulled lazily from `testset`, which can be any iterable or async iterable,
+        and nothing is kept per item, so large evaluations can be written out and aggregated
+        incrementally.
+
+        Example:
+            >>> stream = evaluator.stream(prompt, testset)
+            >>> async for index, prediction, result in stream:
+            ...     f.write(json.dumps({"index": index, "score": result.score}) + "\n")
+            >>> global_result = await stream.global_result()
+
+        Args:
+            prompt (Prompt): The prompt to evaluate.
+            testset (Optional[Union[Iterable[DatasetItem], AsyncIterable[DatasetItem]]]):
+                The items to evaluate. Defaults to the testset of the evaluator.
+            batch_size (Optional[int]): Maximum number of items in flight or waiting to be
+                consumed, times the pack size of a packing generator. Defaults to the batch
+                size of the evaluator.
+            max_errors (Optional[int]): Number of failed items after which the evaluation
+                is aborted. Defaults to the max_errors of the evaluator.
+
+        Returns:
+            EvaluationStream: An async iterator of `(index, prediction, MetricResult)` in
+                completion order, with a running GlobalMetricResult.
+        """
+        if testset is None:
+            testset = self.testset
+        if batch_size is None:
+            batch_size = self.batch_size
+        if max_errors is None:
+            max_errors = self.max_errors
+        return EvaluationStream(self, prompt, testset, batch_size, max_errors)
+
+    async def _process_item(
+        self,
+        prompt: Prompt,
+        example: DatasetItem,
+        max_errors: int,
+    ) -> Tuple[Union[str, Dict[str, Any]], MetricResult]:
+        try:
+            inputs = example["inputs"]
 
-    async def _bounded_process_item(self, process_func, item, pbar, batch_size):
-        async with asyncio.Semaphore(batch_size):
-            result = await process_func(item)
-            self._update_progress(pbar, result[1].score)
-            return result
+            prediction = await self.generate(prompt=prompt, inputs=inputs)
+            if not prediction:
+                raise ValueError("Prediction is None")
+            result = await self.metric(dataset_item=example, pred=prediction)
+            return prediction, result
+        except Exception as e:
+            logger.error(f"Error processing example: {e}")
+            self.error_count += 1
+            if self.error_count >= max_errors:
+                raise e
+            return "", MetricResult(score=0.0)
 
     def _update_progress(self, pbar, score: float):
         self.total_score += score
         pbar.n += 1
         average_score = self.total_score / pbar.n
         pbar.set_description(f"Average Metric: {average_score:.2f} ({100 * average_score:.1f}%)")
+        pbar.set_postfix(concurrency=self.concurrency.limit, refresh=False)
         pbar.refresh()
 
     def _display_results_table(
@@ -182,6 +219,70 @@ class Evaluator:
             ipython_display(HTML(message))
 
 
+class EvaluationStream:
+    """
+    Async iterator over the results of an evaluation, returned by `Evaluator.stream`.
+
+    Yields `(index, prediction, MetricResult)` tuples in completion order, where `index`
+    is the position of the item in the testset, and aggregates the results into a running
+    GlobalMetricResult available from `global_result()`.
+    """
+
+    def __init__(
+        self,
+        evaluator: Evaluator,
+        prompt: Prompt,
+        testset: Union[Iterable[DatasetItem], AsyncIterable[DatasetItem]],
+        batch_size: int,
+        max_errors: int,
+    ):
+        self.evaluator = evaluator
+        self.prompt = prompt
+        self.testset = testset
+        self.batch_size = batch_size
+        self.max_errors = max_errors
+        self.accumulator: GlobalMetricAccumulator = evaluator.global_metric.accumulator()
+        self._iterator: Optional[AsyncIterator] = None
+
+    @property
+    def count(self) -> int:
+        """Number of items completed so far."""
+        return self.accumulator.count
+
+    async def global_result(self) -> GlobalMetricResult:
+        """Get the global metric of the items completed so far."""
+        return await self.accumulator.result()
+
+    def __aiter__(self) -> AsyncIterator[Tuple[int, Union[str, Dict[str, Any]], MetricResult]]:
+        if self._iterator is None:
+            self._iterator = self._iterate()
+        return self._iterator
+
+    async def _iterate(self) -> AsyncIterator[Tuple[int, Union[str, Dict[str, Any]], MetricResult]]:
+        evaluator = self.evaluator
+        evaluator.error_count = 0
+
+        async def process_item(example: DatasetItem):
+            return await evaluator._process_item(self.prompt, example, self.max_errors)
+
+        # The limiter is shared by every evaluation of the evaluator, so the batch size of
+        # this stream caps its own items in flight rather than the shared window. As in
+        # `Evaluator.__init__`, a packing generator answers `pack_size` items per request
+        pack_size = getattr(evaluator.generate, "pack_size", 1)
+        results = bounded_map(
+            process_item,
+            self.testset,
+            evaluator.concurrency,
+            max_pending=self.batch_size * pack_size,
+        )
+        try:
+            async for index, (prediction, result) in results:
+                self.accumulator.add(result)
+                yield index, prediction, result
+        finally:
+            await results.aclose()
+
+
 def merge_dicts(d1: Dict, d2: Dict) -> dict:
     merged = {}
     for k, v in d1.items():
@@ -1,4 +1,14 @@
 from .base_generator import BaseGenerator
+from .batch import BaseBatchProvider, BatchQueue, LiteLLMBatchProvider, LocalFileBatchProvider
 from .generator import Generator
+from .packing_generator import PackingGenerator
 
-__all__ = ["BaseGenerator", "Generator"]
+__all__ = [
+    "BaseGenerator",
+    "Generator",
+    "PackingGenerator",
+    "BaseBatchProvider",
+    "BatchQueue",
+    "LiteLLMBatchProvider",
+    "LocalFileBatchProvider",
+]
@@ -8,10 +8,18 @@ from openai.types.chat.completion_create_params import ChatCompletionMessagePara
 from ape.common.prompt.prompt_base import Prompt
 from ape.common.types import MetricResult
 from ape.common.cache.generator_cache import GeneratorCache
+from ape.common.cache.keys import generator_key
 from ape.common.utils import logger
+from ape.common.utils.single_flight import SingleFlight
+
+_single_flight = SingleFlight("generator")
 
 
 class BaseGenerator(ABC):
+    # Number of dataset items answered per model request, evaluation loops scale their
+    # concurrency window by it
+    pack_size: int = 1
+
     @abstractmethod
     async def generate(
         self,
@@ -47,18 +55,36 @@ class BaseGenerator(ABC):
             MetricResult: An object containing the score and intermediate values.
         """
         cache = GeneratorCache.get_instance()
+        hash_key = generator_key(prompt, inputs)
         if cache:
-            cached_result = cache.get(prompt.model_dump(), inputs)
+            cached_result = cache.get(prompt, inputs, hash_key=hash_key)
             if cached_result:
                 # logger.debug("Cache hit on Generator")
                 return cached_result
 
+        # Concurrent identical calls on this generator share a single generation
+        return await _single_flight.do(
+            (id(self), hash_key), lambda: self._generate(prompt, inputs, cache, hash_key)
+        )
+
+    async def _generate(
+        self,
+        prompt: Prompt,
+        inputs: Dict[str, Any],
+        cache: Optional[GeneratorCache],
+        hash_key: str,
+    ) -> Union[str, Dict[str, Any]]:
         result = self.generate(prompt, inputs)
         if asyncio.iscoroutine(result):
             result = await result
 
         if cache:
-            cache.set(prompt.model_dump(), inputs, result)
+            cache.set(prompt, inputs, result, hash_key=hash_key)
             # logger.debug("Cache set on Generator")
 
         return result
+
+    @staticmethod
+    def single_flight_stats() -> Dict[str, int]:
+        """Get the number of generator calls and of calls coalesced with an in-flight call."""
+        return _single_flight.stats()
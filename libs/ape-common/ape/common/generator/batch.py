@@ -0,0 +1,335 @@
+import asyncio
+import json
+import os
+import time
+import uuid
+from abc import ABC, abstractmethod
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from litellm import acompletion
+
+from ape.common.utils.logging import logger
+
+TERMINAL_BATCH_STATUSES = {"completed", "failed", "expired", "cancelled"}
+
+
+class BatchRequestError(Exception):
+    """Raised for a request of a batch that failed or has no result."""
+
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class BaseBatchProvider(ABC):
+    """
+    Interface of an offline batch completion service.
+
+    Batches are JSONL files in the OpenAI batch format: one
+    `{"custom_id", "method", "url", "body"}` request per line. Results are returned as
+    the lines of the OpenAI batch output format, keyed by custom_id.
+    """
+
+    @abstractmethod
+    async def submit(self, path: str) -> str:
+        """
+        Submit a batch file.
+
+        Args:
+            path (str): Path of the JSONL batch file.
+
+        Returns:
+            str: The id of the batch.
+        """
+        pass
+
+    @abstractmethod
+    async def status(self, batch_id: str) -> str:
+        """
+        Get the status of a batch.
+
+        Returns:
+            str: "validating", "in_progress", "finalizing", "completed", "failed",
+                "expired" or "cancelled".
+        """
+        pass
+
+    @abstractmethod
+    async def results(self, batch_id: str) -> Dict[str, Dict[str, Any]]:
+        """
+        Get the results of a finished batch.
+
+        Returns:
+            Dict[str, Dict[str, Any]]: Output lines keyed by custom_id, each with a
+                `response` (`status_code` and `body`) and an `error`.
+        """
+        pass
+
+
+class LocalFileBatchProvider(BaseBatchProvider):
+    """
+    Batch provider running batches locally, as a stand-in for a batch API in tests and
+    offline runs.
+
+    Each request body is passed to `handler`, which defaults to a non-streaming litellm
+    completion, and the results are written to `{work_dir}/{batch_id}.output.jsonl`.
+
+    Args:
+        work_dir (Optional[str]): Directory of the output files. Defaults to the directory
+            of each submitted batch file.
+        handler (Optional[Callable[[Dict[str, Any]], Awaitable[Dict[str, Any]]]]): Function
+            computing the chat completion (as a dict) of a request body.
+        max_concurrency (int): Number of requests of a batch run concurrently. Defaults to 16.
+    """
+
+    def __init__(
+        self,
+        work_dir: Optional[str] = None,
+        handler: Optional[Callable[[Dict[str, Any]], Awaitable[Dict[str, Any]]]] = None,
+        max_concurrency: int = 16,
+    ):
+        self.work_dir = work_dir
+        self.handler = handler or _litellm_handler
+        self.max_concurrency = max_concurrency
+        self._statuses: Dict[str, str] = {}
+        self._outputs: Dict[str, str] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+    async def submit(self, path: str) -> str:
+        batch_id = f"batch_{uuid.uuid4().hex}"
+        work_dir = self.work_dir or os.path.dirname(os.path.abspath(path))
+        os.makedirs(work_dir, exist_ok=True)
+        self._outputs[batch_id] = os.path.join(work_dir, f"{batch_id}.output.jsonl")
+        self._statuses[batch_id] = "in_progress"
+        self._tasks[batch_id] = asyncio.ensure_future(self._run(batch_id, path))
+        return batch_id
+
+    async def _run(self, batch_id: str, path: str):
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def process(request: Dict[str, Any]) -> Dict[str, Any]:
+            async with semaphore:
+                try:
+                    body = await self.handler(request["body"])
+                    response, error = {"status_code": 200, "body": body}, None
+                except Exception as e:
+                    status_code = getattr(e, "status_code", None) or 500
+                    response = {"status_code": status_code, "body": None}
+                    error = {"code": type(e).__name__, "message": str(e)}
+            return {
+                "id": f"response_{uuid.uuid4().hex}",
+                "custom_id": request["custom_id"],
+                "response": response,
+                "error": error,
+            }
+
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                requests = [json.loads(line) for line in f if line.strip()]
+            outputs = await asyncio.gather(*[process(request) for request in requests])
+            with open(self._outputs[batch_id], "w", encoding="utf-8") as f:
+                for output in outputs:
+                    f.write(json.dumps(output, default=str) + "\n")
+            self._statuses[batch_id] = "completed"
+        except Exception as e:
+            logger.error(f"Local batch {batch_id} failed: {e}")
+            self._statuses[batch_id] = "failed"
+        finally:
+            self._tasks.pop(batch_id, None)
+
+    async def status(self, batch_id: str) -> str:
+        return self._statuses.get(batch_id, "failed")
+
+    async def results(self, batch_id: str) -> Dict[str, Dict[str, Any]]:
+        return _read_output_file(self._outputs[batch_id])
+
+
+class LiteLLMBatchProvider(BaseBatchProvider):
+    """
+    Batch provider using a provider batch API (OpenAI, Azure, ...) through litellm.
+
+    Args:
+        custom_llm_provider (str): The litellm provider. Defaults to "openai".
+        completion_window (str): The completion window of the batches. Defaults to "24h".
+    """
+
+    def __init__(self, custom_llm_provider: str = "openai", completion_window: str = "24h"):
+        self.custom_llm_provider = custom_llm_provider
+        self.completion_window = completion_window
+
+    async def submit(self, path: str) -> str:
+        import litellm
+
+        with open(path, "rb") as f:
+            file = await litellm.acreate_file(
+                file=f, purpose="batch", custom_llm_provider=self.custom_llm_provider
+            )
+        batch = await litellm.acreate_batch(
+            completion_window=self.completion_window,
+            endpoint="/v1/chat/completions",
+            input_file_id=file.id,
+            custom_llm_provider=self.custom_llm_provider,
+        )
+        return batch.id
+
+    async def status(self, batch_id: str) -> str:
+        import litellm
+
+        batch = await litellm.aretrieve_batch(
+            batch_id=batch_id, custom_llm_provider=self.custom_llm_provider
+        )
+        return batch.status
+
+    async def results(self, batch_id: str) -> Dict[str, Dict[str, Any]]:
+        import litellm
+
+        batch = await litellm.aretrieve_batch(
+            batch_id=batch_id, custom_llm_provider=self.custom_llm_provider
+        )
+        results: Dict[str, Dict[str, Any]] = {}
+        for file_id in (batch.error_file_id, batch.output_file_id):
+            if not file_id:
+                continue
+            content = await litellm.afile_content(
+                file_id=file_id, custom_llm_provider=self.custom_llm_provider
+            )
+            data = content.content if hasattr(content, "content") else content.read()
+            results.update(_parse_output_lines(data.decode("utf-8").splitlines()))
+        return results
+
+
+class BatchQueue:
+    """
+    Collects completion requests from concurrent callers into batch files.
+
+    Requests are buffered until `max_batch_size` are pending or `max_wait` seconds have
+    passed since the first one, then written to a JSONL file in `batch_dir` and submitted
+    to the provider. The batch is polled every `poll_interval` seconds and each caller
+    receives the chat completion of its request.
+
+    A queue must be used from a single event loop.
+
+    Args:
+        provider (BaseBatchProvider): The batch provider.
+        batch_dir (str): Directory of the batch files.
+        max_batch_size (int): Maximum number of requests per batch. Defaults to 1000.
+        max_wait (float): Seconds to wait for more requests before submitting. Defaults to 1.
+        poll_interval (float): Seconds between status checks. Defaults to 10.
+    """
+
+    def __init__(
+        self,
+        provider: BaseBatchProvider,
+        batch_dir: str,
+        max_batch_size: int = 1000,
+        max_wait: float = 1.0,
+        poll_interval: float = 10.0,
+    ):
+        self.provider = provider
+        self.batch_dir = batch_dir
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.poll_interval = poll_interval
+        self._pending: List[Tuple[str, Dict[str, Any], asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks: set = set()
+
+    async def complete(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Add a request to the next batch and wait for its result.
+
+        Args:
+            body (Dict[str, Any]): The chat completion request body.
+
+        Returns:
+            Dict[str, Any]: The chat completion response body.
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((f"request-{uuid.uuid4().hex}", body, future))
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.ensure_future(self._run_batch(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run_batch(self, batch: List[Tuple[str, Dict[str, Any], asyncio.Future]]):
+        try:
+            os.makedirs(self.batch_dir, exist_ok=True)
+            path = os.path.join(
+                self.batch_dir, f"batch-{time.strftime('%Y%m%d%H%M%S')}-{uuid.uuid4().hex[:8]}.jsonl"
+            )
+            with open(path, "w", encoding="utf-8") as f:
+                for custom_id, body, _ in batch:
+                    f.write(
+                        json.dumps(
+                            {
+                                "custom_id": custom_id,
+                                "method": "POST",
+                                "url": "/v1/chat/completions",
+                                "body": body,
+                            },
+                            default=str,
+                        )
+                        + "\n"
+                    )
+            batch_id = await self.provider.submit(path)
+            logger.info(f"Submitted batch {batch_id} with {len(batch)} requests")
+
+            status = await self.provider.status(batch_id)
+            while status not in TERMINAL_BATCH_STATUSES:
+                await asyncio.sleep(self.poll_interval)
+                status = await self.provider.status(batch_id)
+            results = await self.provider.results(batch_id) if status == "completed" else {}
+        except Exception as e:
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for custom_id, _, future in batch:
+            if future.done():
+                continue
+            output = results.get(custom_id)
+            response = (output or {}).get("response") or {}
+            if output is None:
+                future.set_exception(BatchRequestError(f"No result in batch {batch_id} ({status})"))
+            elif output.get("error") or response.get("status_code") != 200:
+                error = output.get("error") or {}
+                future.set_exception(
+                    BatchRequestError(
+                        error.get("message") or f"Batch request failed: {response}",
+                        status_code=response.get("status_code"),
+                    )
+                )
+            else:
+                future.set_result(response["body"])
+
+
+async def _litellm_handler(body: Dict[str, Any]) -> Dict[str, Any]:
+    response = await acompletion(**body)
+    return response.model_dump()
+
+
+def _parse_output_lines(lines: List[str]) -> Dict[str, Dict[str, Any]]:
+    results: Dict[str, Dict[str, Any]] = {}
+    for line in lines:
+        if line.strip():
+            output = json.loads(line)
+            results[output["custom_id"]] = output
+    return results
+
+
+def _read_output_file(path: str) -> Dict[str, Dict[str, Any]]:
+    with open(path, "r", encoding="utf-8") as f:
+        return _parse_output_lines(f.readlines())
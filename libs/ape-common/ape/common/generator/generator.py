@@ -1,75 +1,351 @@
 import asyncio
 import json
+import os
+import tempfile
 import time
-from typing import Any, Dict, Type, Union
+import weakref
+from typing import Any, Dict, List, Literal, Optional, Type, Union
 
 from pydantic import BaseModel
+from openai.lib._parsing._completions import type_to_response_format_param
 from ape.common.generator.base_generator import BaseGenerator
+from ape.common.generator.batch import BaseBatchProvider, BatchQueue, LocalFileBatchProvider
 from ape.common.prompt.prompt_base import Prompt
+from ape.common.prompt.cost_tracker import CostTracker
+from ape.common.prompt.prefix_cache import record_token_usage
+from ape.common.prompt.token_budget import DEFAULT_TOKEN_BUDGET, ContextBudgetExceeded, TokenBudget
+from ape.common.utils.hedging import HedgeOutcome, HedgingPolicy
+from ape.common.utils.json_stream import (
+    IncrementalJSONParser,
+    JSONStreamError,
+    response_format_schema,
+)
+from ape.common.utils.latency import CallTiming, LatencyTracker
 from ape.common.utils.logging import logger
-from litellm import acompletion
+from ape.common.utils.rate_limiter import RateLimiter, estimate_tokens
+from ape.common.utils.retry import RetryPolicy
+from litellm import acompletion, cost_per_token
 
 
 class Generator(BaseGenerator):
-    def __init__(self, timeout: float = 25.0, stream_timeout: float = 5.0, frequency_penalty: float = 0.1, retry_count: int = 10):
+    def __init__(
+        self,
+        timeout: float = 25.0,
+        stream_timeout: float = 5.0,
+        frequency_penalty: float = 0.1,
+        retry_count: int = 10,
+        deadline: Optional[float] = None,
+        retry_policy: Optional[RetryPolicy] = None,
+        first_token_timeout: Optional[float] = None,
+        mode: Literal["stream", "completion", "batch"] = "stream",
+        batch_provider: Optional[BaseBatchProvider] = None,
+        batch_dir: Optional[str] = None,
+        batch_size: int = 1000,
+        batch_wait: float = 1.0,
+        poll_interval: float = 10.0,
+        hedging: Optional[HedgingPolicy] = None,
+        token_budget: Optional[TokenBudget] = None,
+    ):
+        """
+        Args:
+            timeout (float): Maximum duration of an attempt, from the request to the end of the
+                stream, in seconds. Defaults to 25.
+            stream_timeout (float): Maximum time to open the stream, in seconds. Defaults to 5.
+            frequency_penalty (float): Frequency penalty passed to the model. Defaults to 0.1.
+            retry_count (int): Maximum number of attempts per call. Defaults to 10.
+            deadline (Optional[float]): Total time budget of a call including retries, in
+                seconds. None means no deadline.
+            retry_policy (Optional[RetryPolicy]): Retry policy, overriding `retry_count` and
+                `deadline`.
+            first_token_timeout (Optional[float]): Maximum time to the first token, in seconds.
+                Defaults to `timeout`.
+            mode (Literal["stream", "completion", "batch"]): How completions are requested.
+                "stream" streams the response, "completion" makes a plain request, and "batch"
+                collects requests into batch files submitted to `batch_provider`, for offline
+                runs where latency does not matter. Defaults to "stream".
+            batch_provider (Optional[BaseBatchProvider]): Batch provider of the "batch" mode.
+                Defaults to a LocalFileBatchProvider.
+            batch_dir (Optional[str]): Directory of the batch files. Defaults to a directory in
+                the system temporary directory.
+            batch_size (int): Maximum number of requests per batch. Defaults to 1000.
+            batch_wait (float): Seconds to wait for more requests before submitting a batch.
+                Defaults to 1.
+            poll_interval (float): Seconds between batch status checks. Defaults to 10.
+            hedging (Optional[HedgingPolicy]): Hedged requests policy. When set, a call
+                slower than the rolling latency percentile of its model is duplicated and
+                the first response wins. Not used in "batch" mode. Defaults to None.
+            token_budget (Optional[TokenBudget]): Context budget checked before each call,
+                which may truncate declared inputs or drop few-shot examples. Calls that do
+                not fit fail without a request. Defaults to a budget rejecting calls over the
+                context window of the model.
+        """
+        if mode not in ("stream", "completion", "batch"):
+            raise ValueError(f"Invalid generation mode: {mode}")
         self.timeout = timeout
         self.stream_timeout = stream_timeout
         self.frequency_penalty = frequency_penalty
         self.retry_count = retry_count
-        
+        self.retry_policy = retry_policy or RetryPolicy(max_attempts=retry_count, deadline=deadline)
+        self.first_token_timeout = first_token_timeout
+        # Time to first token and inter-token latency of recent attempts
+        self.latency = LatencyTracker()
+        self.mode = mode
+        self.batch_provider = batch_provider
+        self.batch_dir = batch_dir or os.path.join(tempfile.gettempdir(), "ape_batches")
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+        self.poll_interval = poll_interval
+        self.hedging = hedging
+        self.token_budget = token_budget or DEFAULT_TOKEN_BUDGET
+        # Batch queues are bound to the event loop of their callers
+        self._batch_queues: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, BatchQueue]" = (
+            weakref.WeakKeyDictionary()
+        )
+
     async def generate(
         self, prompt: Prompt, inputs: Dict[str, Any] = {}
     ) -> Union[str, Dict[str, Any], Type[BaseModel]]:
-        retry_count = 0
-        messages = prompt.format(**inputs).messages
-        model = prompt.model
         response_format = prompt.response_format
-        
-        while retry_count < self.retry_count:
-            stream_response = None
-            try:
-                start_time = time.time()
-                stream_response = await asyncio.wait_for(
-                    acompletion(
-                        model=model,
-                        messages=messages,
-                        response_format=response_format,
-                        temperature=prompt.temperature,
-                        stream=True,
-                        stream_options={"include_usage": True},
-                        frequency_penalty=self.frequency_penalty
-                    ),
-                    timeout=self.stream_timeout
-                )
-                full_response = ""
-                async for chunk in stream_response:
-                    if time.time() - start_time > self.timeout:
-                        logger.error(f"SLOW, {full_response}")
-                        timeout_occurred = True
-                        break  # Exit the loop gracefully
-                    if len(chunk.choices) == 0:
-                        continue
-                    if chunk.choices[0].delta.content is not None:
-                        full_response += chunk.choices[0].delta.content
-                else:
-                    timeout_occurred = False  # No timeout occurred
-                
-                if timeout_occurred:
-                    raise Exception("TimeoutError")
-                
-                if response_format is not None:
-                    return json.loads(full_response)
-                else:
-                    return full_response
+        try:
+            prompt, inputs = self.token_budget.fit(prompt, inputs)
+        except ContextBudgetExceeded as e:
+            logger.error(f"Generation skipped: {e}")
+            return {} if response_format is not None else ""
+        messages = prompt.format_request(**inputs)
+        model = prompt.model
 
-            except asyncio.TimeoutError:
-                logger.error("TimeoutError")
-                retry_count += 1
-            except Exception as e:
-                logger.error(f"Other Error, {e}")
-                retry_count += 1
+        # Structured outputs are parsed and validated while they stream, so that invalid
+        # output is aborted early and no second parse of the full text is needed
+        schema = response_format_schema(response_format)
+
+        async def request(call) -> Union[str, Dict[str, Any]]:
+            parser = IncrementalJSONParser(schema) if response_format is not None else None
+            text = await call(
+                model=model,
+                messages=messages,
+                parser=parser,
+                response_format=response_format,
+                temperature=prompt.temperature,
+            )
+            return parser.close() if parser is not None else text
+
+        async def throttled_request() -> Union[str, Dict[str, Any]]:
+            call = self._stream if self.mode == "stream" else self._complete
+            async with RateLimiter.throttle(model, tokens=estimate_tokens(messages)):
+                return await request(call)
+
+        async def attempt() -> Union[str, Dict[str, Any]]:
+            if self.mode == "batch":
+                # Batch APIs have their own quotas, so batched calls skip the rate limiter
+                return await request(self._batch_complete)
+            if self.hedging is None:
+                return await throttled_request()
+            response, outcome = await self.hedging.call(throttled_request, self.latency, model)
+            if outcome.hedged:
+                await self._record_hedge(model, messages, response, outcome)
+            return response
+
+        try:
+            return await self.retry_policy.call(attempt, model=model)
+        except Exception as e:
+            logger.error(f"Generation failed: {type(e).__name__}: {e}")
 
         if response_format is not None:
             return {}
         else:
             return ""
+
+    async def _record_hedge(
+        self,
+        model: str,
+        messages: List[Dict[str, Any]],
+        response: Union[str, Dict[str, Any]],
+        outcome: HedgeOutcome,
+    ):
+        """Report the estimated cost of a duplicate request and the latency it saved."""
+        if not isinstance(response, str):
+            response = json.dumps(response, default=str)
+        try:
+            prompt_cost, completion_cost = cost_per_token(
+                model=model,
+                prompt_tokens=estimate_tokens(messages),
+                completion_tokens=estimate_tokens(response),
+            )
+            extra_cost = prompt_cost + completion_cost
+        except Exception:
+            extra_cost = 0.0
+        await CostTracker.add_hedge(extra_cost, outcome.latency_saved, won=outcome.hedge_won)
+
+    async def _stream(
+        self,
+        model: str,
+        messages: List[Dict[str, Any]],
+        parser: Optional[IncrementalJSONParser] = None,
+        **kwargs,
+    ) -> str:
+        """
+        Stream a completion under a single deadline.
+
+        Opening the stream is bounded by `stream_timeout`, the first token by
+        `first_token_timeout` and the whole response by `timeout`. Every wait on the
+        stream is bounded, so a stalled stream times out instead of hanging, and the
+        underlying HTTP stream is closed on timeout, error or cancellation.
+
+        Content is fed to `parser` as it arrives, so a structured output that can no longer
+        be valid aborts the stream instead of paying for the rest of it.
+        """
+        start = time.monotonic()
+        deadline = start + self.timeout
+        first_token_deadline = min(deadline, start + (self.first_token_timeout or self.timeout))
+        timing = CallTiming(model=model)
+        last_token_at: Optional[float] = None
+        gaps: List[float] = []
+        stream_response = None
+        try:
+            stream_response = await asyncio.wait_for(
+                acompletion(
+                    model=model,
+                    messages=messages,
+                    stream=True,
+                    stream_options={"include_usage": True},
+                    frequency_penalty=self.frequency_penalty,
+                    **kwargs,
+                ),
+                timeout=min(self.stream_timeout, first_token_deadline - start),
+            )
+            chunks = stream_response.__aiter__()
+            full_response = ""
+            while True:
+                wait_until = deadline if last_token_at is not None else first_token_deadline
+                remaining = wait_until - time.monotonic()
+                if remaining <= 0:
+                    raise asyncio.TimeoutError("Streaming response timed out")
+                try:
+                    chunk = await asyncio.wait_for(chunks.__anext__(), timeout=remaining)
+                except StopAsyncIteration:
+                    break
+                usage = getattr(chunk, "usage", None)
+                if usage is not None:
+                    # Requested with `include_usage`, sent with the last chunk
+                    await record_token_usage(usage)
+                if len(chunk.choices) == 0 or chunk.choices[0].delta.content is None:
+                    continue
+                now = time.monotonic()
+                if last_token_at is None:
+                    timing.ttft = now - start
+                else:
+                    gaps.append(now - last_token_at)
+                last_token_at = now
+                timing.chunks += 1
+                content = chunk.choices[0].delta.content
+                if parser is not None:
+                    try:
+                        parser.feed(content)
+                    except JSONStreamError as e:
+                        logger.warning(
+                            f"Aborted invalid structured output from {model} after "
+                            f"{len(full_response) + len(content)} characters: {e.msg}"
+                        )
+                        raise
+                full_response += content
+            timing.completed = True
+            return full_response
+        except asyncio.TimeoutError:
+            logger.error(f"Streaming response from {model} timed out after {time.monotonic() - start:.1f}s")
+            raise
+        finally:
+            timing.total = time.monotonic() - start
+            if gaps:
+                timing.itl_mean = sum(gaps) / len(gaps)
+                timing.itl_max = max(gaps)
+            self.latency.add(timing)
+            if stream_response is not None and not timing.completed:
+                await _close_stream(stream_response)
+
+    async def _complete(
+        self,
+        model: str,
+        messages: List[Dict[str, Any]],
+        parser: Optional[IncrementalJSONParser] = None,
+        **kwargs,
+    ) -> str:
+        """Request a completion without streaming, bounded by `timeout`."""
+        start = time.monotonic()
+        timing = CallTiming(model=model)
+        try:
+            res = await asyncio.wait_for(
+                acompletion(
+                    model=model,
+                    messages=messages,
+                    frequency_penalty=self.frequency_penalty,
+                    **kwargs,
+                ),
+                timeout=self.timeout,
+            )
+            timing.completed = True
+            await record_token_usage(getattr(res, "usage", None))
+            content = res.choices[0].message.content or ""
+            if parser is not None:
+                parser.feed(content)
+            return content
+        except asyncio.TimeoutError:
+            logger.error(f"Completion from {model} timed out after {time.monotonic() - start:.1f}s")
+            raise
+        finally:
+            timing.total = time.monotonic() - start
+            self.latency.add(timing)
+
+    async def _batch_complete(
+        self,
+        model: str,
+        messages: List[Dict[str, Any]],
+        parser: Optional[IncrementalJSONParser] = None,
+        **kwargs,
+    ) -> str:
+        """Request a completion through the next batch of the current event loop."""
+        loop = asyncio.get_running_loop()
+        queue = self._batch_queues.get(loop)
+        if queue is None:
+            if self.batch_provider is None:
+                self.batch_provider = LocalFileBatchProvider()
+            queue = BatchQueue(
+                self.batch_provider,
+                self.batch_dir,
+                max_batch_size=self.batch_size,
+                max_wait=self.batch_wait,
+                poll_interval=self.poll_interval,
+            )
+            self._batch_queues[loop] = queue
+
+        response_format = kwargs.get("response_format")
+        if isinstance(response_format, type) and issubclass(response_format, BaseModel):
+            kwargs["response_format"] = type_to_response_format_param(response_format)
+        body = {
+            "model": model,
+            "messages": messages,
+            "frequency_penalty": self.frequency_penalty,
+            **{key: value for key, value in kwargs.items() if value is not None},
+        }
+        res = await queue.complete(body)
+        await record_token_usage(res.get("usage"))
+        content = res["choices"][0]["message"]["content"] or ""
+        if parser is not None:
+            parser.feed(content)
+        return content
+
+
+async def _close_stream(stream_response: Any):
+    """Close an unfinished stream so that its HTTP connection is released."""
+    close = getattr(stream_response, "aclose", None)
+    try:
+        if close is not None:
+            await close()
+            return
+        completion_stream = getattr(stream_response, "completion_stream", None)
+        close = getattr(completion_stream, "close", None)
+        if close is not None:
+            result = close()
+            if asyncio.iscoroutine(result):
+                await result
+    except Exception as e:
+        logger.debug(f"Error closing stream: {e}")
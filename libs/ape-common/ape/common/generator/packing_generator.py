@@ -0,0 +1,244 @@
+import asyncio
+import copy
+import json
+import weakref
+from typing import Any, Dict, List, Optional, Set, Tuple, Union
+
+from pydantic import BaseModel
+from openai.lib._parsing._completions import type_to_response_format_param
+
+from ape.common.generator.base_generator import BaseGenerator
+from ape.common.generator.generator import Generator
+from ape.common.prompt.prompt_base import Prompt
+from ape.common.utils.logging import logger
+
+_MISSING = object()
+_PACKED_INPUTS = "_PACKED_INPUTS_"
+
+
+class _PendingPack:
+    def __init__(self, prompt: Prompt):
+        self.prompt = prompt
+        self.items: List[Tuple[Dict[str, Any], asyncio.Future]] = []
+        self.timer: Optional[asyncio.TimerHandle] = None
+
+
+class PackingGenerator(BaseGenerator):
+    """
+    Generator answering several dataset items with a single model request.
+
+    Concurrent `generate` calls with the same prompt are collected into packs of up to
+    `pack_size` items (or whatever arrived within `max_wait` seconds). The inputs of a pack
+    are formatted into one request that asks for a JSON array of answers keyed by item id,
+    following the prompt's response format. Answers are unpacked back to each caller, and
+    items whose answer is missing or malformed are generated again on their own.
+
+    Evaluation loops already call the generator concurrently per item, so the packing is
+    transparent to `Evaluator` and `BaseTrainer._evaluate`; they scale their concurrency
+    window by `pack_size`. Works best for short outputs such as classification labels.
+
+    Args:
+        pack_size (int): Maximum number of items per request. Defaults to 8.
+        max_wait (float): Seconds to wait for a pack to fill before sending it. Defaults to 0.05.
+        generator (Optional[BaseGenerator]): Generator making the packed and fallback
+            requests. Defaults to a Generator.
+    """
+
+    def __init__(
+        self,
+        pack_size: int = 8,
+        max_wait: float = 0.05,
+        generator: Optional[BaseGenerator] = None,
+    ):
+        self.pack_size = max(1, pack_size)
+        self.max_wait = max_wait
+        self.generator = generator or Generator()
+        self.stats: Dict[str, int] = {"items": 0, "requests": 0, "packed_items": 0, "fallbacks": 0}
+        # Packs are bound to the event loop of their callers
+        self._packs: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, _PendingPack]]" = (
+            weakref.WeakKeyDictionary()
+        )
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def generate(
+        self, prompt: Prompt, inputs: Dict[str, Any] = {}
+    ) -> Union[str, Dict[str, Any]]:
+        self.stats["items"] += 1
+        if self.pack_size == 1:
+            self.stats["requests"] += 1
+            return await self.generator.generate(prompt, inputs)
+
+        loop = asyncio.get_running_loop()
+        packs = self._packs.setdefault(loop, {})
+        key = prompt.fingerprint()
+        pack = packs.get(key)
+        if pack is None:
+            pack = packs[key] = _PendingPack(prompt)
+            pack.timer = loop.call_later(self.max_wait, self._flush, packs, key)
+        future = loop.create_future()
+        pack.items.append((inputs, future))
+        if len(pack.items) >= self.pack_size:
+            self._flush(packs, key)
+        return await future
+
+    def _flush(self, packs: Dict[str, _PendingPack], key: str):
+        pack = packs.pop(key, None)
+        if pack is None:
+            return
+        if pack.timer is not None:
+            pack.timer.cancel()
+        task = asyncio.ensure_future(self._run_pack(pack))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run_pack(self, pack: _PendingPack):
+        prompt = pack.prompt
+        inputs_list = [inputs for inputs, _ in pack.items]
+        try:
+            if len(inputs_list) == 1:
+                self.stats["requests"] += 1
+                answers = [await self.generator.generate(prompt, inputs_list[0])]
+            else:
+                answers = await self._generate_packed(prompt, inputs_list)
+                missing = [i for i, answer in enumerate(answers) if answer is _MISSING]
+                if missing:
+                    logger.debug(f"Packed request left {len(missing)} of {len(answers)} items unanswered")
+                    self.stats["fallbacks"] += len(missing)
+                    self.stats["requests"] += len(missing)
+                    fallbacks = await asyncio.gather(
+                        *[self.generator.generate(prompt, inputs_list[i]) for i in missing]
+                    )
+                    for i, answer in zip(missing, fallbacks):
+                        answers[i] = answer
+        except Exception as e:
+            for _, future in pack.items:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, future), answer in zip(pack.items, answers):
+            if not future.done():
+                future.set_result(answer)
+
+    async def _generate_packed(self, prompt: Prompt, inputs_list: List[Dict[str, Any]]) -> List[Any]:
+        """
+        Answer several items with one request.
+
+        Returns:
+            List[Any]: The answer of each item, or `_MISSING` if it is missing or malformed.
+        """
+        formatted = [prompt.format(**inputs).messages for inputs in inputs_list]
+        shared_count = 0
+        while all(
+            len(messages) > shared_count and messages[shared_count] == formatted[0][shared_count]
+            for messages in formatted
+        ):
+            shared_count += 1
+        # Keep the request non-empty when the items share every message
+        shared_count = min(shared_count, len(formatted[0]) - 1)
+
+        item_blocks = []
+        for index, messages in enumerate(formatted):
+            content = "\n\n".join(str(message["content"]) for message in messages[shared_count:])
+            item_blocks.append(f'<input id="{index}">\n{content}\n</input>')
+
+        response_format = prompt.response_format
+        if isinstance(response_format, type) and issubclass(response_format, BaseModel):
+            response_format = type_to_response_format_param(response_format)
+        packed_format, answer_hint = _packed_response_format(response_format)
+
+        # The item blocks go last and through a placeholder, so the instruction stays part
+        # of the static prefix that providers can serve from their prompt cache
+        instruction = (
+            "You are given several independent inputs, each marked with its id. "
+            "Answer each of them separately, exactly as you would answer it on its own. "
+            'Respond with a JSON object {"answers": [{"id": <input id>, "answer": <answer>}, ...]} '
+            f"containing one entry per input. {answer_hint}\n\n{{{_PACKED_INPUTS}}}"
+        )
+        packed_prompt = Prompt(
+            messages=formatted[0][:shared_count] + [{"role": "user", "content": instruction}],
+            model=prompt.model,
+            temperature=prompt.temperature,
+            response_format=packed_format,
+        )
+
+        self.stats["requests"] += 1
+        self.stats["packed_items"] += len(inputs_list)
+        result = await self.generator.generate(
+            packed_prompt, {_PACKED_INPUTS: "\n\n".join(item_blocks)}
+        )
+        if isinstance(result, str):
+            try:
+                result = json.loads(result)
+            except json.JSONDecodeError:
+                result = {}
+
+        answers: List[Any] = [_MISSING] * len(inputs_list)
+        entries = result.get("answers") if isinstance(result, dict) else None
+        for entry in entries if isinstance(entries, list) else []:
+            if not isinstance(entry, dict) or "answer" not in entry:
+                continue
+            try:
+                index = int(entry.get("id"))
+            except (TypeError, ValueError):
+                continue
+            if 0 <= index < len(answers) and answers[index] is _MISSING:
+                if _is_valid_answer(entry["answer"], response_format):
+                    answers[index] = entry["answer"]
+        return answers
+
+
+def _packed_response_format(
+    response_format: Optional[Dict[str, Any]]
+) -> Tuple[Dict[str, Any], str]:
+    """Build the response format of a packed request and the description of each answer."""
+    if not response_format or response_format.get("type") == "text":
+        return {"type": "json_object"}, "Each answer is the text you would respond with, as a string."
+    if response_format.get("type") != "json_schema":
+        return (
+            {"type": "json_object"},
+            "Each answer is the JSON object you would respond with for that input.",
+        )
+
+    json_schema = response_format["json_schema"]
+    answer_schema = copy.deepcopy(json_schema.get("schema", {}))
+    # References are relative to the root, so definitions move to the wrapper schema
+    definitions = answer_schema.pop("$defs", None)
+    schema: Dict[str, Any] = {
+        "type": "object",
+        "properties": {
+            "answers": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {"id": {"type": "integer"}, "answer": answer_schema},
+                    "required": ["id", "answer"],
+                    "additionalProperties": False,
+                },
+            }
+        },
+        "required": ["answers"],
+        "additionalProperties": False,
+    }
+    if definitions:
+        schema["$defs"] = definitions
+    packed = {
+        "type": "json_schema",
+        "json_schema": {
+            "name": f"packed_{json_schema.get('name', 'response')}"[:64],
+            "schema": schema,
+            "strict": json_schema.get("strict", False),
+        },
+    }
+    return packed, "Each answer follows the response schema of a single input."
+
+
+def _is_valid_answer(answer: Any, response_format: Optional[Dict[str, Any]]) -> bool:
+    if not response_format or response_format.get("type") == "text":
+        return isinstance(answer, str)
+    if not isinstance(answer, dict):
+        return False
+    if response_format.get("type") == "json_schema":
+        required = response_format["json_schema"].get("schema", {}).get("required", [])
+        return all(key in answer for key in required)
+    return True
@@ -1,4 +1,4 @@
-from .global_metric_base import BaseGlobalMetric
+from .global_metric_base import BaseGlobalMetric, GlobalMetricAccumulator
 from .average import AverageGlobalMetric
 
-__all__ = ["BaseGlobalMetric", "AverageGlobalMetric"]
+__all__ = ["BaseGlobalMetric", "GlobalMetricAccumulator", "AverageGlobalMetric"]
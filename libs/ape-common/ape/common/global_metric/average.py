@@ -1,7 +1,7 @@
 from typing import List
 
 from ape.common.types import MetricResult, GlobalMetricResult
-from .global_metric_base import BaseGlobalMetric
+from .global_metric_base import BaseGlobalMetric, GlobalMetricAccumulator
 
 
 class AverageGlobalMetric(BaseGlobalMetric):
@@ -18,3 +18,23 @@ class AverageGlobalMetric(BaseGlobalMetric):
         if not results:
             return GlobalMetricResult(score=0.0)
         return GlobalMetricResult(score=sum(result.score for result in results) / len(results))
+
+    def accumulator(self) -> GlobalMetricAccumulator:
+        return AverageAccumulator(self)
+
+
+class AverageAccumulator(GlobalMetricAccumulator):
+    """Running average of local scores, without keeping the results."""
+
+    def __init__(self, global_metric: BaseGlobalMetric):
+        super().__init__(global_metric)
+        self.total = 0.0
+
+    def add(self, result: MetricResult) -> None:
+        self.count += 1
+        self.total += result.score
+
+    async def result(self) -> GlobalMetricResult:
+        if not self.count:
+            return GlobalMetricResult(score=0.0)
+        return GlobalMetricResult(score=self.total / self.count)
@@ -5,6 +5,32 @@ from typing import List
 from ape.common.types import MetricResult, GlobalMetricResult
 
 
+class GlobalMetricAccumulator:
+    """
+    Aggregates MetricResults one at a time into a running GlobalMetricResult.
+
+    This default implementation keeps every result and recomputes the global metric on
+    demand, so it works with any BaseGlobalMetric. Global metrics that can be updated
+    incrementally should return a constant-memory accumulator from `accumulator()`.
+
+    Args:
+        global_metric (BaseGlobalMetric): The global metric to compute.
+    """
+
+    def __init__(self, global_metric: "BaseGlobalMetric"):
+        self.global_metric = global_metric
+        self.count = 0
+        self.results: List[MetricResult] = []
+
+    def add(self, result: MetricResult) -> None:
+        self.count += 1
+        self.results.append(result)
+
+    async def result(self) -> GlobalMetricResult:
+        """Compute the global metric of the results added so far."""
+        return await self.global_metric(self.results)
+
+
 class BaseGlobalMetric(ABC):
     @abstractmethod
     async def compute(self, results: List[MetricResult]) -> GlobalMetricResult:
@@ -33,3 +59,12 @@ class BaseGlobalMetric(ABC):
         if asyncio.iscoroutine(result):
             return await result
         return result
+
+    def accumulator(self) -> GlobalMetricAccumulator:
+        """
+        Create an accumulator computing this global metric incrementally.
+
+        Returns:
+            GlobalMetricAccumulator: A new, empty accumulator.
+        """
+        return GlobalMetricAccumulator(self)
@@ -3,6 +3,7 @@ import numpy as np
 from litellm import aembedding
 from ape.common.metric import BaseMetric
 from ape.common.types import MetricResult, DatasetItem
+from ape.common.utils.rate_limiter import RateLimiter, estimate_tokens
 
 
 class CosineSimilarityMetric(BaseMetric):
@@ -29,10 +30,12 @@ class CosineSimilarityMetric(BaseMetric):
                 else:
                     raise ValueError("Embedding not found in the expected format")
 
-            gold_embedding = await aembedding(model=self.model, input=gold)
+            async with RateLimiter.throttle(self.model, tokens=estimate_tokens(gold)):
+                gold_embedding = await aembedding(model=self.model, input=gold)
             gold_embedding = get_embedding(gold_embedding)
 
-            pred_embedding = await aembedding(model=self.model, input=pred)
+            async with RateLimiter.throttle(self.model, tokens=estimate_tokens(pred)):
+                pred_embedding = await aembedding(model=self.model, input=pred)
             pred_embedding = get_embedding(pred_embedding)
 
             similarity = np.dot(gold_embedding, pred_embedding) / (
@@ -4,7 +4,12 @@ import asyncio
 
 from ape.common.types import MetricResult, DatasetItem
 from ape.common.cache.metric_cache import MetricCache
+from ape.common.cache.keys import metric_key
 from ape.common.utils import logger
+from ape.common.utils.single_flight import SingleFlight
+
+_single_flight = SingleFlight("metric")
+
 
 class BaseMetric(ABC):
     @abstractmethod
@@ -47,17 +52,35 @@ class BaseMetric(ABC):
             MetricResult: An object containing the score and intermediate values.
         """
         cache = MetricCache.get_instance()
+        hash_key = metric_key(dataset_item, pred)
         if cache:
-            cached_result = cache.get(dataset_item, pred)
+            cached_result = cache.get(dataset_item, pred, hash_key=hash_key)
             if cached_result:
                 # logger.debug("Cache hit on Metric")
                 return cached_result
 
+        # Concurrent identical calls on this metric share a single computation
+        return await _single_flight.do(
+            (id(self), hash_key), lambda: self._compute(dataset_item, pred, cache, hash_key)
+        )
+
+    async def _compute(
+        self,
+        dataset_item: DatasetItem,
+        pred: Union[str, Dict[str, Any]],
+        cache: Optional[MetricCache],
+        hash_key: str,
+    ) -> MetricResult:
         result = self.compute(dataset_item=dataset_item, pred=pred)
         if asyncio.iscoroutine(result):
             result = await result
 
         if cache:
-            cache.set(dataset_item, pred, result)
+            cache.set(dataset_item, pred, result, hash_key=hash_key)
             # logger.debug("Cache set on Metric")
         return result
+
+    @staticmethod
+    def single_flight_stats() -> Dict[str, int]:
+        """Get the number of metric calls and of calls coalesced with an in-flight call."""
+        return _single_flight.stats()
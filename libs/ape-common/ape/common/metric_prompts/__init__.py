@@ -1,4 +1,6 @@
 import os
+from typing import Any, Dict, Optional
+
 from ape.common.prompt import Prompt
 import promptfile as pf
 
@@ -8,3 +10,43 @@ if os.path.exists(current_dir):
     ApeMetricPrompts = pf.Client(base_path=current_dir, prompt_class=Prompt)
 else:
     raise FileNotFoundError(f"Prompts directory not found at {current_dir}")
+
+# The judges answer with binary verdicts that their schemas type as plain integers
+_VERDICT_ITEMS = {
+    "type": "object",
+    "properties": {
+        "statement": {"type": "string"},
+        "reason": {"type": "string"},
+        "verdict": {"type": "integer", "minimum": 0, "maximum": 1},
+    },
+    "required": ["statement", "reason", "verdict"],
+}
+_BINARY_SCHEMAS: Dict[str, Dict[str, Any]] = {
+    "binary-judge": {
+        "type": "object",
+        "properties": {"score": {"type": "integer", "minimum": 0, "maximum": 1}},
+        "required": ["score"],
+    },
+    "semantic-precision": {
+        "type": "object",
+        "properties": {"answer": {"type": "array", "items": _VERDICT_ITEMS}},
+        "required": ["answer"],
+    },
+    "semantic-recall": {
+        "type": "object",
+        "properties": {"answer": {"type": "array", "items": _VERDICT_ITEMS}},
+        "required": ["answer"],
+    },
+}
+
+
+def mock_metric_prompts(provider: Any, prefix: Optional[str] = "mock"):
+    """
+    Serve the LLM judges of the metrics from a MockLLMProvider, for offline load tests.
+
+    Args:
+        provider (MockLLMProvider): The installed mock provider.
+        prefix (Optional[str]): Provider name the models are rerouted to, see
+            `MockLLMProvider.serve`. Defaults to "mock".
+    """
+    provider.serve(ApeMetricPrompts.prompts.values(), schemas=_BINARY_SCHEMAS, prefix=prefix)
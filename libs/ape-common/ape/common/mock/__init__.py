@@ -0,0 +1,10 @@
+from .server import MockLLMServer
+from .provider import LatencyProfile, MockLLMProvider, MockProviderError, MockProviderServer
+
+__all__ = [
+    "MockLLMServer",
+    "MockLLMProvider",
+    "MockProviderServer",
+    "MockProviderError",
+    "LatencyProfile",
+]
@@ -0,0 +1,80 @@
+import asyncio
+import time
+from typing import Any, Dict
+
+import litellm
+
+from ape.common.mock.server import MockLLMServer
+from ape.common.utils.http_pool import HTTPClientPool
+from ape.common.utils.latency import percentile
+
+
+async def _run(server: MockLLMServer, requests: int, concurrency: int, stream: bool) -> Dict[str, Any]:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def call(i: int):
+        async with semaphore:
+            start = time.monotonic()
+            res = await litellm.acompletion(
+                model="openai/mock",
+                api_base=server.base_url,
+                api_key="mock",
+                messages=[{"role": "user", "content": f"Request {i}"}],
+                stream=stream,
+            )
+            if stream:
+                async for _ in res:
+                    pass
+            latencies.append(time.monotonic() - start)
+
+    connections = server.connections
+    start = time.monotonic()
+    await asyncio.gather(*[call(i) for i in range(requests)])
+    elapsed = time.monotonic() - start
+    return {
+        "requests_per_second": requests / elapsed,
+        "latency_p50": percentile(latencies, 50),
+        "latency_p95": percentile(latencies, 95),
+        "connections_opened": server.connections - connections,
+    }
+
+
+async def benchmark_http_pool(
+    requests: int = 300,
+    concurrency: int = 32,
+    latency: float = 0.2,
+    stream: bool = True,
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Compare litellm's default HTTP clients with the shared HTTPClientPool against a local
+    MockLLMServer.
+
+    Args:
+        requests (int): Number of requests per run. Defaults to 300.
+        concurrency (int): Number of concurrent requests. Defaults to 32.
+        latency (float): Server latency per request, in seconds. Defaults to 0.2.
+        stream (bool): Whether to stream the completions. Defaults to True.
+
+    Returns:
+        Dict[str, Dict[str, Any]]: Throughput, latency percentiles and connections opened
+            by the server for the "default" and "pooled" runs, plus the pool metrics.
+    """
+    results: Dict[str, Dict[str, Any]] = {}
+    async with MockLLMServer(latency=latency) as server:
+        HTTPClientPool.uninstall()
+        litellm.in_memory_llm_clients_cache.flush_cache()
+        results["default"] = await _run(server, requests, concurrency, stream)
+
+        async with HTTPClientPool.session() as pool:
+            pool.reset_stats()
+            results["pooled"] = await _run(server, requests, concurrency, stream)
+            results["pool_stats"] = pool.stats()
+    return results
+
+
+if __name__ == "__main__":
+    for name, values in asyncio.run(benchmark_http_pool()).items():
+        print(name)
+        for key, value in values.items():
+            print(f"  {key}: {value}")
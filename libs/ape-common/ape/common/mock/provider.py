@@ -0,0 +1,609 @@
+import asyncio
+import json
+import math
+import random
+import re
+from dataclasses import dataclass
+from threading import Lock
+from typing import (
+    Any,
+    AsyncIterator,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Literal,
+    Optional,
+    Tuple,
+    Union,
+)
+
+import litellm
+from litellm import CustomLLM
+from litellm.llms.custom_llm import CustomLLMError
+
+from ape.common.cache.keys import canonical_json, fast_hash
+from ape.common.mock.server import MockLLMServer, _completion, _embeddings, _stream_events
+from ape.common.utils.json_stream import response_format_schema
+from ape.common.utils.logging import logger
+from ape.common.utils.rate_limiter import TokenBucket, estimate_tokens
+
+_WORDS = (
+    "answer analysis example input output prompt task model result score step detail "
+    "context instruction format question reason summary value label case rule focus "
+    "clear specific improve consider provide check explain follow include avoid keep "
+    "the a of to and for with each when that this should must"
+).split()
+
+_PLACEHOLDER = re.compile(r"(?<!\{)\{([^}\s]+)\}(?!\})")
+# Schema of JSON mode, which says nothing about the expected keys
+_JSON_MODE_SCHEMA = {"type": "object"}
+
+
+@dataclass
+class LatencyProfile:
+    """
+    Latency of mock completions.
+
+    Attributes:
+        first_token (float): Mean time to the first token, in seconds. Defaults to 0.
+        per_token (float): Mean time per output token, in seconds. Defaults to 0.
+        distribution (Literal["constant", "uniform", "exponential", "lognormal"]): Distribution
+            of each duration around its mean. Defaults to "constant".
+        spread (float): Relative spread of the "uniform" distribution, or sigma of the
+            "lognormal" one. Defaults to 0.5.
+    """
+
+    first_token: float = 0.0
+    per_token: float = 0.0
+    distribution: Literal["constant", "uniform", "exponential", "lognormal"] = "constant"
+    spread: float = 0.5
+
+    def sample(self, mean: float, rng: random.Random) -> float:
+        """Sample a duration with the given mean."""
+        if mean <= 0 or self.distribution == "constant":
+            return max(0.0, mean)
+        if self.distribution == "uniform":
+            return max(0.0, rng.uniform(mean * (1 - self.spread), mean * (1 + self.spread)))
+        if self.distribution == "exponential":
+            return rng.expovariate(1 / mean)
+        if self.distribution == "lognormal":
+            # Scaled so that the mean stays `mean`
+            return rng.lognormvariate(math.log(mean) - self.spread**2 / 2, self.spread)
+        raise ValueError(f"Unknown latency distribution: {self.distribution}")
+
+
+class MockProviderError(CustomLLMError):
+    """Injected error of a MockLLMProvider, mapped by litellm from its status code."""
+
+    def __init__(self, status_code: int, message: str, retry_after: float = 0.0):
+        super().__init__(status_code=status_code, message=message)
+        self.retry_after = retry_after
+
+
+class MockLLMProvider(CustomLLM):
+    """
+    Deterministic fake LLM provider for offline runs and load tests.
+
+    Responses are derived from a hash of the request and `seed`, so the same request always
+    gets the same answer, whatever the concurrency or order of the calls. Structured outputs
+    satisfy the JSON schema of the request's response format. Prompts whose expected output
+    is not declared in the request, such as JSON described in the prompt text, can be
+    registered with `register`.
+
+    Latency, injected errors and throttling are drawn from a separate random stream seeded
+    with `seed`, so a sequential run is reproducible.
+
+    Serve it in-process through litellm with `install`, then call models named
+    `mock/<anything>` from Generator, Prompt or CosineSimilarityMetric, or over HTTP with
+    MockProviderServer.
+
+    Example:
+        >>> provider = MockLLMProvider(latency=LatencyProfile(first_token=0.3, per_token=0.01))
+        >>> provider.install()
+        >>> await Generator().generate(Prompt(model="mock/gpt", messages=messages))
+
+    Args:
+        seed (int): Seed of the responses, latencies and faults. Defaults to 0.
+        latency (Optional[LatencyProfile]): Latency of completions. Defaults to none.
+        error_rate (float): Probability of a 500 error per request. Defaults to 0.
+        rate_limit_rate (float): Probability of a 429 error per request. Defaults to 0.
+        tokens_per_minute (Optional[int]): Token rate above which requests get 429 errors,
+            like a provider quota. Defaults to unlimited.
+        requests_per_minute (Optional[int]): Request rate above which requests get 429
+            errors. Defaults to unlimited.
+        responder (Optional[Callable[[Dict[str, Any]], Union[str, Dict[str, Any], None]]]):
+            Function returning the answer to a request body, e.g. the label of a dataset
+            item. Returning None falls back to the generated answer.
+        chunk_size (int): Characters per streamed chunk. Defaults to 16.
+        embedding_dim (int): Dimension of the embeddings. Defaults to 64.
+    """
+
+    def __init__(
+        self,
+        seed: int = 0,
+        latency: Optional[LatencyProfile] = None,
+        error_rate: float = 0.0,
+        rate_limit_rate: float = 0.0,
+        tokens_per_minute: Optional[int] = None,
+        requests_per_minute: Optional[int] = None,
+        responder: Optional[Callable[[Dict[str, Any]], Union[str, Dict[str, Any], None]]] = None,
+        chunk_size: int = 16,
+        embedding_dim: int = 64,
+    ):
+        super().__init__()
+        self.seed = seed
+        self.latency = latency or LatencyProfile()
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.responder = responder
+        self.chunk_size = max(1, chunk_size)
+        self.embedding_dim = embedding_dim
+        self._token_bucket = (
+            TokenBucket(tokens_per_minute / 60, tokens_per_minute) if tokens_per_minute else None
+        )
+        self._request_bucket = (
+            TokenBucket(requests_per_minute / 60, requests_per_minute)
+            if requests_per_minute
+            else None
+        )
+        self._templates: List[Tuple[str, Dict[str, Any]]] = []
+        self._rng = random.Random(seed)
+        self._lock = Lock()
+        self.stats: Dict[str, int] = {
+            "requests": 0,
+            "errors": 0,
+            "rate_limited": 0,
+            "prompt_tokens": 0,
+            "completion_tokens": 0,
+            "embeddings": 0,
+        }
+
+    def install(self, name: str = "mock") -> "MockLLMProvider":
+        """
+        Register the provider with litellm, replacing any provider with the same name.
+
+        Args:
+            name (str): Prefix of the mock model names. Defaults to "mock".
+
+        Returns:
+            MockLLMProvider: The provider.
+        """
+        litellm.custom_provider_map = [
+            entry for entry in litellm.custom_provider_map if entry.get("provider") != name
+        ] + [{"provider": name, "custom_handler": self}]
+        return self
+
+    def register(self, prompt: Any, schema: Optional[Dict[str, Any]] = None):
+        """
+        Declare the expected answer of a prompt, for requests that carry no JSON schema, such
+        as JSON described in the prompt text, or a looser one than the caller expects.
+
+        Requests are matched by the start of their first message, up to the first input; the
+        longest matching prompt wins.
+
+        Args:
+            prompt (Prompt): The prompt.
+            schema (Optional[Dict[str, Any]]): JSON schema of the answer. Defaults to the
+                schema of the prompt's response format, or an object of its declared outputs
+                as strings.
+        """
+        if not prompt.messages or not isinstance(prompt.messages[0].get("content"), str):
+            return
+        content = prompt.messages[0]["content"]
+        match = _PLACEHOLDER.search(content)
+        prefix = content[: match.start()] if match else content
+        if not prefix.strip():
+            logger.warning(f"Prompt {prompt.name} has no static prefix to match its requests")
+            return
+        if schema is None:
+            schema = response_format_schema(prompt.response_format)
+            if schema == _JSON_MODE_SCHEMA:
+                schema = None
+        if schema is None and prompt.outputs_desc:
+            schema = {
+                "type": "object",
+                "properties": {key: {"type": "string"} for key in prompt.outputs_desc},
+                "required": list(prompt.outputs_desc),
+            }
+        if schema is not None:
+            self._templates.append((prefix, schema))
+
+    def serve(
+        self,
+        prompts: Iterable[Any],
+        schemas: Optional[Dict[str, Dict[str, Any]]] = None,
+        prefix: Optional[str] = "mock",
+    ):
+        """
+        Register prompts and reroute their models to the provider.
+
+        Meant for shared prompt collections, such as the meta-prompts of the trainers, whose
+        models are not set by the caller.
+
+        Args:
+            prompts (Iterable[Prompt]): The prompts, modified in place.
+            schemas (Optional[Dict[str, Dict[str, Any]]]): Answer schemas by prompt name,
+                overriding the response format of the prompt.
+            prefix (Optional[str]): Provider name the models are rerouted to, as passed to
+                `install`. None keeps the models, e.g. when they already reach a
+                MockProviderServer. Defaults to "mock".
+        """
+        schemas = schemas or {}
+        for prompt in prompts:
+            self.register(prompt, schema=schemas.get(prompt.name))
+            if prefix and prompt.model and not prompt.model.startswith(f"{prefix}/"):
+                prompt.model = f"{prefix}/{prompt.model}"
+
+    def _count(self, name: str, value: int = 1):
+        with self._lock:
+            self.stats[name] += value
+
+    def fault(self, tokens: int) -> Optional[Tuple[int, str, float]]:
+        """
+        Decide whether a request fails.
+
+        Args:
+            tokens (int): Tokens of the request, counted against the token rate.
+
+        Returns:
+            Optional[Tuple[int, str, float]]: The status code, message and retry-after delay
+                in seconds of the error, or None if the request succeeds.
+        """
+        with self._lock:
+            draw = self._rng.random()
+        if draw < self.rate_limit_rate:
+            self._count("rate_limited")
+            return 429, "Rate limit reached (injected)", 1.0
+        if draw < self.rate_limit_rate + self.error_rate:
+            self._count("errors")
+            return 500, "Internal server error (injected)", 0.0
+        for bucket, amount, unit in (
+            (self._request_bucket, 1, "requests"),
+            (self._token_bucket, tokens, "tokens"),
+        ):
+            if bucket is None:
+                continue
+            wait = bucket.reserve(amount)
+            if wait > 0:
+                # Rejected requests do not consume the quota
+                bucket.reserve(-amount)
+                self._count("rate_limited")
+                return 429, f"Rate limit reached for {unit} per minute", wait
+        return None
+
+    def sample_latency(self) -> Tuple[float, float]:
+        """
+        Sample the latency of a completion.
+
+        Returns:
+            Tuple[float, float]: Time to the first token, and time per output token.
+        """
+        with self._lock:
+            first_token = self.latency.sample(self.latency.first_token, self._rng)
+            per_token = self.latency.sample(self.latency.per_token, self._rng)
+        return first_token, per_token
+
+    def respond(self, request: Dict[str, Any]) -> str:
+        """
+        Build the deterministic answer to a chat completion request.
+
+        Args:
+            request (Dict[str, Any]): The request body, with `messages`, and optionally
+                `model` and `response_format`.
+
+        Returns:
+            str: The completion content.
+        """
+        messages = request.get("messages") or []
+        response_format = request.get("response_format")
+        rng = random.Random(
+            int(
+                fast_hash(
+                    canonical_json([self.seed, request.get("model"), messages, response_format])
+                ),
+                16,
+            )
+        )
+        if self.responder is not None:
+            answer = self.responder(request)
+            if answer is not None:
+                return answer if isinstance(answer, str) else json.dumps(answer)
+
+        # Registered prompts come first, their schema can be stricter than the request's
+        schema = None
+        first = _message_text(messages[0]) if messages else ""
+        matched = 0
+        for prefix, template_schema in self._templates:
+            if len(prefix) > matched and first.startswith(prefix):
+                schema, matched = template_schema, len(prefix)
+        if schema is None:
+            schema = response_format_schema(response_format)
+        if schema == _JSON_MODE_SCHEMA:
+            return json.dumps({"answer": _sentence(rng)})
+        if schema is not None:
+            return json.dumps(sample_schema(schema, rng))
+        return _sentence(rng, rng.randint(8, 40))
+
+    def embed(self, text: str) -> List[float]:
+        """Deterministic unit embedding of a text; equal texts get equal embeddings."""
+        rng = random.Random(int(fast_hash(canonical_json([self.seed, text])), 16))
+        vector = [rng.gauss(0, 1) for _ in range(self.embedding_dim)]
+        norm = math.sqrt(sum(value * value for value in vector)) or 1.0
+        return [value / norm for value in vector]
+
+    def complete(self, request: Dict[str, Any]) -> Tuple[str, Dict[str, int]]:
+        """
+        Answer a chat completion request, or fail it according to the injected faults.
+
+        Args:
+            request (Dict[str, Any]): The request body.
+
+        Returns:
+            Tuple[str, Dict[str, int]]: The completion content and its usage.
+
+        Raises:
+            MockProviderError: If the request fails.
+        """
+        content = self.respond(request)
+        prompt_tokens = estimate_tokens(request.get("messages"))
+        completion_tokens = estimate_tokens(content)
+        self._count("requests")
+        error = self.fault(prompt_tokens + completion_tokens)
+        if error is not None:
+            raise MockProviderError(*error)
+        self._count("prompt_tokens", prompt_tokens)
+        self._count("completion_tokens", completion_tokens)
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        }
+        return content, usage
+
+    def embed_all(self, inputs: List[Any]) -> List[List[float]]:
+        """
+        Embed texts, or fail according to the injected faults.
+
+        Raises:
+            MockProviderError: If the request fails.
+        """
+        self._count("requests")
+        error = self.fault(estimate_tokens(inputs))
+        if error is not None:
+            raise MockProviderError(*error)
+        self._count("embeddings", len(inputs))
+        return [self.embed(str(text)) for text in inputs]
+
+    def chunks(self, content: str) -> List[str]:
+        """Split a completion into streamed chunks."""
+        return [content[i : i + self.chunk_size] for i in range(0, len(content), self.chunk_size)]
+
+    # litellm calls the handler methods with keyword arguments only
+
+    async def acompletion(
+        self,
+        model: str,
+        messages: List[Any],
+        model_response: Any,
+        optional_params: Dict[str, Any],
+        **kwargs,
+    ) -> Any:
+        content, usage = self.complete(_request(model, messages, optional_params))
+        first_token, per_token = self.sample_latency()
+        await asyncio.sleep(first_token + per_token * usage["completion_tokens"])
+        model_response.choices[0].message.content = content
+        model_response.model = model
+        model_response.usage = litellm.Usage(**usage)
+        return model_response
+
+    async def astreaming(
+        self, model: str, messages: List[Any], optional_params: Dict[str, Any], **kwargs
+    ) -> AsyncIterator[Dict[str, Any]]:
+        content, usage = self.complete(_request(model, messages, optional_params))
+        first_token, per_token = self.sample_latency()
+        await asyncio.sleep(first_token)
+        chunks = self.chunks(content) or [""]
+        for index, text in enumerate(chunks):
+            if index > 0 and per_token:
+                await asyncio.sleep(per_token * estimate_tokens(text))
+            last = index == len(chunks) - 1
+            yield {
+                "text": text,
+                "is_finished": last,
+                "finish_reason": "stop" if last else None,
+                "usage": usage if last else None,
+                "index": 0,
+                "tool_use": None,
+            }
+
+    async def aembedding(
+        self, model: str, input: Union[str, List[Any]], model_response: Any, **kwargs
+    ) -> Any:
+        inputs = [input] if isinstance(input, str) else list(input)
+        embeddings = self.embed_all(inputs)
+        first_token, _ = self.sample_latency()
+        await asyncio.sleep(first_token)
+        model_response.data = [
+            {"object": "embedding", "index": index, "embedding": embedding}
+            for index, embedding in enumerate(embeddings)
+        ]
+        model_response.model = model
+        return model_response
+
+
+def _request(model: str, messages: List[Any], optional_params: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "model": model,
+        "messages": messages,
+        "response_format": optional_params.get("response_format"),
+    }
+
+
+def _message_text(message: Any) -> str:
+    content = message.get("content") if isinstance(message, dict) else message
+    if isinstance(content, list):
+        return "".join(block.get("text", "") for block in content if isinstance(block, dict))
+    return content if isinstance(content, str) else ""
+
+
+def _sentence(rng: random.Random, words: Optional[int] = None) -> str:
+    words = words or rng.randint(3, 12)
+    text = " ".join(rng.choice(_WORDS) for _ in range(words))
+    return text[:1].upper() + text[1:] + "."
+
+
+def sample_schema(
+    schema: Dict[str, Any], rng: random.Random, root: Optional[Dict[str, Any]] = None
+) -> Any:
+    """
+    Generate a value satisfying a JSON schema.
+
+    Supports the subset used by structured outputs: types, properties, items, enum, const,
+    local `$ref`, `anyOf`/`oneOf`, and length and range bounds.
+
+    Args:
+        schema (Dict[str, Any]): The JSON schema.
+        rng (random.Random): Source of randomness.
+        root (Optional[Dict[str, Any]]): Root schema that references resolve against.
+
+    Returns:
+        Any: A value satisfying the schema.
+    """
+    root = root if root is not None else schema
+    if "$ref" in schema:
+        target: Any = root
+        for part in schema["$ref"].lstrip("#/").split("/"):
+            target = target.get(part, {}) if part else target
+        return sample_schema(target, rng, root)
+    if "const" in schema:
+        return schema["const"]
+    if "enum" in schema:
+        return rng.choice(schema["enum"])
+    for key in ("anyOf", "oneOf"):
+        if schema.get(key):
+            options = [option for option in schema[key] if option.get("type") != "null"] or schema[
+                key
+            ]
+            return sample_schema(options[0], rng, root)
+    if schema.get("allOf"):
+        return sample_schema(schema["allOf"][0], rng, root)
+
+    kind = schema.get("type")
+    if isinstance(kind, list):
+        kind = next((k for k in kind if k != "null"), "null")
+    if kind is None:
+        kind = "object" if "properties" in schema else "array" if "items" in schema else "string"
+
+    if kind == "object":
+        return {
+            key: sample_schema(value, rng, root)
+            for key, value in (schema.get("properties") or {}).items()
+        }
+    if kind == "array":
+        low = schema.get("minItems", 1)
+        high = max(low, schema.get("maxItems", low + 2))
+        return [
+            sample_schema(schema.get("items") or {}, rng, root)
+            for _ in range(rng.randint(low, high))
+        ]
+    if kind == "integer":
+        return rng.randint(int(schema.get("minimum", 0)), int(schema.get("maximum", 10)))
+    if kind == "number":
+        return round(rng.uniform(schema.get("minimum", 0.0), schema.get("maximum", 1.0)), 3)
+    if kind == "boolean":
+        return rng.random() < 0.5
+    if kind == "null":
+        return None
+    text = _sentence(rng)
+    min_length = schema.get("minLength", 0)
+    if len(text) < min_length:
+        text = (text + " ") * (min_length // len(text) + 1)
+    return text[: schema.get("maxLength", len(text))]
+
+
+class MockProviderServer(MockLLMServer):
+    """
+    MockLLMServer answering with a MockLLMProvider, for load tests over real HTTP connections.
+
+    Streamed completions are sent chunk by chunk with the provider's latency, and injected
+    429 errors carry a `retry-after` header. Point litellm at it with
+    `api_base=server.base_url` and an `openai/` model prefix.
+
+    Example:
+        >>> async with MockProviderServer(MockLLMProvider(error_rate=0.05)) as server:
+        ...     res = await acompletion(
+        ...         model="openai/mock", api_base=server.base_url, api_key="mock", messages=messages
+        ...     )
+
+    Args:
+        provider (Optional[MockLLMProvider]): The provider. Defaults to a MockLLMProvider.
+        host (str): Host to bind. Defaults to "127.0.0.1".
+        port (int): Port to bind, 0 for any free port. Defaults to 0.
+    """
+
+    def __init__(
+        self,
+        provider: Optional[MockLLMProvider] = None,
+        host: str = "127.0.0.1",
+        port: int = 0,
+    ):
+        super().__init__(host=host, port=port)
+        self.provider = provider or MockLLMProvider()
+
+    async def respond(self, method: str, path: str, body: bytes) -> Tuple[Any, ...]:
+        try:
+            request = json.loads(body) if body else {}
+        except json.JSONDecodeError:
+            return 400, "application/json", b'{"error": {"message": "Invalid JSON body"}}'
+        provider = self.provider
+        try:
+            if method == "POST" and path.endswith("/chat/completions"):
+                content, usage = provider.complete(request)
+                first_token, per_token = provider.sample_latency()
+                if request.get("stream"):
+                    return (
+                        200,
+                        "text/event-stream",
+                        self._stream(request, content, usage, first_token, per_token),
+                    )
+                await asyncio.sleep(first_token + per_token * usage["completion_tokens"])
+                return (
+                    200,
+                    "application/json",
+                    json.dumps(_completion(request, content, usage)).encode(),
+                )
+            if method == "POST" and path.endswith("/embeddings"):
+                inputs = request.get("input", [])
+                inputs = [inputs] if isinstance(inputs, str) else inputs
+                embeddings = iter(provider.embed_all(inputs))
+                await asyncio.sleep(provider.sample_latency()[0])
+                payload = _embeddings(request, inputs, embed=lambda text: next(embeddings))
+                return 200, "application/json", json.dumps(payload).encode()
+        except MockProviderError as e:
+            error = {
+                "error": {
+                    "message": e.message,
+                    "type": "rate_limit_error" if e.status_code == 429 else "server_error",
+                }
+            }
+            headers = {"retry-after": f"{e.retry_after:.3f}"} if e.retry_after else {}
+            return e.status_code, "application/json", json.dumps(error).encode(), headers
+        return 404, "application/json", b'{"error": {"message": "Not found"}}'
+
+    async def _stream(
+        self,
+        request: Dict[str, Any],
+        content: str,
+        usage: Dict[str, int],
+        first_token: float,
+        per_token: float,
+    ) -> AsyncIterator[bytes]:
+        chunks = self.provider.chunks(content)
+        events = _stream_events(request, content, self.provider.chunk_size, usage)
+        await asyncio.sleep(first_token)
+        yield events[0]
+        for index, event in enumerate(events[1:], start=1):
+            if index <= len(chunks) and index > 1 and per_token:
+                await asyncio.sleep(per_token * estimate_tokens(chunks[index - 1]))
+            yield event
@@ -0,0 +1,245 @@
+import asyncio
+import json
+import time
+import uuid
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from ape.common.utils.logging import logger
+
+
+class MockLLMServer:
+    """
+    Minimal OpenAI-compatible HTTP server for local benchmarks and tests.
+
+    Serves `/chat/completions` (plain and streamed) and `/embeddings` over HTTP/1.1 with
+    keep-alive, after an artificial `latency`. Point litellm at it with
+    `api_base=server.base_url` and an `openai/` model prefix.
+
+    Example:
+        >>> async with MockLLMServer(latency=0.05) as server:
+        ...     res = await acompletion(
+        ...         model="openai/mock", api_base=server.base_url, api_key="mock", messages=messages
+        ...     )
+
+    Args:
+        host (str): Host to bind. Defaults to "127.0.0.1".
+        port (int): Port to bind, 0 for any free port. Defaults to 0.
+        latency (float): Seconds to wait before answering each request. Defaults to 0.
+        responder (Optional[Callable[[Dict[str, Any]], str]]): Function returning the
+            completion content of a request body. Defaults to a fixed answer.
+    """
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency: float = 0.0,
+        responder: Optional[Callable[[Dict[str, Any]], str]] = None,
+    ):
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.responder = responder or (lambda body: "This is a mock response.")
+        self.connections = 0
+        self.requests = 0
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._writers: Set[asyncio.StreamWriter] = set()
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}/v1"
+
+    async def start(self) -> "MockLLMServer":
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            for writer in list(self._writers):
+                writer.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def __aenter__(self) -> "MockLLMServer":
+        return await self.start()
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.stop()
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.connections += 1
+        self._writers.add(writer)
+        try:
+            while True:
+                request = await self._read_request(reader)
+                if request is None:
+                    break
+                method, path, headers, body = request
+                self.requests += 1
+                status, content_type, payload, *extra = await self.respond(method, path, body)
+                keep_alive = headers.get("connection", "").lower() != "close"
+                head = (
+                    f"HTTP/1.1 {status} {'OK' if status == 200 else 'Error'}\r\n"
+                    f"Content-Type: {content_type}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n"
+                    + "".join(f"{name}: {value}\r\n" for name, value in (extra or [{}])[0].items())
+                )
+                if isinstance(payload, bytes):
+                    writer.write(f"{head}Content-Length: {len(payload)}\r\n\r\n".encode() + payload)
+                else:
+                    # Streamed payloads are sent as they are produced, with chunked encoding
+                    writer.write(f"{head}Transfer-Encoding: chunked\r\n\r\n".encode())
+                    async for part in payload:
+                        if part:
+                            writer.write(f"{len(part):x}\r\n".encode() + part + b"\r\n")
+                            await writer.drain()
+                    writer.write(b"0\r\n\r\n")
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.CancelledError):
+            pass
+        except Exception as e:
+            logger.error(f"Mock server error: {e}")
+        finally:
+            self._writers.discard(writer)
+            writer.close()
+
+    async def _read_request(
+        self, reader: asyncio.StreamReader
+    ) -> Optional[Tuple[str, str, Dict[str, str], bytes]]:
+        request_line = await reader.readline()
+        if not request_line:
+            return None
+        method, path, _ = request_line.decode("latin-1").split(" ", 2)
+        headers: Dict[str, str] = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        body = await reader.readexactly(int(headers.get("content-length", 0)))
+        return method, path, headers, body
+
+    async def respond(self, method: str, path: str, body: bytes) -> Tuple[Any, ...]:
+        """
+        Build the response to a request.
+
+        Returns:
+            Tuple[Any, ...]: The status code, content type and payload, optionally followed by
+                a dict of extra headers. The payload is either bytes or an async iterator of
+                bytes, which is streamed with chunked encoding.
+        """
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        try:
+            request = json.loads(body) if body else {}
+        except json.JSONDecodeError:
+            return 400, "application/json", b'{"error": {"message": "Invalid JSON body"}}'
+
+        if method == "POST" and path.endswith("/chat/completions"):
+            content = self.responder(request)
+            if request.get("stream"):
+                return 200, "text/event-stream", _stream_payload(request, content)
+            return 200, "application/json", json.dumps(_completion(request, content)).encode()
+        if method == "POST" and path.endswith("/embeddings"):
+            inputs = request.get("input", [])
+            inputs = [inputs] if isinstance(inputs, str) else inputs
+            return 200, "application/json", json.dumps(_embeddings(request, inputs)).encode()
+        return 404, "application/json", b'{"error": {"message": "Not found"}}'
+
+
+def _usage(request: Dict[str, Any], content: str) -> Dict[str, int]:
+    prompt_tokens = len(json.dumps(request.get("messages", request.get("input", "")))) // 4 + 1
+    completion_tokens = len(content) // 4 + 1 if content else 0
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+    }
+
+
+def _completion(
+    request: Dict[str, Any], content: str, usage: Optional[Dict[str, int]] = None
+) -> Dict[str, Any]:
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": request.get("model", "mock"),
+        "choices": [
+            {
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }
+        ],
+        "usage": usage or _usage(request, content),
+    }
+
+
+def _stream_payload(request: Dict[str, Any], content: str, chunk_size: int = 16) -> bytes:
+    return b"".join(_stream_events(request, content, chunk_size))
+
+
+def _stream_events(
+    request: Dict[str, Any],
+    content: str,
+    chunk_size: int = 16,
+    usage: Optional[Dict[str, int]] = None,
+) -> List[bytes]:
+    """Server-sent events of a streamed completion: role, one per content chunk, then the end."""
+    completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+    created = int(time.time())
+    model = request.get("model", "mock")
+
+    def event(delta: Dict[str, Any], finish_reason: Optional[str] = None, **extra) -> bytes:
+        chunk = {
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "created": created,
+            "model": model,
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+            **extra,
+        }
+        return f"data: {json.dumps(chunk)}\n\n".encode()
+
+    events = [event({"role": "assistant", "content": ""})]
+    for i in range(0, len(content), chunk_size):
+        events.append(event({"content": content[i : i + chunk_size]}))
+    events.append(event({}, finish_reason="stop"))
+    if (request.get("stream_options") or {}).get("include_usage"):
+        usage_chunk = {
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "created": created,
+            "model": model,
+            "choices": [],
+            "usage": usage or _usage(request, content),
+        }
+        events.append(f"data: {json.dumps(usage_chunk)}\n\n".encode())
+    events.append(b"data: [DONE]\n\n")
+    return events
+
+
+def _embeddings(
+    request: Dict[str, Any], inputs: list, embed: Optional[Callable[[str], List[float]]] = None
+) -> Dict[str, Any]:
+    data = []
+    for index, text in enumerate(inputs):
+        text = str(text)
+        if embed is not None:
+            vector = embed(text)
+        else:
+            # Deterministic pseudo-embedding derived from the characters of the input
+            vector = [((sum(map(ord, text)) * (i + 1)) % 997) / 997.0 for i in range(8)]
+        data.append({"object": "embedding", "index": index, "embedding": vector})
+    return {
+        "object": "list",
+        "data": data,
+        "model": request.get("model", "mock"),
+        "usage": {"prompt_tokens": 1, "total_tokens": 1},
+    }
@@ -1,8 +1,11 @@
 from .prompt_base import Prompt
 from .cost_tracker import CostTracker, CostTrackerContext
+from .token_budget import ContextBudgetExceeded, TokenBudget
 
 __all__ = [
     "Prompt",
     "CostTracker",
     "CostTrackerContext",
+    "TokenBudget",
+    "ContextBudgetExceeded",
 ]
@@ -28,6 +28,11 @@ class CostTracker:
         get_total_cost(cls) -> float: Returns the total accumulated cost.
         get_cost_breakdown(cls) -> Dict[str, float]: Returns the breakdown of costs by category.
         reset(cls) -> None: Resets the cost tracker to its initial state.
+        add_hedge(cls, extra_cost: float, latency_saved: float) -> None: Records a hedged request.
+        get_hedging_stats(cls) -> Dict[str, float]: Returns the extra cost and latency saved by hedging.
+        add_token_usage(cls, input_tokens: int, cached_tokens: int, cache_write_tokens: int) -> None:
+            Records the input tokens of a request.
+        get_token_usage(cls) -> Dict[str, float]: Returns the cached and uncached input tokens.
         set_context(cls, context_uuid: str) -> None: Sets the context for cost tracking.
     """
 
@@ -47,6 +52,18 @@ class CostTracker:
         self.context_uuid: ContextVar[Optional[str]] = ContextVar("context_uuid", default=None)
         self.cost_queue: Dict[str, asyncio.Queue] = defaultdict(asyncio.Queue)
         self.cost_breakdown: Dict[str, float] = defaultdict(float)
+        self.hedging: Dict[str, float] = {
+            "hedged_requests": 0,
+            "hedge_wins": 0,
+            "extra_cost": 0.0,
+            "latency_saved": 0.0,
+        }
+        self.token_usage: Dict[str, int] = {
+            "requests": 0,
+            "input_tokens": 0,
+            "cached_input_tokens": 0,
+            "cache_write_tokens": 0,
+        }
         self._lock = asyncio.Lock()
 
     @classmethod
@@ -87,6 +104,65 @@ class CostTracker:
     def get_cost_breakdown(cls) -> Dict[str, float]:
         return dict(cls()._instance.cost_breakdown)
 
+    @classmethod
+    async def add_hedge(cls, extra_cost: float, latency_saved: float, won: bool = False) -> None:
+        """
+        Record a hedged request. Its extra cost is also added under the "hedging" label.
+
+        Args:
+            extra_cost (float): Estimated cost of the duplicate request.
+            latency_saved (float): Estimated seconds saved, 0 if the duplicate lost.
+            won (bool): Whether the duplicate finished first.
+        """
+        instance = cls()
+        async with instance._lock:
+            instance.hedging["hedged_requests"] += 1
+            instance.hedging["hedge_wins"] += int(won)
+            instance.hedging["extra_cost"] += extra_cost
+            instance.hedging["latency_saved"] += latency_saved
+        if extra_cost:
+            await cls.add_cost(cost=extra_cost, label="hedging")
+
+    @classmethod
+    def get_hedging_stats(cls) -> Dict[str, float]:
+        return dict(cls()._instance.hedging)
+
+    @classmethod
+    async def add_token_usage(
+        cls, input_tokens: int, cached_tokens: int = 0, cache_write_tokens: int = 0
+    ) -> None:
+        """
+        Record the input tokens of a request.
+
+        Args:
+            input_tokens (int): Total input tokens, including the cached ones.
+            cached_tokens (int): Input tokens read from the provider's prompt cache, which are
+                billed at a discount.
+            cache_write_tokens (int): Input tokens written to the provider's prompt cache.
+        """
+        instance = cls()
+        async with instance._lock:
+            instance.token_usage["requests"] += 1
+            instance.token_usage["input_tokens"] += input_tokens
+            instance.token_usage["cached_input_tokens"] += cached_tokens
+            instance.token_usage["cache_write_tokens"] += cache_write_tokens
+
+    @classmethod
+    def get_token_usage(cls) -> Dict[str, float]:
+        """
+        Get the input tokens recorded so far, split into cached and uncached tokens.
+
+        Returns:
+            Dict[str, float]: Request and token counts, plus `cache_hit_rate`, the share of
+                input tokens read from the prompt cache.
+        """
+        usage: Dict[str, float] = dict(cls()._instance.token_usage)
+        usage["uncached_input_tokens"] = usage["input_tokens"] - usage["cached_input_tokens"]
+        usage["cache_hit_rate"] = (
+            usage["cached_input_tokens"] / usage["input_tokens"] if usage["input_tokens"] else 0.0
+        )
+        return usage
+
     @classmethod
     def reset(cls) -> None:
         cls()._initialize()
@@ -0,0 +1,151 @@
+import copy
+from typing import Any, Dict, List, Optional, Tuple
+
+from litellm import get_llm_provider
+
+from .cost_tracker import CostTracker
+
+FEWSHOT_PLACEHOLDER = "{_FEWSHOT_}"
+EPHEMERAL_CACHE_CONTROL = {"type": "ephemeral"}
+
+# Providers that only cache a prompt prefix marked with `cache_control` breakpoints.
+# OpenAI compatible providers cache the longest previously seen prefix automatically.
+_EXPLICIT_CACHE_PROVIDERS = {"anthropic", "bedrock", "vertex_ai", "vertex_ai_beta"}
+
+_provider_cache: Dict[str, bool] = {}
+
+
+def supports_cache_control(model: Optional[str]) -> bool:
+    """
+    Check whether requests to `model` need `cache_control` hints for prefix caching.
+
+    Args:
+        model (Optional[str]): The model name, as passed to litellm.
+
+    Returns:
+        bool: True for Anthropic models, served directly or through Bedrock or Vertex AI.
+    """
+    if not model:
+        return False
+    supported = _provider_cache.get(model)
+    if supported is None:
+        try:
+            provider = get_llm_provider(model)[1]
+        except Exception:
+            provider = None
+        supported = provider == "anthropic" or (
+            provider in _EXPLICIT_CACHE_PROVIDERS and "claude" in model
+        )
+        _provider_cache[model] = supported
+    return supported
+
+
+def static_prefix(
+    template: List[Dict[str, Any]], inputs: Dict[str, Any], fewshot: str = ""
+) -> Optional[Tuple[int, str]]:
+    """
+    Find where the part of a prompt that does not depend on the inputs ends.
+
+    Messages are formatted by replacing placeholders, so everything before the first input
+    placeholder of the template is identical across calls. The few-shot block is static.
+
+    Args:
+        template (List[Dict[str, Any]]): The unformatted messages.
+        inputs (Dict[str, Any]): The inputs the messages are formatted with.
+        fewshot (str): The formatted few-shot block.
+
+    Returns:
+        Optional[Tuple[int, str]]: The index of the first message containing an input, and
+            its formatted static text, or None if no message depends on the inputs.
+    """
+    placeholders = [f"{{{key}}}" for key in inputs if key != "_FEWSHOT_"]
+    for index, message in enumerate(template):
+        content = message.get("content")
+        if not isinstance(content, str):
+            return None
+        offsets = [offset for offset in map(content.find, placeholders) if offset >= 0]
+        if offsets:
+            return index, content[: min(offsets)].replace(FEWSHOT_PLACEHOLDER, fewshot)
+    return None
+
+
+def add_cache_control(
+    template: List[Dict[str, Any]],
+    messages: List[Dict[str, Any]],
+    inputs: Dict[str, Any],
+    fewshot: str = "",
+) -> List[Dict[str, Any]]:
+    """
+    Mark the end of the static prefix of formatted messages with a `cache_control` breakpoint.
+
+    The message holding the first input is split into two text blocks, the static text and
+    the rest, and the breakpoint goes on the static one. Prompts without any input are left
+    unmarked, since a breakpoint on content that changes between calls only pays for cache
+    writes.
+
+    Args:
+        template (List[Dict[str, Any]]): The unformatted messages.
+        messages (List[Dict[str, Any]]): The messages formatted with `inputs`.
+        inputs (Dict[str, Any]): The inputs of the call.
+        fewshot (str): The formatted few-shot block.
+
+    Returns:
+        List[Dict[str, Any]]: The messages with the breakpoint, or `messages` unchanged.
+    """
+    boundary = static_prefix(template, inputs, fewshot)
+    if boundary is None or len(messages) != len(template):
+        return messages
+    index, static_text = boundary
+    content = messages[index].get("content")
+    if not isinstance(content, str) or not content.startswith(static_text):
+        return messages
+
+    messages = copy.copy(messages)
+    if static_text:
+        blocks = [{"type": "text", "text": static_text, "cache_control": EPHEMERAL_CACHE_CONTROL}]
+        if len(content) > len(static_text):
+            blocks.append({"type": "text", "text": content[len(static_text):]})
+        messages[index] = {**messages[index], "content": blocks}
+    elif index > 0 and isinstance(messages[index - 1].get("content"), str):
+        previous = messages[index - 1]
+        messages[index - 1] = {
+            **previous,
+            "content": [
+                {"type": "text", "text": previous["content"], "cache_control": EPHEMERAL_CACHE_CONTROL}
+            ],
+        }
+    return messages
+
+
+def _read(obj: Any, name: str) -> Any:
+    if isinstance(obj, dict):
+        return obj.get(name)
+    return getattr(obj, name, None)
+
+
+def prompt_token_usage(usage: Any) -> Optional[Tuple[int, int, int]]:
+    """
+    Read the input token counts of a response.
+
+    Args:
+        usage (Any): The `usage` of a litellm response, or its dict form from a batch output.
+
+    Returns:
+        Optional[Tuple[int, int, int]]: Input tokens, input tokens read from the provider's
+            prompt cache, and input tokens written to it, or None if there is no usage.
+    """
+    if usage is None:
+        return None
+    input_tokens = _read(usage, "prompt_tokens") or 0
+    cached_tokens = _read(_read(usage, "prompt_tokens_details"), "cached_tokens") or 0
+    # Anthropic reports cache reads and writes separately
+    cached_tokens = cached_tokens or _read(usage, "cache_read_input_tokens") or 0
+    cache_write_tokens = _read(usage, "cache_creation_input_tokens") or 0
+    return int(input_tokens), int(cached_tokens), int(cache_write_tokens)
+
+
+async def record_token_usage(usage: Any) -> None:
+    """Record the cached and uncached input tokens of a response in the CostTracker."""
+    counts = prompt_token_usage(usage)
+    if counts is not None:
+        await CostTracker.add_token_usage(*counts)
@@ -1,6 +1,6 @@
 import json
 import os
-from typing import Any, Dict, List, Optional, Union
+from typing import Any, Dict, List, Optional, Tuple, Union
 import litellm
 from litellm import acompletion
 from litellm._logging import verbose_logger as litellm_logger
@@ -11,14 +11,25 @@ import promptfile as pf
 
 from .cost_tracker import CostTracker
 from .utils import format_fewshot
+from .prefix_cache import add_cache_control, record_token_usage, supports_cache_control
+from .token_budget import DEFAULT_TOKEN_BUDGET, TokenBudget
 from ape.common.types import DatasetItem, ResponseFormat
 from ape.common.utils import logger
+from ape.common.utils.single_flight import SingleFlight
+from ape.common.utils.rate_limiter import RateLimiter, estimate_tokens
+from ape.common.utils.retry import RetryPolicy
+from ape.common.utils.tokens import count_tokens
 from ape.common.cache.prompt_cache import PromptCache
+from ape.common.cache.keys import prompt_fingerprint, prompt_key
 
 
 litellm_logger.disabled = True
 litellm.suppress_debug_info = True
 
+_single_flight = SingleFlight("prompt")
+# Shared by prompt calls that do not pass their own policy
+DEFAULT_RETRY_POLICY = RetryPolicy()
+
 prompt_messages_json_schema = {
     "name": "prompt",
     "description": "Creates a prompt consisting of a list of messages.",
@@ -71,10 +82,15 @@ class Prompt(pf.Prompt):
 
     Attributes:
         _optimized (bool): A flag indicating whether the prompt has been optimized.
+        _fingerprint (Optional[str]): Memoized content fingerprint, see `fingerprint()`.
+        _fewshot_block (Optional[Tuple[str, str]]): Memoized few-shot block and the
+            fingerprint it was formatted for.
 
     """
 
     _optimized = False
+    _fingerprint: Optional[str] = None
+    _fewshot_block: Optional[Tuple[str, str]] = None
     messages: List[ChatCompletionMessageParam]
     model_config = ConfigDict(extra="allow", arbitrary_types_allowed=True)
 
@@ -92,6 +108,35 @@ class Prompt(pf.Prompt):
         )
         self._ensure_metadata()
 
+    def __setattr__(self, name: str, value: Any):
+        if name in ("messages", "model", "metadata"):
+            self._fingerprint = None
+        super().__setattr__(name, value)
+
+    def fingerprint(self) -> str:
+        """
+        Get the content fingerprint of the prompt, used as part of cache keys.
+
+        The fingerprint covers the model, messages, few-shot examples, temperature and
+        response format. It is memoized and invalidated when any of these are reassigned;
+        mutating `messages` or `metadata` in place requires reassigning them.
+
+        Returns:
+            str: The fingerprint.
+        """
+        # Read the private attribute directly, pydantic's __getattr__ is slow on the hot path
+        fingerprint = self.__pydantic_private__.get("_fingerprint")
+        if fingerprint is None:
+            fingerprint = prompt_fingerprint(
+                model=self.model,
+                messages=self.messages,
+                fewshot=self.fewshot,
+                temperature=self.temperature,
+                response_format=self.response_format,
+            )
+            self._fingerprint = fingerprint
+        return fingerprint
+
     def _ensure_metadata(self):
         """
         Ensure that the metadata dictionary has all necessary default keys.
@@ -125,6 +170,7 @@ class Prompt(pf.Prompt):
     def temperature(self, value: Optional[float]):
         """Set the temperature of the prompt."""
         self.metadata["temperature"] = value
+        self._fingerprint = None
 
     @property
     def response_format(self) -> Optional[ResponseFormat]:
@@ -135,6 +181,7 @@ class Prompt(pf.Prompt):
     def response_format(self, value: Optional[ResponseFormat]):
         """Set the response format."""
         self.metadata["response_format"] = value
+        self._fingerprint = None
 
     @property
     def fewshot(self) -> Optional[List[DatasetItem]]:
@@ -145,6 +192,7 @@ class Prompt(pf.Prompt):
     def fewshot(self, value: Optional[List[Dict[str, Any]]]):
         """Set the few-shot examples."""
         self.metadata["fewshot"] = value
+        self._fingerprint = None
 
     @property
     def inputs_desc(self) -> Optional[Dict[str, str]]:
@@ -180,6 +228,8 @@ class Prompt(pf.Prompt):
         num_retries: int = 3,
         _retry_count: Optional[int] = 0,
         parallel_task_id: Optional[int] = 0,
+        retry_policy: Optional[RetryPolicy] = None,
+        token_budget: Optional[TokenBudget] = None,
         **kwargs,
     ) -> Union[str, Dict[str, Any]]:
         """
@@ -188,12 +238,18 @@ class Prompt(pf.Prompt):
         Args:
             lm_config (Optional[Dict[str, Any]]): Configuration for the language model.
             num_retries (int): Number of retries for API calls. Defaults to 3.
+            retry_policy (Optional[RetryPolicy]): Policy used to retry failed API calls.
+                Defaults to a shared policy with exponential backoff and full jitter.
+            token_budget (Optional[TokenBudget]): Context budget checked before the call,
+                which may truncate declared inputs. Defaults to a budget rejecting calls over
+                the context window of the model.
             **kwargs: Additional keyword arguments for the prompt.
 
         Returns:
             Union[str, Dict[str, Any]]: The response from the language model.
 
         Raises:
+            ContextBudgetExceeded: If the call does not fit the context budget.
             Exception: If the API call fails after all retries.
         """
         if lm_config is None:
@@ -212,33 +268,67 @@ class Prompt(pf.Prompt):
                 )
                 return None
 
+        # Over-long calls fail here instead of after a round trip
+        prompt, kwargs = (token_budget or DEFAULT_TOKEN_BUDGET).fit(
+            self, kwargs, max_output_tokens=lm_config.get("max_tokens")
+        )
+
         cache = PromptCache.get_instance()
+        hash_key = prompt_key(prompt, lm_config, kwargs, parallel_task_id)
         if cache:
-            cached_result = cache.get(self.messages, lm_config, kwargs, parallel_task_id)
+            cached_result = cache.get(prompt, lm_config, kwargs, parallel_task_id, hash_key=hash_key)
             if cached_result:
                 # logger.debug(f"Cache hit on Prompt {self.name}")
                 return cached_result
 
-        messages = self.format(**kwargs).messages
+        # Concurrent identical calls, e.g. from copies of the same prompt, share one completion
+        return await _single_flight.do(
+            hash_key,
+            lambda: prompt._complete(
+                lm_config, num_retries, retry_policy, parallel_task_id, cache, hash_key, kwargs
+            ),
+        )
+
+    async def _complete(
+        self,
+        lm_config: Dict[str, Any],
+        num_retries: int,
+        retry_policy: Optional[RetryPolicy],
+        parallel_task_id: int,
+        cache: Optional[PromptCache],
+        hash_key: str,
+        kwargs: Dict[str, Any],
+    ) -> Union[str, Dict[str, Any]]:
+        messages = self.format_request(**kwargs)
         if not messages:
             logger.error("Error: No messages in prompt.")
             return None
         model = self.model
+
+        async def attempt():
+            async with RateLimiter.throttle(
+                model, tokens=estimate_tokens(messages, lm_config.get("max_tokens") or 0)
+            ):
+                return await acompletion(
+                    model=model,
+                    messages=messages,
+                    response_format=self.response_format,
+                    num_retries=0,
+                    **lm_config,
+                )
+
         try:
-            res = await acompletion(
-                model=model,
-                messages=messages,
-                response_format=self.response_format,
-                num_retries=num_retries,
-                **lm_config,
+            res = await (retry_policy or DEFAULT_RETRY_POLICY).call(
+                attempt, model=model, max_attempts=num_retries + 1
             )
         except Exception as e:
-            logger.error(f"Failed to complete after 3 attempts: {e}")
+            logger.error(f"Failed to complete after {num_retries + 1} attempts: {e}")
             raise e
 
         cost = res._hidden_params.get("response_cost", None)
         if cost:
             await CostTracker.add_cost(cost=cost, label=self.name)
+        await record_token_usage(getattr(res, "usage", None))
 
         res_text = res.choices[0].message.content
         if not res_text:
@@ -248,12 +338,12 @@ class Prompt(pf.Prompt):
             # logger.info(res_text)
             if not self.response_format:
                 if cache:
-                    cache.set(self.messages, lm_config, kwargs, res_text, parallel_task_id)
+                    cache.set(self, lm_config, kwargs, res_text, parallel_task_id, hash_key=hash_key)
                     # logger.debug(f"Cache set on Prompt {self.name}")
                 return res_text
             if self.response_format["type"] == "text":
                 if cache:
-                    cache.set(self.messages, lm_config, kwargs, res_text, parallel_task_id)
+                    cache.set(self, lm_config, kwargs, res_text, parallel_task_id, hash_key=hash_key)
                     # logger.debug(f"Cache set on Prompt {self.name}")
                 return res_text
             parsed_outputs: Dict[str, Any]
@@ -266,7 +356,7 @@ class Prompt(pf.Prompt):
                 parsed_outputs = json.loads(res_text)
                 
             if cache:
-                cache.set(self.messages, lm_config, kwargs, parsed_outputs, parallel_task_id)
+                cache.set(self, lm_config, kwargs, parsed_outputs, parallel_task_id, hash_key=hash_key)
                 # logger.debug(f"Cache set on Prompt {self.name}")
             return parsed_outputs
         except Exception as e:
@@ -274,6 +364,11 @@ class Prompt(pf.Prompt):
             logger.error(res_text)
             return res_text
 
+    @staticmethod
+    def single_flight_stats() -> Dict[str, int]:
+        """Get the number of prompt calls and of calls coalesced with an in-flight call."""
+        return _single_flight.stats()
+
     @classmethod
     def load(cls, content: str) -> "Prompt":
         """
@@ -332,18 +427,78 @@ class Prompt(pf.Prompt):
             Prompt: The formatted Prompt object.
         """
         if self.fewshot:
+            kwargs["_FEWSHOT_"] = self.fewshot_block()
+        formatted = super().format(**kwargs)
+        # Messages of the copy are rewritten in place, so drop the copied fingerprint
+        formatted._fingerprint = None
+        return formatted
+
+    def fewshot_block(self) -> str:
+        """
+        Get the formatted few-shot examples that replace the `_FEWSHOT_` placeholder.
+
+        The block is formatted once per prompt content, so it is byte-identical across calls
+        and can be served from the provider's prompt cache.
+
+        Returns:
+            str: The formatted few-shot examples, empty if there are none.
+        """
+        if not self.fewshot:
+            return ""
+        fingerprint = self.fingerprint()
+        block = self.__pydantic_private__.get("_fewshot_block")
+        if block is None or block[0] != fingerprint:
             # input_key_ignore = None
             # output_key_ignore = None
             # if fewshot_config:
             #     input_key_ignore = fewshot_config.get("input_key_ignore", None)
             #     output_key_ignore = fewshot_config.get("output_key_ignore", None)
-            kwargs["_FEWSHOT_"] = format_fewshot(
-                fewshot=self.fewshot or [],
-                response_format=self.response_format,
-                # input_key_ignore=input_key_ignore,
-                # output_key_ignore=output_key_ignore
+            block = (
+                fingerprint,
+                format_fewshot(
+                    fewshot=self.fewshot or [],
+                    response_format=self.response_format,
+                    # input_key_ignore=input_key_ignore,
+                    # output_key_ignore=output_key_ignore
+                ),
             )
-        return super().format(**kwargs)
+            self._fewshot_block = block
+        return block[1]
+
+    def count_tokens(self, **kwargs) -> int:
+        """
+        Count the input tokens of a call with the given inputs, locally.
+
+        Counts are memoized per message, so comparing variants of a prompt, such as few-shot
+        sets, only tokenizes what differs.
+
+        Args:
+            **kwargs: The inputs to format the prompt with.
+
+        Returns:
+            int: The number of input tokens.
+        """
+        return count_tokens(self.model, self.format(**kwargs).messages)
+
+    def format_request(self, **kwargs) -> List[ChatCompletionMessageParam]:
+        """
+        Format the messages of a completion request with the given inputs.
+
+        Everything before the first input placeholder (system message, instructions and
+        few-shot examples) is identical across calls, so providers that cache prompt prefixes
+        automatically serve it at a discount. For providers that need explicit hints, the end
+        of that static prefix is marked with a `cache_control` breakpoint.
+
+        Args:
+            **kwargs: The inputs to format the prompt with.
+
+        Returns:
+            List[ChatCompletionMessageParam]: The request messages.
+        """
+        messages = self.format(**kwargs).messages
+        if not supports_cache_control(self.model):
+            return messages
+        return add_cache_control(self.messages, messages, kwargs, self.fewshot_block())
 
     def reset_copy(self):
         """
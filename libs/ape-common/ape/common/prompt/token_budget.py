@@ -0,0 +1,190 @@
+from threading import Lock
+from typing import TYPE_CHECKING, Any, Dict, Optional, Sequence, Tuple
+
+from ape.common.utils.logging import logger
+from ape.common.utils.tokens import MESSAGE_OVERHEAD_TOKENS, REQUEST_OVERHEAD_TOKENS, TokenCounter
+
+if TYPE_CHECKING:
+    from .prompt_base import Prompt
+
+TRUNCATION_MARKER = "[...]\n"
+# Tokens kept free when truncating, for the marker and the boundary between tokens
+_TRUNCATION_MARGIN = 16
+
+
+class ContextBudgetExceeded(ValueError):
+    """Raised when a request does not fit the context budget of its model."""
+
+    def __init__(self, model: Optional[str], tokens: int, limit: int):
+        self.model = model
+        self.tokens = tokens
+        self.limit = limit
+        super().__init__(f"Request to {model} has {tokens} input tokens, over its budget of {limit}")
+
+
+class TokenBudget:
+    """
+    Context budget checked before a request is sent.
+
+    A request whose input would not fit the context window of its model fails after a
+    round trip, and is then retried for nothing. The budget counts the input tokens locally
+    and, when the request is over budget, shrinks it according to the policy: inputs listed
+    in `truncate_inputs` are truncated from their start, so the most recent history is kept,
+    then few-shot examples are dropped from the last if `drop_fewshot` is set. A request that
+    still does not fit raises ContextBudgetExceeded.
+
+    Requests are only tokenized when their size in bytes could exceed the limit, so small
+    requests skip the check.
+
+    Args:
+        max_input_tokens (Optional[int]): Maximum number of input tokens. Defaults to the
+            context window of the model; requests to unknown models are not checked.
+        reserve_output_tokens (int): Tokens kept free for the response when the call does
+            not set `max_tokens`. Defaults to 1024.
+        truncate_inputs (Sequence[str]): Inputs that may be truncated to fit, such as a
+            prompt history. Defaults to none.
+        drop_fewshot (bool): Whether few-shot examples may be dropped to fit. Defaults to False.
+    """
+
+    def __init__(
+        self,
+        max_input_tokens: Optional[int] = None,
+        reserve_output_tokens: int = 1024,
+        truncate_inputs: Sequence[str] = (),
+        drop_fewshot: bool = False,
+    ):
+        self.max_input_tokens = max_input_tokens
+        self.reserve_output_tokens = reserve_output_tokens
+        self.truncate_inputs = tuple(truncate_inputs)
+        self.drop_fewshot = drop_fewshot
+        self.stats: Dict[str, int] = {
+            "checked": 0,
+            "counted": 0,
+            "truncated_inputs": 0,
+            "dropped_fewshot": 0,
+            "rejected": 0,
+        }
+        self._lock = Lock()
+
+    def limit(self, model: Optional[str], max_output_tokens: Optional[int] = None) -> Optional[int]:
+        """
+        Get the input token limit of a request.
+
+        Args:
+            model (Optional[str]): The model called.
+            max_output_tokens (Optional[int]): The `max_tokens` of the call, if any.
+
+        Returns:
+            Optional[int]: The limit, or None if the request is not checked.
+        """
+        if self.max_input_tokens is not None:
+            return self.max_input_tokens
+        window = TokenCounter.get_instance().context_window(model)
+        if window is None:
+            return None
+        return max(0, window - (max_output_tokens or self.reserve_output_tokens))
+
+    def _count(self, name: str, value: int = 1):
+        with self._lock:
+            self.stats[name] += value
+
+    def fit(
+        self,
+        prompt: "Prompt",
+        inputs: Dict[str, Any],
+        max_output_tokens: Optional[int] = None,
+    ) -> Tuple["Prompt", Dict[str, Any]]:
+        """
+        Fit a request into the budget.
+
+        Args:
+            prompt (Prompt): The prompt called.
+            inputs (Dict[str, Any]): The inputs of the call.
+            max_output_tokens (Optional[int]): The `max_tokens` of the call, if any.
+
+        Returns:
+            Tuple[Prompt, Dict[str, Any]]: The prompt and inputs to send, which are the given
+                ones unless they had to be shrunk.
+
+        Raises:
+            ContextBudgetExceeded: If the request does not fit after applying the policy.
+        """
+        self._count("checked")
+        limit = self.limit(prompt.model, max_output_tokens)
+        if limit is None or _max_request_tokens(prompt, inputs) <= limit:
+            return prompt, inputs
+
+        self._count("counted")
+        counter = TokenCounter.get_instance()
+        model = prompt.model
+        tokens = prompt.count_tokens(**inputs)
+        if tokens <= limit:
+            return prompt, inputs
+
+        initial_tokens = tokens
+        inputs = dict(inputs)
+        for key in self.truncate_inputs:
+            value = inputs.get(key)
+            if tokens <= limit or not isinstance(value, str) or not value:
+                continue
+            # Token counts are not linear in the text length, so truncate a few times
+            for _ in range(3):
+                value_tokens = counter.count_text(model, value)
+                keep = value_tokens - (tokens - limit) - _TRUNCATION_MARGIN
+                value = _truncate_start(value, keep / value_tokens if value_tokens else 0.0)
+                inputs[key] = value
+                tokens = prompt.count_tokens(**inputs)
+                if tokens <= limit or not value:
+                    break
+            self._count("truncated_inputs")
+
+        if tokens > limit and self.drop_fewshot and prompt.fewshot:
+            fewshot = list(prompt.fewshot)
+            prompt = prompt.deepcopy()
+            while tokens > limit and fewshot:
+                fewshot.pop()
+                self._count("dropped_fewshot")
+                prompt.fewshot = fewshot
+                tokens = prompt.count_tokens(**inputs)
+
+        if tokens > limit:
+            self._count("rejected")
+            raise ContextBudgetExceeded(model, tokens, limit)
+        logger.debug(f"Shrank request to {model} from {initial_tokens} to {tokens} input tokens")
+        return prompt, inputs
+
+
+def _max_request_tokens(prompt: "Prompt", inputs: Dict[str, Any]) -> int:
+    """
+    Upper bound of the input tokens of a request, computed without formatting or tokenizing.
+
+    A token is at least one byte, so the size of the formatted messages in bytes plus the
+    chat format overhead bounds the token count.
+    """
+    values = {f"{{{key}}}": len(str(value).encode()) for key, value in inputs.items()}
+    if prompt.fewshot:
+        values["{_FEWSHOT_}"] = len(prompt.fewshot_block().encode())
+    total = REQUEST_OVERHEAD_TOKENS + MESSAGE_OVERHEAD_TOKENS * len(prompt.messages)
+    for message in prompt.messages:
+        content = message.get("content") if isinstance(message, dict) else message
+        content = content if isinstance(content, str) else str(content)
+        total += len(content.encode())
+        for placeholder, size in values.items():
+            total += content.count(placeholder) * size
+    return total
+
+
+def _truncate_start(text: str, keep_ratio: float) -> str:
+    """Drop the start of a text, keeping about `keep_ratio` of it from the next line on."""
+    if keep_ratio <= 0:
+        return ""
+    cut = len(text) - int(len(text) * keep_ratio)
+    if cut <= 0:
+        return text
+    newline = text.find("\n", cut)
+    if newline != -1:
+        cut = newline + 1
+    return TRUNCATION_MARKER + text[cut:]
+
+
+DEFAULT_TOKEN_BUDGET = TokenBudget()
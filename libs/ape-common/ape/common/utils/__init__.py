@@ -1,4 +1,23 @@
 from .logging import logger
+from .single_flight import SingleFlight
+from .rate_limiter import RateLimiter
+from .concurrency import AdaptiveConcurrencyLimiter
+from .retry import CircuitBreaker, RetryPolicy
+from .http_pool import HTTPClientPool
+from .hedging import HedgingPolicy
+from .json_stream import IncrementalJSONParser
+from .tokens import TokenCounter
 
 
-__all__ = ["logger"]
+__all__ = [
+    "logger",
+    "SingleFlight",
+    "RateLimiter",
+    "AdaptiveConcurrencyLimiter",
+    "RetryPolicy",
+    "CircuitBreaker",
+    "HTTPClientPool",
+    "HedgingPolicy",
+    "IncrementalJSONParser",
+    "TokenCounter",
+]
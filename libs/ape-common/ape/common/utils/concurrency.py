@@ -0,0 +1,385 @@
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from functools import partial
+from threading import Lock
+from typing import (
+    Any,
+    AsyncIterable,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Deque,
+    Dict,
+    Iterable,
+    Optional,
+    Set,
+    Tuple,
+    TypeVar,
+    Union,
+)
+
+from .logging import logger
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+class SlotSignal:
+    """Outcome of the provider calls made while holding a concurrency slot."""
+
+    __slots__ = ("overloaded",)
+
+    def __init__(self):
+        self.overloaded = False
+
+
+_current_slot: ContextVar[Optional[SlotSignal]] = ContextVar("current_slot", default=None)
+
+
+def signal_overload():
+    """
+    Mark the concurrency slot of the current task as overloaded.
+
+    Called by the rate limiter on 429 and timeout responses, so that limiters see
+    provider overload even when the generator or metric recovers from the error itself.
+    """
+    slot = _current_slot.get()
+    if slot is not None:
+        slot.overloaded = True
+
+
+def is_overload_error(error: BaseException) -> bool:
+    """Check whether an exception signals provider overload (timeout, 429, 503 or 529)."""
+    if isinstance(error, (asyncio.TimeoutError, TimeoutError)):
+        return True
+    if type(error).__name__ in ("RateLimitError", "Timeout", "ServiceUnavailableError"):
+        return True
+    status_code = getattr(error, "status_code", None)
+    return status_code in (429, 503, 529)
+
+
+class AdaptiveConcurrencyLimiter:
+    """
+    Concurrency limiter whose window adapts with AIMD (additive increase, multiplicative
+    decrease), in the spirit of TCP congestion control.
+
+    While the window is in use and requests stay healthy, it grows by one slot per
+    completed request (slow start) until the first overload, then by about one slot per
+    window of completed requests. A timeout, a 429, a smoothed latency above
+    `latency_tolerance` times the baseline latency, or an error rate above
+    `max_error_rate` shrinks it by `decrease_factor`, at most once per observed latency
+    so that a burst of failures from the same window only counts once.
+
+    The limiter is thread-safe and can be shared by coroutines running on different
+    event loops.
+
+    Args:
+        initial_limit (int): Initial window. Defaults to 16.
+        min_limit (int): Minimum window. Defaults to 1.
+        max_limit (int): Maximum window. Defaults to 256.
+        decrease_factor (float): Multiplier applied to the window on overload. Defaults to 0.5.
+        latency_tolerance (Optional[float]): Latency, relative to the baseline, above which a
+            request counts as overloaded. None disables the latency signal. Defaults to 3.0.
+        max_error_rate (float): Error rate above which the window shrinks. Defaults to 0.2.
+        min_latency (float): Calls faster than this, such as cache hits, do not update the
+            baseline latency. Defaults to 0.05 seconds.
+    """
+
+    def __init__(
+        self,
+        initial_limit: int = 16,
+        min_limit: int = 1,
+        max_limit: int = 256,
+        decrease_factor: float = 0.5,
+        latency_tolerance: Optional[float] = 3.0,
+        max_error_rate: float = 0.2,
+        min_latency: float = 0.05,
+    ):
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.decrease_factor = decrease_factor
+        self.latency_tolerance = latency_tolerance
+        self.max_error_rate = max_error_rate
+        self.min_latency = min_latency
+        self._limit = float(min(max(initial_limit, min_limit), max_limit))
+        self.in_flight = 0
+        self.completed = 0
+        self.overloads = 0
+        self.errors = 0
+        self.baseline_latency: Optional[float] = None
+        self._last_latency = 0.0
+        self._smoothed_latency = 0.0
+        self._slow_start = True
+        self._last_decrease = 0.0
+        self._error_rate = 0.0
+        self._waiters: Deque[asyncio.Future] = deque()
+        # Waiters that were handed a slot but may not have resumed yet
+        self._granted: Set[asyncio.Future] = set()
+        self._lock = Lock()
+
+    @property
+    def limit(self) -> int:
+        """The current window, i.e. the number of calls allowed in flight."""
+        return max(self.min_limit, int(self._limit))
+
+    async def acquire(self) -> bool:
+        """
+        Wait for a free slot.
+
+        Returns:
+            bool: Whether the window was saturated when the slot was granted.
+        """
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if self.in_flight < self.limit and not self._waiters:
+                self.in_flight += 1
+                return self.in_flight >= self.limit
+            waiter = loop.create_future()
+            self._waiters.append(waiter)
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            with self._lock:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+                elif waiter in self._granted:
+                    # The slot was handed over just before the cancellation, give it back
+                    self._granted.discard(waiter)
+                    self.in_flight -= 1
+                    self._wake_waiters()
+            raise
+        with self._lock:
+            self._granted.discard(waiter)
+        return True
+
+    def release(
+        self, latency: float, overloaded: bool = False, error: bool = False, saturated: bool = True
+    ):
+        """
+        Release a slot and feed the outcome of the call into the window.
+
+        Args:
+            latency (float): Duration of the call, in seconds.
+            overloaded (bool): Whether the call hit a timeout or a rate limit.
+            error (bool): Whether the call failed for another reason.
+            saturated (bool): Whether the window was saturated when the slot was acquired.
+                The window only grows while it is actually used.
+        """
+        with self._lock:
+            self.in_flight -= 1
+            self.completed += 1
+            self._last_latency = latency
+            self._error_rate = 0.9 * self._error_rate + 0.1 * (1.0 if error else 0.0)
+            if error:
+                self.errors += 1
+
+            if not overloaded and not error and latency >= self.min_latency:
+                if self.baseline_latency is None or latency < self.baseline_latency:
+                    self.baseline_latency = latency
+                    self._smoothed_latency = latency
+                else:
+                    # Let the baseline drift up slowly so that it follows the provider
+                    self.baseline_latency += 0.01 * (latency - self.baseline_latency)
+                    self._smoothed_latency += 0.1 * (latency - self._smoothed_latency)
+                # Compare smoothed latency so that a few slow items do not shrink the window
+                if (
+                    self.latency_tolerance is not None
+                    and self._smoothed_latency > self.latency_tolerance * self.baseline_latency
+                ):
+                    overloaded = True
+
+            if overloaded or self._error_rate > self.max_error_rate:
+                self._decrease()
+            elif saturated and not error:
+                increase = 1.0 if self._slow_start else 1.0 / self._limit
+                self._limit = min(float(self.max_limit), self._limit + increase)
+            self._wake_waiters()
+
+    def _release_unused(self):
+        """Give back a slot acquired for a call that never started, without an outcome."""
+        with self._lock:
+            self.in_flight -= 1
+            self._wake_waiters()
+
+    def _decrease(self):
+        now = time.monotonic()
+        if now - self._last_decrease < self._last_latency:
+            return
+        self._last_decrease = now
+        self._slow_start = False
+        self.overloads += 1
+        previous = self.limit
+        self._limit = max(float(self.min_limit), self._limit * self.decrease_factor)
+        logger.debug(f"Concurrency window decreased from {previous} to {self.limit}")
+
+    def _wake_waiters(self):
+        while self._waiters and self.in_flight < self.limit:
+            waiter = self._waiters.popleft()
+            if waiter.done():
+                continue
+            self.in_flight += 1
+            self._granted.add(waiter)
+            waiter.get_loop().call_soon_threadsafe(_set_waiter_result, waiter)
+
+    @asynccontextmanager
+    async def slot(self):
+        """
+        Hold a slot for the duration of the block, timing it and recording its outcome.
+
+        Overload is detected from exceptions raised in the block and from `signal_overload`
+        calls made by the rate limiter while the slot is held.
+        """
+        saturated = await self.acquire()
+        async with self._held_slot(saturated) as signal:
+            yield signal
+
+    @asynccontextmanager
+    async def _held_slot(self, saturated: bool):
+        signal = SlotSignal()
+        token = _current_slot.set(signal)
+        start = time.monotonic()
+        overloaded = error = False
+        try:
+            yield signal
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            overloaded = is_overload_error(e)
+            error = not overloaded
+            raise
+        finally:
+            _current_slot.reset(token)
+            self.release(
+                time.monotonic() - start,
+                overloaded=overloaded or signal.overloaded,
+                error=error,
+                saturated=saturated,
+            )
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get the current window and counters.
+
+        Returns:
+            Dict[str, Any]: The window, calls in flight, queued callers and counters.
+        """
+        return {
+            "limit": self.limit,
+            "in_flight": self.in_flight,
+            "waiting": len(self._waiters),
+            "completed": self.completed,
+            "overloads": self.overloads,
+            "errors": self.errors,
+            "error_rate": self._error_rate,
+            "baseline_latency": self.baseline_latency,
+        }
+
+
+def _set_waiter_result(waiter: asyncio.Future):
+    if not waiter.done():
+        waiter.set_result(None)
+
+
+async def _aenumerate(items: Union[Iterable[T], AsyncIterable[T]]) -> AsyncIterator[Tuple[int, T]]:
+    index = 0
+    if hasattr(items, "__aiter__"):
+        async for item in items:
+            yield index, item
+            index += 1
+    else:
+        for item in items:
+            yield index, item
+            index += 1
+
+
+async def bounded_map(
+    fn: Callable[[T], Awaitable[R]],
+    items: Union[Iterable[T], AsyncIterable[T]],
+    limiter: AdaptiveConcurrencyLimiter,
+    max_pending: Optional[int] = None,
+) -> AsyncIterator[Tuple[int, R]]:
+    """
+    Apply an async function to items with bounded concurrency, yielding results as they complete.
+
+    Items are pulled lazily from the (async) iterable, and a task is only created once
+    `limiter` grants it a slot, so memory stays flat regardless of the number of items.
+    Completed results that the consumer has not taken yet also count against
+    `max_pending`, so a slow consumer pauses scheduling instead of buffering results.
+
+    If a call raises, the remaining calls are cancelled and the exception is re-raised
+    to the consumer. Closing the iterator early cancels the calls in flight.
+
+    Args:
+        fn (Callable[[T], Awaitable[R]]): The function to apply.
+        items (Union[Iterable[T], AsyncIterable[T]]): The items.
+        limiter (AdaptiveConcurrencyLimiter): The limiter bounding calls in flight.
+        max_pending (Optional[int]): Maximum number of calls in flight plus results not yet
+            consumed. Defaults to the maximum window of the limiter.
+
+    Yields:
+        Tuple[int, R]: The index of the item and its result, in completion order.
+    """
+    pending_slots = asyncio.Semaphore(max_pending or limiter.max_limit)
+    results: asyncio.Queue = asyncio.Queue()
+    tasks: Set[asyncio.Task] = set()
+    done = object()
+
+    async def run(index: int, item: T, saturated: bool, started: Dict[str, bool]):
+        # From here on `_held_slot` releases the slot, there is no await before it
+        started["value"] = True
+        try:
+            async with limiter._held_slot(saturated):
+                result = await fn(item)
+        except asyncio.CancelledError:
+            raise
+        except BaseException as e:
+            results.put_nowait((index, e, True))
+        else:
+            results.put_nowait((index, result, False))
+
+    async def produce():
+        try:
+            async for index, item in _aenumerate(items):
+                await pending_slots.acquire()
+                saturated = await limiter.acquire()
+                started = {"value": False}
+                task = asyncio.ensure_future(run(index, item, saturated, started))
+                tasks.add(task)
+                task.add_done_callback(partial(on_done, started))
+            # Wait for the calls in flight before signaling the end of the stream
+            while tasks:
+                await asyncio.gather(*list(tasks), return_exceptions=True)
+        except asyncio.CancelledError:
+            raise
+        except BaseException as e:
+            results.put_nowait((-1, e, True))
+        finally:
+            results.put_nowait(done)
+
+    def on_done(started: Dict[str, bool], task: asyncio.Task):
+        tasks.discard(task)
+        if not started["value"]:
+            # Cancelled before its first step, the slot acquired for it was never held
+            limiter._release_unused()
+
+    producer = asyncio.ensure_future(produce())
+    try:
+        while True:
+            entry = await results.get()
+            if entry is done:
+                break
+            index, value, failed = entry
+            if failed:
+                if isinstance(value, asyncio.CancelledError):
+                    continue
+                raise value
+            pending_slots.release()
+            yield index, value
+    finally:
+        producer.cancel()
+        for task in list(tasks):
+            task.cancel()
+        await asyncio.gather(producer, *list(tasks), return_exceptions=True)
@@ -0,0 +1,182 @@
+import asyncio
+import time
+from dataclasses import asdict, dataclass
+from threading import Lock
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple, TypeVar
+
+from .latency import LatencyTracker, percentile
+from .logging import logger
+
+T = TypeVar("T")
+
+
+@dataclass
+class HedgeStats:
+    """Counters of a HedgingPolicy."""
+
+    calls: int = 0
+    hedged: int = 0
+    hedge_wins: int = 0
+    skipped_over_budget: int = 0
+    latency_saved: float = 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+@dataclass
+class HedgeOutcome:
+    """
+    Outcome of a hedged call.
+
+    Attributes:
+        hedged (bool): Whether a duplicate request was sent.
+        hedge_won (bool): Whether the duplicate finished first.
+        latency_saved (float): Estimated seconds saved by the duplicate, 0 if it lost.
+    """
+
+    hedged: bool = False
+    hedge_won: bool = False
+    latency_saved: float = 0.0
+
+
+def expected_remaining(values: List[float], elapsed: float) -> float:
+    """
+    Estimate how much longer a call that has already run for `elapsed` seconds would take,
+    from the durations of recent calls that took longer than that.
+
+    Args:
+        values (List[float]): Durations of recent calls, in seconds.
+        elapsed (float): Time the call has been running, in seconds.
+
+    Returns:
+        float: The expected remaining time, 0 if no recent call took that long.
+    """
+    slower = [value - elapsed for value in values if value > elapsed]
+    if not slower:
+        return 0.0
+    return sum(slower) / len(slower)
+
+
+class HedgingPolicy:
+    """
+    Hedged requests: when a call is still running after the rolling `quantile` latency
+    of its model, a duplicate is sent and whichever finishes first wins; the other is
+    cancelled.
+
+    The number of duplicates is capped to `budget` times the number of calls, so the
+    extra spend is bounded. No call is hedged until `min_samples` completed calls of the
+    model have been observed.
+
+    Args:
+        quantile (float): Latency percentile after which a duplicate is sent. Defaults to 95.
+        budget (float): Maximum ratio of hedged calls to calls. Defaults to 0.05.
+        min_samples (int): Completed calls of a model needed before hedging. Defaults to 20.
+        min_delay (float): Minimum seconds before sending a duplicate. Defaults to 0.5.
+    """
+
+    def __init__(
+        self,
+        quantile: float = 95.0,
+        budget: float = 0.05,
+        min_samples: int = 20,
+        min_delay: float = 0.5,
+    ):
+        self.quantile = quantile
+        self.budget = budget
+        self.min_samples = min_samples
+        self.min_delay = min_delay
+        self.stats = HedgeStats()
+        self._lock = Lock()
+
+    def delay(self, tracker: LatencyTracker, model: Optional[str]) -> Tuple[Optional[float], List[float]]:
+        """
+        Compute how long to wait before hedging a call to `model`.
+
+        Returns:
+            Tuple[Optional[float], List[float]]: The delay, or None if there are too few
+                samples, and the recent durations it was computed from.
+        """
+        values = tracker.values("total", model=model)
+        if len(values) < self.min_samples:
+            return None, values
+        return max(self.min_delay, percentile(values, self.quantile)), values
+
+    def _take_budget(self) -> bool:
+        with self._lock:
+            if self.stats.hedged + 1 > self.budget * self.stats.calls:
+                self.stats.skipped_over_budget += 1
+                return False
+            self.stats.hedged += 1
+            return True
+
+    async def call(
+        self,
+        fn: Callable[[], Awaitable[T]],
+        tracker: LatencyTracker,
+        model: Optional[str] = None,
+    ) -> Tuple[T, HedgeOutcome]:
+        """
+        Run `fn`, sending a duplicate if it is slower than usual.
+
+        If the first request fails after the duplicate was sent, the duplicate's result is
+        used; the call only fails if both fail.
+
+        Args:
+            fn (Callable[[], Awaitable[T]]): Factory of the request coroutine.
+            tracker (LatencyTracker): Tracker of the recent call durations.
+            model (Optional[str]): The model called.
+
+        Returns:
+            Tuple[T, HedgeOutcome]: The result of the first request to succeed, and the
+                outcome of the hedge.
+        """
+        with self._lock:
+            self.stats.calls += 1
+        outcome = HedgeOutcome()
+        delay, values = self.delay(tracker, model)
+        start = time.monotonic()
+        primary = asyncio.ensure_future(fn())
+        primary.add_done_callback(_consume_exception)
+        if delay is None:
+            return await primary, outcome
+
+        try:
+            done, _ = await asyncio.wait({primary}, timeout=delay)
+            if done or not self._take_budget():
+                return await primary, outcome
+
+            outcome.hedged = True
+            logger.debug(f"Hedging call to {model} after {delay:.2f}s")
+            hedge = asyncio.ensure_future(fn())
+            hedge.add_done_callback(_consume_exception)
+            pending = {primary, hedge}
+            error: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.cancelled():
+                        continue
+                    if task.exception() is not None:
+                        error = error or task.exception()
+                        continue
+                    for loser in pending:
+                        loser.cancel()
+                    if task is hedge:
+                        outcome.hedge_won = True
+                        outcome.latency_saved = expected_remaining(values, time.monotonic() - start)
+                        with self._lock:
+                            self.stats.hedge_wins += 1
+                            self.stats.latency_saved += outcome.latency_saved
+                    return task.result(), outcome
+            raise error or asyncio.CancelledError()
+        finally:
+            for task in (primary, *([hedge] if outcome.hedged else [])):
+                if not task.done():
+                    task.cancel()
+
+
+def _consume_exception(task: asyncio.Future):
+    # Errors of the request that lost the race are expected and not surfaced
+    if not task.cancelled():
+        task.exception()
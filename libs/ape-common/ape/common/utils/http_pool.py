@@ -0,0 +1,441 @@
+import asyncio
+import socket
+import time
+import weakref
+from collections import deque
+from contextlib import asynccontextmanager
+from threading import Lock
+from typing import Any, AsyncIterator, Deque, Dict, List, Optional, Tuple
+
+import httpcore
+import httpx
+
+from .latency import percentile
+from .logging import logger
+
+try:
+    import h2  # noqa: F401
+
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+
+class CachingNetworkBackend(httpcore.AsyncNetworkBackend):
+    """
+    httpcore network backend caching DNS resolutions for `ttl` seconds.
+
+    Connections are opened to the resolved address while TLS still uses the original
+    host name, so certificates and SNI are unaffected.
+
+    Args:
+        backend (Any): The wrapped httpcore network backend.
+        ttl (float): Seconds a resolution is kept. Defaults to 300.
+    """
+
+    def __init__(self, backend: Any, ttl: float = 300.0):
+        self.backend = backend
+        self.ttl = ttl
+        self.lookups = 0
+        self.hits = 0
+        self._cache: Dict[Tuple[str, int], Tuple[float, str]] = {}
+
+    async def _resolve(self, host: str, port: int) -> str:
+        now = time.monotonic()
+        cached = self._cache.get((host, port))
+        if cached is not None and cached[0] > now:
+            self.hits += 1
+            return cached[1]
+        self.lookups += 1
+        infos = await asyncio.get_running_loop().getaddrinfo(
+            host, port, type=socket.SOCK_STREAM
+        )
+        address = infos[0][4][0]
+        self._cache[(host, port)] = (now + self.ttl, address)
+        return address
+
+    async def connect_tcp(self, host: str, port: int, **kwargs):
+        try:
+            address = await self._resolve(host, port)
+        except OSError:
+            # Let the backend resolve and report the error itself
+            return await self.backend.connect_tcp(host, port, **kwargs)
+        try:
+            return await self.backend.connect_tcp(address, port, **kwargs)
+        except Exception:
+            # The address may be stale, resolve again on the next connection
+            self._cache.pop((host, port), None)
+            raise
+
+    async def connect_unix_socket(self, path: str, **kwargs):
+        return await self.backend.connect_unix_socket(path, **kwargs)
+
+    async def sleep(self, seconds: float) -> None:
+        await self.backend.sleep(seconds)
+
+
+class _TrackedStream(httpx.AsyncByteStream):
+    """
+    Response stream that reports when it is closed, and drains the rest of a response
+    that was abandoned just before its end so that the connection can be reused.
+
+    SSE clients stop reading at `data: [DONE]`, before the end of the HTTP body, which
+    would otherwise close the connection after every streamed completion.
+    """
+
+    drain_timeout = 0.1
+    drain_limit = 64 * 1024
+
+    def __init__(self, stream: httpx.AsyncByteStream, on_close):
+        self.stream = stream
+        self.on_close = on_close
+        self._iterator: Optional[AsyncIterator[bytes]] = None
+        self._exhausted = False
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        self._iterator = self.stream.__aiter__()
+        async for chunk in self._iterator:
+            yield chunk
+        self._exhausted = True
+
+    async def _drain(self):
+        drained = 0
+        async for chunk in self._iterator:
+            drained += len(chunk)
+            if drained > self.drain_limit:
+                return
+        self._exhausted = True
+
+    async def aclose(self) -> None:
+        try:
+            if self._iterator is not None and not self._exhausted:
+                await asyncio.wait_for(self._drain(), timeout=self.drain_timeout)
+        except Exception:
+            pass
+        finally:
+            try:
+                await self.stream.aclose()
+            finally:
+                if self.on_close is not None:
+                    self.on_close()
+                    self.on_close = None
+
+
+class _InstrumentedTransport(httpx.AsyncHTTPTransport):
+    """HTTP transport recording connection reuse and time spent waiting for a connection."""
+
+    def __init__(self, pool: "type[HTTPClientPool]", dns_ttl: Optional[float], **kwargs):
+        super().__init__(**kwargs)
+        self.ape_pool = pool
+        self.dns_backend: Optional[CachingNetworkBackend] = None
+        connection_pool = getattr(self, "_pool", None)
+        if dns_ttl and connection_pool is not None and hasattr(connection_pool, "_network_backend"):
+            self.dns_backend = CachingNetworkBackend(connection_pool._network_backend, ttl=dns_ttl)
+            connection_pool._network_backend = self.dns_backend
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        pool = self.ape_pool
+        start = time.monotonic()
+        connect_time = 0.0
+        connect_started: Optional[float] = None
+        state = {"new_connection": False, "sent": False}
+        previous_trace = request.extensions.get("trace")
+
+        async def trace(event: str, info: Dict[str, Any]):
+            nonlocal connect_time, connect_started
+            if event in ("connection.connect_tcp.started", "connection.start_tls.started"):
+                state["new_connection"] = True
+                connect_started = time.monotonic()
+            elif event in ("connection.connect_tcp.complete", "connection.start_tls.complete"):
+                if connect_started is not None:
+                    connect_time += time.monotonic() - connect_started
+                    connect_started = None
+            elif event.endswith("send_request_headers.started") and not state["sent"]:
+                state["sent"] = True
+                pool._record_dispatch(
+                    wait=time.monotonic() - start - connect_time,
+                    connect=connect_time,
+                    new_connection=state["new_connection"],
+                )
+            if previous_trace is not None:
+                await previous_trace(event, info)
+
+        request.extensions["trace"] = trace
+        pool._on_request_start()
+        try:
+            response = await super().handle_async_request(request)
+        except BaseException:
+            pool._on_request_end()
+            raise
+        response.stream = _TrackedStream(response.stream, pool._on_request_end)
+        return response
+
+    def connection_counts(self) -> Tuple[int, int]:
+        connections = getattr(getattr(self, "_pool", None), "connections", None) or []
+        idle = sum(1 for connection in connections if connection.is_idle())
+        return len(connections), idle
+
+
+class _DispatchOnlyTransport(httpx.AsyncBaseTransport):
+    """Transport of the dispatch client, which never sends requests itself."""
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        raise RuntimeError("Requests are sent through HTTPClientPool.client()")
+
+
+class _LoopDispatchClient(httpx.AsyncClient):
+    """
+    AsyncClient handed to litellm that sends every request through the pooled client of
+    the running event loop, since httpx connections cannot be shared across loops. It
+    only builds requests, so it has no connection pool of its own.
+    """
+
+    def __init__(self, pool: "type[HTTPClientPool]"):
+        super().__init__(transport=_DispatchOnlyTransport())
+        self.ape_pool = pool
+
+    async def send(self, request: httpx.Request, **kwargs) -> httpx.Response:
+        return await self.ape_pool.client().send(request, **kwargs)
+
+    async def aclose(self) -> None:
+        await self.ape_pool.aclose()
+
+
+class HTTPClientPool:
+    """
+    Process-wide pooled async HTTP client used by every outbound litellm call.
+
+    `install` registers the pool as litellm's `aclient_session`, so every provider served
+    by litellm's OpenAI-compatible clients reuses the same keep-alive connections. Each
+    event loop gets its own httpx client with the configured limits, HTTP/2 when the `h2`
+    package is available, and a DNS cache.
+
+    The session is global to litellm, so it affects every litellm user of the process and
+    is never installed implicitly. Use `session` to install it for a block of code, or
+    `install` and `uninstall`.
+
+    Example:
+        >>> HTTPClientPool.configure(max_connections=200, keepalive_expiry=60)
+        >>> async with HTTPClientPool.session():
+        ...     await trainer(prompt, trainset, valset)
+        ...     print(HTTPClientPool.stats()["reused_connections"])
+    """
+
+    max_connections: int = 100
+    max_keepalive_connections: int = 100
+    keepalive_expiry: float = 60.0
+    http2: bool = HTTP2_AVAILABLE
+    dns_ttl: Optional[float] = 300.0
+    connect_timeout: float = 10.0
+    enabled: bool = True
+
+    _clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = (
+        weakref.WeakKeyDictionary()
+    )
+    _transports: "weakref.WeakSet[_InstrumentedTransport]" = weakref.WeakSet()
+    _session: Optional[_LoopDispatchClient] = None
+    _lock: Lock = Lock()
+    _active: int = 0
+    _requests: int = 0
+    _new_connections: int = 0
+    _reused_connections: int = 0
+    _waits: Deque[float] = deque(maxlen=1000)
+    _connects: Deque[float] = deque(maxlen=1000)
+
+    @classmethod
+    def configure(
+        cls,
+        max_connections: Optional[int] = None,
+        max_keepalive_connections: Optional[int] = None,
+        keepalive_expiry: Optional[float] = None,
+        http2: Optional[bool] = None,
+        dns_ttl: Optional[float] = None,
+        connect_timeout: Optional[float] = None,
+        enabled: Optional[bool] = None,
+    ) -> None:
+        """
+        Configure the pool. Clients already created keep their previous settings until
+        `aclose` is called on their event loop.
+
+        Args:
+            max_connections (Optional[int]): Maximum number of connections per event loop.
+            max_keepalive_connections (Optional[int]): Maximum number of idle connections kept.
+            keepalive_expiry (Optional[float]): Seconds an idle connection is kept.
+            http2 (Optional[bool]): Whether to negotiate HTTP/2. Requires the `h2` package.
+            dns_ttl (Optional[float]): Seconds DNS resolutions are cached. 0 disables the cache.
+            connect_timeout (Optional[float]): Timeout to open a connection, in seconds.
+            enabled (Optional[bool]): Whether `install` registers the pool with litellm.
+        """
+        if http2 and not HTTP2_AVAILABLE:
+            logger.warning("HTTP/2 requires the h2 package, falling back to HTTP/1.1")
+            http2 = False
+        for name, value in (
+            ("max_connections", max_connections),
+            ("max_keepalive_connections", max_keepalive_connections),
+            ("keepalive_expiry", keepalive_expiry),
+            ("http2", http2),
+            ("dns_ttl", dns_ttl),
+            ("connect_timeout", connect_timeout),
+            ("enabled", enabled),
+        ):
+            if value is not None:
+                setattr(cls, name, value)
+
+    @classmethod
+    def install(cls) -> bool:
+        """
+        Register the pool as litellm's async client session. Idempotent. A session set by
+        the user is left untouched.
+
+        Returns:
+            bool: Whether this call installed the pool.
+        """
+        if cls._session is not None or not cls.enabled:
+            return False
+        import litellm
+
+        with cls._lock:
+            if cls._session is not None:
+                return False
+            if litellm.aclient_session is not None:
+                logger.debug("litellm.aclient_session is already set, not installing the pool")
+                return False
+            cls._session = _LoopDispatchClient(cls)
+            litellm.aclient_session = cls._session
+        # litellm caches its provider clients, which were created without the session
+        litellm.in_memory_llm_clients_cache.flush_cache()
+        return True
+
+    @classmethod
+    def uninstall(cls) -> None:
+        """Restore litellm's default clients, if the pool is installed."""
+        import litellm
+
+        with cls._lock:
+            if cls._session is None:
+                return
+            if litellm.aclient_session is cls._session:
+                litellm.aclient_session = None
+            cls._session = None
+        litellm.in_memory_llm_clients_cache.flush_cache()
+
+    @classmethod
+    @asynccontextmanager
+    async def session(cls) -> AsyncIterator["type[HTTPClientPool]"]:
+        """
+        Install the pool for the duration of the block. On exit, the pooled client of the
+        running event loop is closed and the pool is uninstalled if the block installed it.
+
+        Yields:
+            type[HTTPClientPool]: The pool, for its `stats`.
+        """
+        installed = cls.install()
+        try:
+            yield cls
+        finally:
+            await cls.aclose()
+            if installed:
+                cls.uninstall()
+
+    @classmethod
+    def client(cls) -> httpx.AsyncClient:
+        """Get the pooled client of the running event loop, creating it if needed."""
+        loop = asyncio.get_running_loop()
+        client = cls._clients.get(loop)
+        if client is None or client.is_closed:
+            transport = _InstrumentedTransport(
+                cls,
+                dns_ttl=cls.dns_ttl,
+                http2=cls.http2,
+                limits=httpx.Limits(
+                    max_connections=cls.max_connections,
+                    max_keepalive_connections=cls.max_keepalive_connections,
+                    keepalive_expiry=cls.keepalive_expiry,
+                ),
+            )
+            cls._transports.add(transport)
+            client = httpx.AsyncClient(
+                transport=transport,
+                timeout=httpx.Timeout(600.0, connect=cls.connect_timeout),
+                follow_redirects=True,
+            )
+            cls._clients[loop] = client
+        return client
+
+    @classmethod
+    async def aclose(cls) -> None:
+        """Close the pooled client of the running event loop."""
+        client = cls._clients.pop(asyncio.get_running_loop(), None)
+        if client is not None:
+            await client.aclose()
+
+    @classmethod
+    def _on_request_start(cls):
+        with cls._lock:
+            cls._active += 1
+            cls._requests += 1
+
+    @classmethod
+    def _on_request_end(cls):
+        with cls._lock:
+            cls._active -= 1
+
+    @classmethod
+    def _record_dispatch(cls, wait: float, connect: float, new_connection: bool):
+        with cls._lock:
+            cls._waits.append(max(0.0, wait))
+            if new_connection:
+                cls._new_connections += 1
+                cls._connects.append(connect)
+            else:
+                cls._reused_connections += 1
+
+    @classmethod
+    def stats(cls) -> Dict[str, Any]:
+        """
+        Get the pool metrics.
+
+        Returns:
+            Dict[str, Any]: Requests made and in flight, open and idle connections, new and
+                reused connections, time waiting for a connection (p50/p95/max over recent
+                requests), mean connect time and DNS cache hits.
+        """
+        transports: List[_InstrumentedTransport] = list(cls._transports)
+        connections = idle = 0
+        for transport in transports:
+            total, idle_count = transport.connection_counts()
+            connections += total
+            idle += idle_count
+        with cls._lock:
+            waits = list(cls._waits)
+            connects = list(cls._connects)
+            stats = {
+                "requests": cls._requests,
+                "active": cls._active,
+                "new_connections": cls._new_connections,
+                "reused_connections": cls._reused_connections,
+            }
+        dns_backends = [t.dns_backend for t in transports if t.dns_backend is not None]
+        stats.update(
+            {
+                "connections": connections,
+                "idle": idle,
+                "wait_p50": percentile(waits, 50),
+                "wait_p95": percentile(waits, 95),
+                "wait_max": max(waits) if waits else None,
+                "connect_mean": sum(connects) / len(connects) if connects else None,
+                "dns_lookups": sum(backend.lookups for backend in dns_backends),
+                "dns_cache_hits": sum(backend.hits for backend in dns_backends),
+                "http2": cls.http2,
+            }
+        )
+        return stats
+
+    @classmethod
+    def reset_stats(cls) -> None:
+        with cls._lock:
+            cls._requests = 0
+            cls._new_connections = 0
+            cls._reused_connections = 0
+            cls._waits = deque(maxlen=1000)
+            cls._connects = deque(maxlen=1000)
@@ -0,0 +1,434 @@
+import json
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Set, Union
+
+from pydantic import BaseModel
+
+_WHITESPACE = " \t\n\r"
+_NUMBER_CHARS = set("0123456789+-.eE")
+_ESCAPES = set('"\\/bfnrt')
+_HEX = set("0123456789abcdefABCDEF")
+_LITERALS = {"t": ("true", True), "f": ("false", False), "n": ("null", None)}
+_MISSING = object()
+
+
+class JSONStreamError(json.JSONDecodeError):
+    """Raised as soon as a streamed output can no longer be valid JSON matching its schema."""
+
+
+class _Frame:
+    __slots__ = ("container", "schema", "state", "key")
+
+    def __init__(self, container: Union[Dict[str, Any], List[Any]], schema: Optional[Dict[str, Any]]):
+        self.container = container
+        self.schema = schema
+        # Objects: "key_or_end", "key", "colon", "value", "comma_or_end"
+        # Arrays: "value_or_end", "value", "comma_or_end"
+        self.state = "key_or_end" if isinstance(container, dict) else "value_or_end"
+        self.key: Optional[str] = None
+
+
+class IncrementalJSONParser:
+    """
+    Incremental JSON parser for streamed model outputs, validating against a JSON schema
+    as text arrives.
+
+    Text is fed chunk by chunk and the parsed value is built along the way, so no second
+    parse of the full output is needed. `feed` raises JSONStreamError as soon as the output
+    can no longer be valid: a syntax error, a value of the wrong type, a key that the
+    schema does not allow, a string that cannot match an enum, an object missing required
+    keys, or text after the end of the value. The syntax accepted is the same as `json.loads`.
+
+    The schema support covers `type`, `properties`, `required`, `additionalProperties`,
+    `items`, `enum`, `maxItems`, `minItems` and local `$ref`s; `anyOf`/`oneOf` only
+    restrict the type of a value.
+
+    Example:
+        >>> parser = IncrementalJSONParser(schema)
+        >>> async for chunk in stream:
+        ...     parser.feed(chunk)
+        >>> value = parser.close()
+
+    Args:
+        schema (Optional[Dict[str, Any]]): The JSON schema of the output. None only checks
+            the syntax.
+    """
+
+    def __init__(self, schema: Optional[Dict[str, Any]] = None):
+        self.root_schema = schema
+        self.value: Any = _MISSING
+        self._stack: List[_Frame] = []
+        self._chunks: List[str] = []
+        self._pos = 0
+        # Current scalar token: "string", "key", "number" or "literal"
+        self._token: Optional[str] = None
+        self._token_schema: Optional[Dict[str, Any]] = None
+        self._buffer: List[str] = []
+        self._escape: Optional[str] = None
+        self._has_escape = False
+        self._literal: Optional[tuple] = None
+
+    @property
+    def complete(self) -> bool:
+        """Whether a whole JSON value has been parsed."""
+        return self.value is not _MISSING
+
+    @property
+    def text(self) -> str:
+        """The text fed so far."""
+        return "".join(self._chunks)
+
+    def feed(self, text: str) -> None:
+        """
+        Parse the next chunk of the output.
+
+        Raises:
+            JSONStreamError: If the output can no longer be valid.
+        """
+        self._chunks.append(text)
+        i = 0
+        n = len(text)
+        while i < n:
+            if self._token in ("string", "key"):
+                i = self._consume_string(text, i)
+                continue
+            char = text[i]
+            if self._token == "number":
+                if char in _NUMBER_CHARS:
+                    self._buffer.append(char)
+                    self._pos += 1
+                    i += 1
+                    continue
+                self._finish_number()
+            elif self._token == "literal":
+                self._consume_literal(char)
+                self._pos += 1
+                i += 1
+                continue
+            if char not in _WHITESPACE:
+                self._consume_structural(char)
+            self._pos += 1
+            i += 1
+
+    def close(self) -> Any:
+        """
+        Finish parsing.
+
+        Returns:
+            Any: The parsed value.
+
+        Raises:
+            JSONStreamError: If the output is incomplete or invalid.
+        """
+        if self._token == "number" and not self._stack:
+            self._finish_number()
+        if not self.complete:
+            self._fail("Incomplete JSON output")
+        return self.value
+
+    def _fail(self, message: str):
+        raise JSONStreamError(message, self.text, self._pos)
+
+    def _resolve(self, schema: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        if not schema:
+            return None
+        seen = 0
+        while "$ref" in schema and seen < 32:
+            target: Any = self.root_schema
+            ref = schema["$ref"]
+            if not ref.startswith("#") or target is None:
+                return None
+            for part in ref.lstrip("#").strip("/").split("/"):
+                if part:
+                    target = target.get(part) if isinstance(target, dict) else None
+            if not isinstance(target, dict):
+                return None
+            schema = target
+            seen += 1
+        variants = schema.get("anyOf") or schema.get("oneOf")
+        if variants and "type" not in schema:
+            types: Set[str] = set()
+            for variant in variants:
+                variant_types = _schema_types(self._resolve(variant))
+                if variant_types is None:
+                    return None
+                types |= variant_types
+            return {"type": sorted(types)}
+        return schema
+
+    def _check_type(self, json_type: str, schema: Optional[Dict[str, Any]]):
+        types = _schema_types(schema)
+        if types is None:
+            return
+        if json_type in types or (json_type == "number" and "integer" in types):
+            return
+        self._fail(f"Expected {' or '.join(sorted(types))}, got {json_type}")
+
+    def _slot_schema(self) -> Optional[Dict[str, Any]]:
+        """Schema of the value expected next."""
+        if not self._stack:
+            return self._resolve(self.root_schema)
+        frame = self._stack[-1]
+        if frame.schema is None:
+            return None
+        if isinstance(frame.container, list):
+            items = frame.schema.get("items")
+            return self._resolve(items) if isinstance(items, dict) else None
+        properties = frame.schema.get("properties") or {}
+        if frame.key in properties:
+            return self._resolve(properties[frame.key])
+        additional = frame.schema.get("additionalProperties")
+        return self._resolve(additional) if isinstance(additional, dict) else None
+
+    def _consume_structural(self, char: str):
+        if self.complete:
+            self._fail("Unexpected text after the JSON value")
+        frame = self._stack[-1] if self._stack else None
+        if frame is None:
+            self._start_value(char)
+            return
+
+        state = frame.state
+        if isinstance(frame.container, dict):
+            if state == "key_or_end" and char == "}":
+                self._close_object()
+            elif state in ("key_or_end", "key") and char == '"':
+                self._token = "key"
+                self._buffer = []
+                self._has_escape = False
+            elif state == "colon" and char == ":":
+                frame.state = "value"
+            elif state == "value":
+                self._start_value(char)
+            elif state == "comma_or_end" and char == ",":
+                frame.state = "key"
+            elif state == "comma_or_end" and char == "}":
+                self._close_object()
+            else:
+                self._fail(f"Unexpected character {char!r} in object")
+        else:
+            if state == "value_or_end" and char == "]":
+                self._close_array()
+            elif state in ("value_or_end", "value"):
+                self._start_value(char)
+            elif state == "comma_or_end" and char == ",":
+                max_items = (frame.schema or {}).get("maxItems")
+                if max_items is not None and len(frame.container) >= max_items:
+                    self._fail(f"Array has more than {max_items} items")
+                frame.state = "value"
+            elif state == "comma_or_end" and char == "]":
+                self._close_array()
+            else:
+                self._fail(f"Unexpected character {char!r} in array")
+
+    def _start_value(self, char: str):
+        schema = self._slot_schema()
+        if char == "{":
+            self._check_type("object", schema)
+            self._stack.append(_Frame({}, schema))
+        elif char == "[":
+            self._check_type("array", schema)
+            self._stack.append(_Frame([], schema))
+        elif char == '"':
+            self._check_type("string", schema)
+            self._token = "string"
+            self._token_schema = schema
+            self._buffer = []
+            self._has_escape = False
+        elif char == "-" or char.isdigit():
+            self._check_type("number", schema)
+            self._token = "number"
+            self._token_schema = schema
+            self._buffer = [char]
+        elif char in _LITERALS:
+            word, value = _LITERALS[char]
+            self._check_type("null" if value is None else "boolean", schema)
+            self._token = "literal"
+            self._literal = (word, value, 1)
+        else:
+            self._fail(f"Unexpected character {char!r}, expected a value")
+
+    def _consume_string(self, text: str, i: int) -> int:
+        n = len(text)
+        while i < n:
+            if self._escape is not None:
+                char = text[i]
+                if self._escape == "":
+                    if char == "u":
+                        self._escape = "u"
+                    elif char in _ESCAPES:
+                        self._escape = None
+                    else:
+                        self._fail(f"Invalid escape \\{char}")
+                else:
+                    if char not in _HEX:
+                        self._fail("Invalid \\u escape")
+                    self._escape += char
+                    if len(self._escape) == 5:
+                        self._escape = None
+                self._buffer.append(char)
+                self._pos += 1
+                i += 1
+                continue
+
+            # Consume the run of plain characters at once
+            end = i
+            while end < n and text[end] not in '"\\' and text[end] >= " ":
+                end += 1
+            if end > i:
+                self._buffer.append(text[i:end])
+                self._pos += end - i
+                i = end
+                self._check_string_prefix()
+                continue
+
+            char = text[i]
+            self._pos += 1
+            i += 1
+            if char == '"':
+                self._finish_string()
+                return i
+            if char == "\\":
+                self._buffer.append(char)
+                self._has_escape = True
+                self._escape = ""
+                continue
+            self._fail("Invalid control character in string")
+        return i
+
+    def _decoded_buffer(self) -> str:
+        raw = "".join(self._buffer)
+        if not self._has_escape:
+            return raw
+        return json.loads(f'"{raw}"')
+
+    def _check_string_prefix(self):
+        """Abort as soon as a key or enum string cannot be completed to an allowed value."""
+        if self._has_escape:
+            return
+        if self._token == "key":
+            frame = self._stack[-1]
+            if frame.schema is None or frame.schema.get("additionalProperties") is not False:
+                return
+            candidates = list((frame.schema.get("properties") or {}).keys())
+        else:
+            enum = (self._token_schema or {}).get("enum")
+            if not enum or not all(isinstance(value, str) for value in enum):
+                return
+            candidates = enum
+        prefix = "".join(self._buffer)
+        if not any(candidate.startswith(prefix) for candidate in candidates):
+            self._fail(f"{prefix!r} cannot match any allowed value")
+
+    def _finish_string(self):
+        value = self._decoded_buffer()
+        token = self._token
+        self._token = None
+        self._buffer = []
+        if token == "key":
+            frame = self._stack[-1]
+            schema = frame.schema
+            if (
+                schema is not None
+                and schema.get("additionalProperties") is False
+                and value not in (schema.get("properties") or {})
+            ):
+                self._fail(f"Unexpected key {value!r}")
+            frame.key = value
+            frame.state = "colon"
+            return
+        enum = (self._token_schema or {}).get("enum")
+        if enum and value not in enum:
+            self._fail(f"{value!r} is not one of {enum}")
+        self._emit(value)
+
+    def _finish_number(self):
+        raw = "".join(self._buffer)
+        self._token = None
+        self._buffer = []
+        try:
+            value = json.loads(raw)
+        except json.JSONDecodeError:
+            self._fail(f"Invalid number {raw!r}")
+        if not isinstance(value, (int, float)):
+            self._fail(f"Invalid number {raw!r}")
+        types = _schema_types(self._token_schema)
+        if types is not None and "number" not in types and isinstance(value, float):
+            if not value.is_integer() or "integer" not in types:
+                self._fail(f"Expected integer, got {raw}")
+        enum = (self._token_schema or {}).get("enum")
+        if enum and value not in enum:
+            self._fail(f"{raw} is not one of {enum}")
+        self._emit(value)
+
+    def _consume_literal(self, char: str):
+        word, value, index = self._literal
+        if word[index] != char:
+            self._fail(f"Invalid literal, expected {word!r}")
+        if index + 1 == len(word):
+            self._token = None
+            self._literal = None
+            self._emit(value)
+        else:
+            self._literal = (word, value, index + 1)
+
+    def _close_object(self):
+        frame = self._stack.pop()
+        required = (frame.schema or {}).get("required") or []
+        missing = [key for key in required if key not in frame.container]
+        if missing:
+            self._fail(f"Missing required keys {missing}")
+        self._emit(frame.container)
+
+    def _close_array(self):
+        frame = self._stack.pop()
+        min_items = (frame.schema or {}).get("minItems")
+        if min_items is not None and len(frame.container) < min_items:
+            self._fail(f"Array has fewer than {min_items} items")
+        self._emit(frame.container)
+
+    def _emit(self, value: Any):
+        if not self._stack:
+            self.value = value
+            return
+        frame = self._stack[-1]
+        if isinstance(frame.container, list):
+            frame.container.append(value)
+        else:
+            frame.container[frame.key] = value
+        frame.state = "comma_or_end"
+
+
+def _schema_types(schema: Optional[Dict[str, Any]]) -> Optional[Set[str]]:
+    if not schema or "type" not in schema:
+        return None
+    types = schema["type"]
+    return {types} if isinstance(types, str) else set(types)
+
+
+def response_format_schema(response_format: Any) -> Optional[Dict[str, Any]]:
+    """
+    Get the JSON schema that a response format requires of the output.
+
+    Args:
+        response_format (Any): A response format dict or a pydantic model class.
+
+    Returns:
+        Optional[Dict[str, Any]]: The schema; `{"type": "object"}` for JSON mode, None for text.
+    """
+    if isinstance(response_format, type) and issubclass(response_format, BaseModel):
+        return _model_schema(response_format)
+    if not isinstance(response_format, dict):
+        return None
+    if response_format.get("type") == "json_schema":
+        return (response_format.get("json_schema") or {}).get("schema") or {"type": "object"}
+    if response_format.get("type") == "json_object":
+        return {"type": "object"}
+    return None
+
+
+@lru_cache(maxsize=128)
+def _model_schema(model: type) -> Dict[str, Any]:
+    from openai.lib._parsing._completions import type_to_response_format_param
+
+    return type_to_response_format_param(model)["json_schema"]["schema"]
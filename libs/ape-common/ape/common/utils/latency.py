@@ -0,0 +1,114 @@
+import math
+from collections import deque
+from dataclasses import asdict, dataclass
+from threading import Lock
+from typing import Any, Deque, Dict, List, Optional
+
+
+@dataclass
+class CallTiming:
+    """
+    Latency measurements of a single (streamed) model call, in seconds.
+
+    Attributes:
+        model (Optional[str]): The model called.
+        total (float): Duration of the call, from the request to the last chunk.
+        ttft (Optional[float]): Time to first token. None if no token was received.
+        chunks (int): Number of content chunks received.
+        itl_mean (Optional[float]): Mean inter-token latency, i.e. gap between content chunks.
+        itl_max (Optional[float]): Largest gap between content chunks.
+        completed (bool): Whether the call completed, as opposed to timing out or failing.
+    """
+
+    model: Optional[str] = None
+    total: float = 0.0
+    ttft: Optional[float] = None
+    chunks: int = 0
+    itl_mean: Optional[float] = None
+    itl_max: Optional[float] = None
+    completed: bool = False
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    """
+    Compute a percentile with linear interpolation.
+
+    Args:
+        values (List[float]): The values.
+        q (float): The percentile, between 0 and 100.
+
+    Returns:
+        Optional[float]: The percentile, or None if there are no values.
+    """
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * q / 100.0
+    low = math.floor(rank)
+    high = math.ceil(rank)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+class LatencyTracker:
+    """
+    Keeps the timings of the most recent calls and summarizes them.
+
+    Args:
+        max_records (int): Number of recent calls kept. Defaults to 1000.
+    """
+
+    def __init__(self, max_records: int = 1000):
+        self.records: Deque[CallTiming] = deque(maxlen=max_records)
+        self._lock = Lock()
+
+    def add(self, timing: CallTiming) -> None:
+        with self._lock:
+            self.records.append(timing)
+
+    def values(
+        self, field: str, completed_only: bool = True, model: Optional[str] = None
+    ) -> List[float]:
+        """
+        Get a measurement of the recent calls.
+
+        Args:
+            field (str): The CallTiming field, e.g. "total" or "ttft".
+            completed_only (bool): Whether to skip calls that timed out or failed. Defaults to True.
+            model (Optional[str]): Only include calls to this model. Defaults to all models.
+
+        Returns:
+            List[float]: The values, oldest first.
+        """
+        with self._lock:
+            records = list(self.records)
+        return [
+            getattr(record, field)
+            for record in records
+            if getattr(record, field) is not None
+            and (record.completed or not completed_only)
+            and (model is None or record.model == model)
+        ]
+
+    def summary(self) -> Dict[str, Any]:
+        """
+        Summarize the recent calls.
+
+        Returns:
+            Dict[str, Any]: The number of calls and timeouts, and p50/p95/max of the time to
+                first token, inter-token latency and total duration of completed calls.
+        """
+        with self._lock:
+            records = list(self.records)
+        summary: Dict[str, Any] = {
+            "calls": len(records),
+            "incomplete": sum(1 for record in records if not record.completed),
+        }
+        for field in ("ttft", "itl_mean", "total"):
+            values = self.values(field)
+            summary[f"{field}_p50"] = percentile(values, 50)
+            summary[f"{field}_p95"] = percentile(values, 95)
+            summary[f"{field}_max"] = max(values) if values else None
+        return summary
@@ -0,0 +1,354 @@
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from email.utils import parsedate_to_datetime
+from threading import Lock
+from typing import Any, Deque, Dict, List, Optional, Tuple, Union
+
+from .concurrency import is_overload_error, signal_overload
+from .logging import logger
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket.
+
+    Callers reserve tokens up front and the balance may go negative; the returned wait
+    time is how long the caller must sleep before its reservation is covered. This keeps
+    callers roughly first-come first-served without an event loop bound lock.
+
+    Args:
+        rate (float): Tokens added per second.
+        capacity (float): Maximum number of tokens, i.e. the allowed burst.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self._updated_at = time.monotonic()
+        self._lock = Lock()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    def reserve(self, amount: float) -> float:
+        """
+        Reserve tokens.
+
+        Args:
+            amount (float): Number of tokens to take.
+
+        Returns:
+            float: Seconds to wait before the reservation is available.
+        """
+        with self._lock:
+            self._refill(time.monotonic())
+            self.tokens -= amount
+            if self.tokens >= 0:
+                return 0.0
+            return -self.tokens / self.rate
+
+    def set_rate(self, rate: float, capacity: float):
+        with self._lock:
+            self._refill(time.monotonic())
+            self.rate = rate
+            self.capacity = capacity
+            self.tokens = min(self.tokens, capacity)
+
+
+class ModelRateLimit:
+    """
+    Request and token limits of a single model, adapted from rate limit responses.
+
+    Configured limits are scaled by an adaptive factor that is halved on every rate limit
+    response and recovers additively on success. A Retry-After signal pauses every caller
+    of the model until it expires. Models without a configured request limit are
+    unthrottled until their first rate limit response, after which the observed request
+    rate of the last minute (at least `min_learned_rpm`) becomes their limit.
+
+    Args:
+        rpm (Optional[float]): Requests per minute. None means unlimited.
+        tpm (Optional[float]): Tokens per minute. None means unlimited.
+        burst_seconds (float): Size of the buckets, in seconds of traffic. Defaults to 10.
+    """
+
+    min_factor = 0.1
+    recovery_step = 0.05
+    default_backoff = 1.0
+    min_learned_rpm = 60.0
+    window = 60.0
+
+    def __init__(self, rpm: Optional[float] = None, tpm: Optional[float] = None, burst_seconds: float = 10.0):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.burst_seconds = burst_seconds
+        self.factor = 1.0
+        self.blocked_until = 0.0
+        self.rate_limited = 0
+        self.requests: Optional[TokenBucket] = None
+        self.tokens: Optional[TokenBucket] = None
+        self._history: Deque[Tuple[float, int]] = deque()
+        self._lock = Lock()
+        self._update_buckets()
+
+    def _bucket_params(self, per_minute: float) -> Tuple[float, float]:
+        rate = per_minute * self.factor / 60.0
+        return rate, max(1.0, rate * self.burst_seconds)
+
+    def _update_buckets(self):
+        for attr, per_minute in (("requests", self.rpm), ("tokens", self.tpm)):
+            bucket = getattr(self, attr)
+            if per_minute is None:
+                setattr(self, attr, None)
+            elif bucket is None:
+                setattr(self, attr, TokenBucket(*self._bucket_params(per_minute)))
+            else:
+                bucket.set_rate(*self._bucket_params(per_minute))
+
+    def _trim_history(self, now: float):
+        while self._history and self._history[0][0] < now - self.window:
+            self._history.popleft()
+
+    async def acquire(self, tokens: int = 0):
+        """
+        Wait until a request of `tokens` estimated tokens is allowed.
+
+        Args:
+            tokens (int): Estimated number of tokens of the request. Defaults to 0.
+        """
+        while True:
+            blocked_for = self.blocked_until - time.monotonic()
+            if blocked_for <= 0:
+                break
+            await asyncio.sleep(blocked_for)
+
+        wait = 0.0
+        if self.requests is not None:
+            wait = max(wait, self.requests.reserve(1))
+        if self.tokens is not None and tokens:
+            wait = max(wait, self.tokens.reserve(tokens))
+        with self._lock:
+            now = time.monotonic()
+            self._trim_history(now)
+            self._history.append((now + wait, tokens))
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def on_success(self):
+        if self.factor >= 1.0:
+            return
+        with self._lock:
+            self.factor = min(1.0, self.factor + self.recovery_step)
+            self._update_buckets()
+
+    def on_rate_limited(self, retry_after: Optional[float] = None):
+        with self._lock:
+            now = time.monotonic()
+            self.rate_limited += 1
+            self.blocked_until = max(
+                self.blocked_until,
+                now + (retry_after if retry_after is not None else self.default_backoff),
+            )
+            if self.rpm is None:
+                self._trim_history(now)
+                self.rpm = max(self.min_learned_rpm, float(len(self._history)))
+            self.factor = max(self.min_factor, self.factor * 0.5)
+            self._update_buckets()
+
+    def utilization(self) -> Dict[str, Any]:
+        with self._lock:
+            now = time.monotonic()
+            self._trim_history(now)
+            requests = len(self._history)
+            tokens = sum(count for _, count in self._history)
+        rpm = self.rpm * self.factor if self.rpm is not None else None
+        tpm = self.tpm * self.factor if self.tpm is not None else None
+        return {
+            "rpm_limit": rpm,
+            "tpm_limit": tpm,
+            "requests_last_minute": requests,
+            "tokens_last_minute": tokens,
+            "request_utilization": requests / rpm if rpm else None,
+            "token_utilization": tokens / tpm if tpm else None,
+            "adaptive_factor": self.factor,
+            "rate_limited": self.rate_limited,
+            "blocked_for": max(0.0, self.blocked_until - now),
+        }
+
+
+class RateLimiter:
+    """
+    Process-wide rate limiter shared by every outbound LLM call, keyed by model.
+
+    Limits can be configured per model with `configure`; unconfigured models start
+    unthrottled and learn a limit from rate limit responses. Calls should go through
+    `throttle`, which acquires a slot before the call and feeds 429 responses and their
+    Retry-After headers back into the limiter.
+
+    Example:
+        >>> RateLimiter.configure("gpt-4o-mini", rpm=500, tpm=200_000)
+        >>> async with RateLimiter.throttle("gpt-4o-mini", tokens=estimate_tokens(messages)):
+        ...     res = await acompletion(model="gpt-4o-mini", messages=messages)
+    """
+
+    _limits: Dict[str, ModelRateLimit] = {}
+    _lock: Lock = Lock()
+
+    @classmethod
+    def configure(
+        cls,
+        model: str,
+        rpm: Optional[float] = None,
+        tpm: Optional[float] = None,
+        burst_seconds: float = 10.0,
+    ) -> None:
+        """
+        Set the request and token limits of a model.
+
+        Args:
+            model (str): The model name, as passed to litellm.
+            rpm (Optional[float]): Requests per minute. None means unlimited.
+            tpm (Optional[float]): Tokens per minute. None means unlimited.
+            burst_seconds (float): Size of the buckets, in seconds of traffic. Defaults to 10.
+        """
+        with cls._lock:
+            cls._limits[model] = ModelRateLimit(rpm=rpm, tpm=tpm, burst_seconds=burst_seconds)
+
+    @classmethod
+    def get(cls, model: Optional[str]) -> ModelRateLimit:
+        model = model or ""
+        limit = cls._limits.get(model)
+        if limit is None:
+            with cls._lock:
+                limit = cls._limits.setdefault(model, ModelRateLimit())
+        return limit
+
+    @classmethod
+    async def acquire(cls, model: Optional[str], tokens: int = 0) -> None:
+        await cls.get(model).acquire(tokens)
+
+    @classmethod
+    def on_success(cls, model: Optional[str]) -> None:
+        cls.get(model).on_success()
+
+    @classmethod
+    def on_rate_limited(cls, model: Optional[str], retry_after: Optional[float] = None) -> None:
+        logger.warning(f"Rate limited on {model}, retry after {retry_after}s")
+        cls.get(model).on_rate_limited(retry_after)
+
+    @classmethod
+    @asynccontextmanager
+    async def throttle(cls, model: Optional[str], tokens: int = 0):
+        """
+        Acquire a slot for a call and record its outcome.
+
+        Args:
+            model (Optional[str]): The model name.
+            tokens (int): Estimated number of tokens of the call. Defaults to 0.
+        """
+        limit = cls.get(model)
+        await limit.acquire(tokens)
+        try:
+            yield limit
+        except Exception as e:
+            if is_rate_limit_error(e):
+                cls.on_rate_limited(model, get_retry_after(e))
+            if is_overload_error(e):
+                # Let the adaptive concurrency limiter of the caller see the overload
+                signal_overload()
+            raise
+        else:
+            limit.on_success()
+
+    @classmethod
+    def utilization(cls, model: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Get the current limits and usage over the last minute.
+
+        Args:
+            model (Optional[str]): The model. Defaults to all models seen so far.
+
+        Returns:
+            Dict[str, Any]: The utilization of the model, or of every model keyed by name.
+        """
+        if model is not None:
+            return cls.get(model).utilization()
+        return {name: limit.utilization() for name, limit in list(cls._limits.items())}
+
+    @classmethod
+    def reset(cls) -> None:
+        with cls._lock:
+            cls._limits = {}
+
+
+def is_rate_limit_error(error: BaseException) -> bool:
+    """Check whether an exception is a rate limit (HTTP 429) response."""
+    if type(error).__name__ == "RateLimitError":
+        return True
+    status_code = getattr(error, "status_code", None)
+    if status_code is None:
+        status_code = getattr(getattr(error, "response", None), "status_code", None)
+    return status_code == 429
+
+
+def get_retry_after(error: BaseException) -> Optional[float]:
+    """
+    Read the Retry-After delay of an error response, in seconds.
+
+    Args:
+        error (BaseException): The exception raised by the provider call.
+
+    Returns:
+        Optional[float]: The delay, or None if the response has no Retry-After header.
+    """
+    headers: Dict[str, str] = {}
+    for source in (
+        getattr(getattr(error, "response", None), "headers", None),
+        getattr(error, "litellm_response_headers", None),
+        getattr(error, "headers", None),
+    ):
+        if source:
+            headers.update({str(k).lower(): v for k, v in dict(source).items()})
+
+    if "retry-after-ms" in headers:
+        try:
+            return float(headers["retry-after-ms"]) / 1000.0
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def estimate_tokens(messages: Union[str, List[Any], None], max_tokens: int = 0) -> int:
+    """
+    Cheaply estimate the number of tokens of a request (about 4 characters per token).
+
+    Args:
+        messages (Union[str, List[Any], None]): A string, or a list of messages.
+        max_tokens (int): Expected number of output tokens. Defaults to 0.
+
+    Returns:
+        int: The estimated number of tokens.
+    """
+    if messages is None:
+        return max_tokens
+    if isinstance(messages, str):
+        chars = len(messages)
+    else:
+        chars = 0
+        for message in messages:
+            content = message.get("content") if isinstance(message, dict) else message
+            chars += len(content) if isinstance(content, str) else len(str(content))
+    return chars // 4 + 1 + max_tokens
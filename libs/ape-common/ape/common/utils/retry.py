@@ -0,0 +1,311 @@
+import asyncio
+import json
+import random
+import time
+from dataclasses import asdict, dataclass
+from threading import Lock
+from typing import Any, Awaitable, Callable, Dict, Optional, TypeVar
+
+from .logging import logger
+from .rate_limiter import get_retry_after
+
+T = TypeVar("T")
+
+# Errors for which retrying the same request cannot succeed
+_FATAL_ERROR_NAMES = {
+    "AuthenticationError",
+    "PermissionDeniedError",
+    "BadRequestError",
+    "ContextWindowExceededError",
+    "ContentPolicyViolationError",
+    "NotFoundError",
+    "UnprocessableEntityError",
+    "UnsupportedParamsError",
+    "InvalidRequestError",
+    "CircuitOpenError",
+}
+_FATAL_STATUS_CODES = {400, 401, 403, 404, 413, 422}
+
+
+def is_retryable_error(error: BaseException) -> bool:
+    """
+    Classify an error as retryable (transient) or fatal.
+
+    Authentication, permission, invalid request and context length errors are fatal.
+    Rate limits, timeouts, connection errors, 5xx responses, malformed model outputs and
+    unknown errors are retryable.
+
+    Args:
+        error (BaseException): The error raised by the call.
+
+    Returns:
+        bool: Whether the call may succeed if retried.
+    """
+    if isinstance(error, json.JSONDecodeError):
+        return True
+    for cls in type(error).__mro__:
+        if cls.__name__ in _FATAL_ERROR_NAMES:
+            # litellm raises some rate limits as subclasses of BadRequestError
+            return getattr(error, "status_code", None) == 429
+    status_code = getattr(error, "status_code", None)
+    if isinstance(status_code, int) and status_code in _FATAL_STATUS_CODES:
+        return False
+    return True
+
+
+class CircuitOpenError(Exception):
+    """Raised when a call is rejected because the circuit breaker of its model is open."""
+
+
+class CircuitBreaker:
+    """
+    Per-model circuit breaker.
+
+    After `failure_threshold` consecutive retryable failures the circuit opens and calls
+    are held back for `reset_timeout` seconds. It then lets a single probe call through
+    (half-open); a success closes the circuit, a failure opens it again.
+
+    Args:
+        failure_threshold (int): Consecutive failures that open the circuit. Defaults to 5.
+        reset_timeout (float): Seconds the circuit stays open. Defaults to 30.
+    """
+
+    _breakers: Dict[str, "CircuitBreaker"] = {}
+    _registry_lock: Lock = Lock()
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.times_opened = 0
+        self._probing = False
+        self._lock = Lock()
+
+    @classmethod
+    def get(cls, model: Optional[str]) -> "CircuitBreaker":
+        model = model or ""
+        breaker = cls._breakers.get(model)
+        if breaker is None:
+            with cls._registry_lock:
+                breaker = cls._breakers.setdefault(model, CircuitBreaker())
+        return breaker
+
+    @classmethod
+    def states(cls) -> Dict[str, str]:
+        """Get the state of the circuit of every model seen so far."""
+        return {model: breaker.state for model, breaker in list(cls._breakers.items())}
+
+    @classmethod
+    def reset_all(cls) -> None:
+        with cls._registry_lock:
+            cls._breakers = {}
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def retry_in(self) -> float:
+        """Seconds until the circuit lets a call through, 0 if it does now."""
+        with self._lock:
+            if self.opened_at is None:
+                return 0.0
+            remaining = self.opened_at + self.reset_timeout - time.monotonic()
+            if remaining > 0:
+                return remaining
+            if self._probing:
+                # Another caller is probing, check again shortly
+                return min(1.0, self.reset_timeout)
+            self._probing = True
+            return 0.0
+
+    def on_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._probing = False
+
+    def on_abort(self):
+        """Release the probe of a call that ended without a verdict on the provider."""
+        with self._lock:
+            self._probing = False
+
+    def on_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._probing or self.failures >= self.failure_threshold:
+                if self.opened_at is None or self._probing:
+                    self.times_opened += 1
+                self.opened_at = time.monotonic()
+                self._probing = False
+
+
+@dataclass
+class RetryStats:
+    """Counters of a RetryPolicy."""
+
+    calls: int = 0
+    attempts: int = 0
+    retries: int = 0
+    fatal_errors: int = 0
+    exhausted: int = 0
+    circuit_rejections: int = 0
+    backoff_seconds: float = 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+class RetryPolicy:
+    """
+    Retry policy with error classification, exponential backoff with full jitter,
+    Retry-After support, a per-call deadline and a per-model circuit breaker.
+
+    The delay before retry `n` is drawn uniformly from `[0, min(max_delay, base_delay * 2**n)]`
+    ("full jitter"), raised to the Retry-After delay of the error if there is one. Fatal
+    errors are raised immediately. With a deadline, each attempt is also bounded by the
+    time left, so a stalled attempt cannot outlive it. A call gives up when `max_attempts`
+    is reached or when the deadline passes.
+
+    While the circuit of the model is open, a call waits for it to let a call through. With
+    a deadline, a call that cannot get through in time fails fast with CircuitOpenError
+    instead. Timeouts count as failures of the provider. A call cancelled by its caller
+    does not count either way.
+
+    Example:
+        >>> policy = RetryPolicy(max_attempts=5, deadline=60)
+        >>> res = await policy.call(lambda: acompletion(model=model, messages=messages), model=model)
+
+    Args:
+        max_attempts (int): Maximum number of attempts, including the first. Defaults to 5.
+        base_delay (float): Backoff base, in seconds. Defaults to 0.5.
+        max_delay (float): Maximum backoff, in seconds. Defaults to 30.
+        deadline (Optional[float]): Total time budget of a call, in seconds, including
+            backoff. None means no deadline.
+        use_circuit_breaker (bool): Whether to hold calls back while the circuit of the model
+            is open. Defaults to True.
+    """
+
+    def __init__(
+        self,
+        max_attempts: int = 5,
+        base_delay: float = 0.5,
+        max_delay: float = 30.0,
+        deadline: Optional[float] = None,
+        use_circuit_breaker: bool = True,
+    ):
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.deadline = deadline
+        self.use_circuit_breaker = use_circuit_breaker
+        self.stats = RetryStats()
+
+    def backoff(self, attempt: int, error: Optional[BaseException] = None) -> float:
+        """
+        Compute the delay before the next attempt.
+
+        Args:
+            attempt (int): Number of attempts made so far, starting at 1.
+            error (Optional[BaseException]): The error of the last attempt.
+
+        Returns:
+            float: The delay, in seconds.
+        """
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+        if error is not None:
+            retry_after = get_retry_after(error)
+            if retry_after is not None:
+                delay = max(delay, retry_after)
+        return delay
+
+    async def call(
+        self,
+        fn: Callable[[], Awaitable[T]],
+        model: Optional[str] = None,
+        deadline: Optional[float] = None,
+        max_attempts: Optional[int] = None,
+    ) -> T:
+        """
+        Call `fn` until it succeeds, a fatal error occurs or the retry budget is exhausted.
+
+        Args:
+            fn (Callable[[], Awaitable[T]]): Factory of the coroutine to run on each attempt.
+            model (Optional[str]): The model called, used for the circuit breaker.
+            deadline (Optional[float]): Time budget of this call in seconds, overriding the
+                policy's deadline.
+            max_attempts (Optional[int]): Maximum number of attempts of this call, overriding
+                the policy's.
+
+        Returns:
+            T: The result of the first successful attempt.
+
+        Raises:
+            Exception: The last error, asyncio.TimeoutError if the deadline passes during an
+                attempt, or CircuitOpenError if the call has a deadline and the circuit of the
+                model stays open for longer than the remaining time.
+        """
+        if deadline is None:
+            deadline = self.deadline
+        if max_attempts is None:
+            max_attempts = self.max_attempts
+        expires_at = time.monotonic() + deadline if deadline is not None else None
+        breaker = CircuitBreaker.get(model) if self.use_circuit_breaker else None
+        self.stats.calls += 1
+        attempt = 0
+        while True:
+            if breaker is not None:
+                wait = breaker.retry_in()
+                if wait > 0:
+                    if expires_at is not None and time.monotonic() + wait > expires_at:
+                        self.stats.circuit_rejections += 1
+                        raise CircuitOpenError(f"Circuit breaker open for model {model}")
+                    self.stats.backoff_seconds += wait
+                    await asyncio.sleep(wait)
+                    continue
+
+            attempt += 1
+            self.stats.attempts += 1
+            try:
+                if expires_at is None:
+                    result = await fn()
+                else:
+                    remaining = expires_at - time.monotonic()
+                    result = await asyncio.wait_for(fn(), timeout=max(0.0, remaining))
+            except asyncio.CancelledError:
+                if breaker is not None:
+                    breaker.on_abort()
+                raise
+            except Exception as e:
+                if not is_retryable_error(e):
+                    self.stats.fatal_errors += 1
+                    if breaker is not None:
+                        # The provider answered, so the circuit is healthy
+                        breaker.on_success()
+                    raise
+                if breaker is not None:
+                    if isinstance(e, json.JSONDecodeError):
+                        # A malformed model output still means the provider is healthy
+                        breaker.on_success()
+                    else:
+                        breaker.on_failure()
+                delay = self.backoff(attempt, e)
+                out_of_time = expires_at is not None and time.monotonic() + delay >= expires_at
+                if attempt >= max_attempts or out_of_time:
+                    self.stats.exhausted += 1
+                    raise
+                logger.warning(
+                    f"Attempt {attempt}/{max_attempts} failed ({type(e).__name__}: {e}), "
+                    f"retrying in {delay:.2f}s"
+                )
+                self.stats.retries += 1
+                self.stats.backoff_seconds += delay
+                await asyncio.sleep(delay)
+            else:
+                if breaker is not None:
+                    breaker.on_success()
+                return result
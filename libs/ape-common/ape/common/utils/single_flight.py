@@ -0,0 +1,107 @@
+import asyncio
+from threading import Lock
+from typing import Any, Awaitable, Callable, ClassVar, Dict, Hashable, List, TypeVar
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls that share the same key.
+
+    While a call for a key is in flight, later callers with the same key await the same
+    task instead of starting their own, and all of them receive its result or exception.
+    The key is released as soon as the call completes, so later calls go through the
+    cache as usual.
+
+    The shared task is shielded while other callers still wait on it: cancelling one caller
+    does not cancel the call for the others, but when the last waiting caller is cancelled
+    the call is cancelled too, so abandoned work (timeouts, lost races, pruned trials) does
+    not keep running. Calls are only coalesced within the same event loop.
+
+    Args:
+        name (str): Name used when reporting counters.
+    """
+
+    _registry: ClassVar[List["SingleFlight"]] = []
+
+    def __init__(self, name: str):
+        self.name = name
+        self.calls = 0
+        self.coalesced = 0
+        self._in_flight: Dict[Hashable, asyncio.Task] = {}
+        # Number of callers awaiting each shared task
+        self._waiters: Dict[asyncio.Task, int] = {}
+        self._lock = Lock()
+        SingleFlight._registry.append(self)
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        """
+        Run `fn` unless a call with the same key is already in flight.
+
+        Args:
+            key (Hashable): The deduplication key, e.g. the cache key of the call.
+            fn (Callable[[], Awaitable[T]]): Factory of the coroutine to run.
+
+        Returns:
+            T: The result of the call.
+        """
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            self.calls += 1
+            task = self._in_flight.get(key)
+            if task is not None and task.get_loop() is loop and not task.done():
+                self.coalesced += 1
+            else:
+                task = loop.create_task(fn())
+                self._in_flight[key] = task
+                task.add_done_callback(lambda t: self._release(key, t))
+            self._waiters[task] = self._waiters.get(task, 0) + 1
+        try:
+            return await asyncio.shield(task)
+        finally:
+            with self._lock:
+                self._waiters[task] -= 1
+                abandoned = self._waiters[task] == 0 and not task.done()
+                if self._waiters[task] == 0:
+                    del self._waiters[task]
+                if abandoned and self._in_flight.get(key) is task:
+                    # Later callers start a new call instead of joining a cancelled one
+                    del self._in_flight[key]
+            if abandoned:
+                task.cancel()
+
+    def _release(self, key: Hashable, task: asyncio.Task):
+        with self._lock:
+            if self._in_flight.get(key) is task:
+                del self._in_flight[key]
+        # Mark the exception as retrieved in case every caller was cancelled
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Get the counters of this instance.
+
+        Returns:
+            Dict[str, int]: Total calls, coalesced calls and calls currently in flight.
+        """
+        return {
+            "calls": self.calls,
+            "coalesced": self.coalesced,
+            "in_flight": len(self._in_flight),
+        }
+
+    def reset_stats(self):
+        self.calls = 0
+        self.coalesced = 0
+
+    @classmethod
+    def get_stats(cls) -> Dict[str, Dict[str, Any]]:
+        """
+        Get the counters of every SingleFlight instance, keyed by name.
+
+        Returns:
+            Dict[str, Dict[str, Any]]: The counters of each instance.
+        """
+        return {instance.name: instance.stats() for instance in cls._registry}
@@ -0,0 +1,135 @@
+from collections import OrderedDict
+from threading import Lock
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+import litellm
+
+from .rate_limiter import estimate_tokens
+
+# Tokens added by the chat format, per message and per request (OpenAI's accounting)
+MESSAGE_OVERHEAD_TOKENS = 4
+REQUEST_OVERHEAD_TOKENS = 3
+
+
+class TokenCounter:
+    """
+    Tokenizer-backed token counts of requests, computed locally.
+
+    Message contents are counted with `litellm.token_counter` and memoized, so the static
+    messages of a prompt (system, instructions, few-shot) are tokenized once however many
+    times the prompt is called. Falls back to `estimate_tokens` when the model has no
+    known tokenizer.
+
+    Args:
+        max_entries (int): Maximum number of memoized counts. Defaults to 4096.
+    """
+
+    _instance: Optional["TokenCounter"] = None
+
+    def __init__(self, max_entries: int = 4096):
+        self.max_entries = max_entries
+        self._counts: "OrderedDict[Tuple[Optional[str], str], int]" = OrderedDict()
+        self._context_windows: Dict[Optional[str], Optional[int]] = {}
+        self._lock = Lock()
+
+    @classmethod
+    def get_instance(cls) -> "TokenCounter":
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    def count_text(self, model: Optional[str], text: str) -> int:
+        """
+        Count the tokens of a text.
+
+        Args:
+            model (Optional[str]): The model whose tokenizer is used.
+            text (str): The text.
+
+        Returns:
+            int: The number of tokens.
+        """
+        if not text:
+            return 0
+        key = (model, text)
+        with self._lock:
+            count = self._counts.get(key)
+            if count is not None:
+                self._counts.move_to_end(key)
+                return count
+        try:
+            count = litellm.token_counter(model=model or "", text=text)
+        except Exception:
+            count = estimate_tokens(text)
+        with self._lock:
+            self._counts[key] = count
+            if len(self._counts) > self.max_entries:
+                self._counts.popitem(last=False)
+        return count
+
+    def count_messages(self, model: Optional[str], messages: Union[str, List[Any]]) -> int:
+        """
+        Count the input tokens of a request.
+
+        Args:
+            model (Optional[str]): The model whose tokenizer is used.
+            messages (Union[str, List[Any]]): A string, or a list of messages.
+
+        Returns:
+            int: The number of tokens, including the chat format overhead.
+        """
+        if isinstance(messages, str):
+            return self.count_text(model, messages)
+        total = REQUEST_OVERHEAD_TOKENS
+        for message in messages:
+            total += MESSAGE_OVERHEAD_TOKENS + self.count_text(model, _message_text(message))
+        return total
+
+    def context_window(self, model: Optional[str]) -> Optional[int]:
+        """
+        Get the maximum number of input tokens of a model.
+
+        Returns:
+            Optional[int]: The context window, or None if the model is unknown.
+        """
+        if model in self._context_windows:
+            return self._context_windows[model]
+        window = None
+        if model:
+            try:
+                info = litellm.get_model_info(model)
+                window = info.get("max_input_tokens") or info.get("max_tokens")
+            except Exception:
+                window = None
+        self._context_windows[model] = window
+        return window
+
+
+def _message_text(message: Any) -> str:
+    content = message.get("content") if isinstance(message, dict) else message
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):
+        return "".join(
+            block.get("text", "") if isinstance(block, dict) else str(block) for block in content
+        )
+    return "" if content is None else str(content)
+
+
+def count_tokens(model: Optional[str], messages: Union[str, List[Any]]) -> int:
+    """
+    Count the input tokens of a request with the shared TokenCounter.
+
+    Args:
+        model (Optional[str]): The model whose tokenizer is used.
+        messages (Union[str, List[Any]]): A string, or a list of messages.
+
+    Returns:
+        int: The number of tokens.
+    """
+    return TokenCounter.get_instance().count_messages(model, messages)
+
+
+def context_window(model: Optional[str]) -> Optional[int]:
+    """Get the maximum number of input tokens of a model, or None if it is unknown."""
+    return TokenCounter.get_instance().context_window(model)
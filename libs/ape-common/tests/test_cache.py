@@ -0,0 +1,15 @@
+from ape.common.cache import MetricCache
+
+
+def test_len_and_flush_after_close(tmp_path):
+    cache = MetricCache(cache_dir=str(tmp_path))
+    try:
+        cache.set({"inputs": {"q": 1}}, "a", 1.0)
+        assert len(cache) == 1
+        cache.close()
+        # Entries set after closing are only kept in memory
+        cache.set({"inputs": {"q": 2}}, "b", 0.0)
+        cache.flush()
+        assert len(cache) == 2
+    finally:
+        MetricCache._instance = None
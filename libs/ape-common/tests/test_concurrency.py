@@ -0,0 +1,30 @@
+import asyncio
+
+from ape.common.utils.concurrency import AdaptiveConcurrencyLimiter, bounded_map
+
+
+async def _short_call(item: int) -> int:
+    await asyncio.sleep(0.001 * (item % 3))
+    return item
+
+
+def test_bounded_map_early_close_releases_slots():
+    async def main():
+        limiter = AdaptiveConcurrencyLimiter(initial_limit=8, max_limit=8)
+        for stop_after in (1, 3, 5, 9):
+            results = bounded_map(_short_call, range(100), limiter)
+            consumed = 0
+            async for _ in results:
+                consumed += 1
+                # Let the producer schedule calls that are cancelled before they start
+                await asyncio.sleep(0)
+                if consumed >= stop_after:
+                    break
+            await results.aclose()
+            assert limiter.in_flight == 0
+        # The shared limiter still grants every slot after the early closes
+        values = [value async for _, value in bounded_map(_short_call, range(20), limiter)]
+        assert sorted(values) == list(range(20))
+        assert limiter.in_flight == 0
+
+    asyncio.run(asyncio.wait_for(main(), timeout=10))
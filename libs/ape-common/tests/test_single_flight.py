@@ -0,0 +1,37 @@
+import asyncio
+
+from ape.common.utils.single_flight import SingleFlight
+
+
+def test_shared_call_is_cancelled_with_its_last_caller():
+    async def main():
+        single_flight = SingleFlight("test")
+        state = {"started": 0, "cancelled": 0}
+
+        async def call():
+            state["started"] += 1
+            try:
+                await asyncio.sleep(0.2)
+            except asyncio.CancelledError:
+                state["cancelled"] += 1
+                raise
+            return 42
+
+        # Cancelling one caller leaves the call running for the other
+        first = asyncio.create_task(single_flight.do("a", call))
+        second = asyncio.create_task(single_flight.do("a", call))
+        await asyncio.sleep(0.05)
+        first.cancel()
+        assert await second == 42
+        assert state == {"started": 1, "cancelled": 0}
+
+        # Once every caller is gone, the call is cancelled
+        try:
+            await asyncio.wait_for(single_flight.do("b", call), timeout=0.05)
+        except asyncio.TimeoutError:
+            pass
+        await asyncio.sleep(0)
+        assert state == {"started": 2, "cancelled": 1}
+        assert single_flight.stats()["in_flight"] == 0
+
+    asyncio.run(main())
@@ -1,4 +1,6 @@
 import os
+from typing import Any, Dict, Optional
+
 from ape.common.prompt import Prompt
 import promptfile as pf
 
@@ -9,3 +11,31 @@ if os.path.exists(current_dir):
     ApeCorePrompts = pf.Client(base_path=current_dir, prompt_class=Prompt)
 else:
     raise FileNotFoundError(f"Prompts directory not found at {current_dir}")
+
+# Outputs of the meta-prompts that describe their JSON answer in the prompt text only
+_FEEDBACK_SCHEMA = {
+    "type": "object",
+    "properties": {"feedback": {"type": "string"}},
+    "required": ["feedback"],
+}
+_TEXT_OUTPUT_SCHEMAS: Dict[str, Dict[str, Any]] = {
+    "text-gradient-generator": _FEEDBACK_SCHEMA,
+    "text-grad-evo-generator": _FEEDBACK_SCHEMA,
+    "expel-success-feedback-generator": _FEEDBACK_SCHEMA,
+    "expel-failure-feedback-generator": _FEEDBACK_SCHEMA,
+}
+
+
+def mock_core_prompts(provider: Any, prefix: Optional[str] = "mock"):
+    """
+    Serve the meta-prompts of the trainers from a MockLLMProvider, for offline load tests.
+
+    The mock answers follow the output each trainer parses. The core prompts are shared, so
+    their models stay rerouted for the whole process.
+
+    Args:
+        provider (MockLLMProvider): The installed mock provider.
+        prefix (Optional[str]): Provider name the models are rerouted to, see
+            `MockLLMProvider.serve`. Defaults to "mock".
+    """
+    provider.serve(ApeCorePrompts.prompts.values(), schemas=_TEXT_OUTPUT_SCHEMAS, prefix=prefix)
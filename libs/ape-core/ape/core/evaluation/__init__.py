@@ -0,0 +1,17 @@
+from .store import EvaluationStore, item_order
+from .racing import Race, RacingPolicy
+from .successive_halving import SuccessiveHalving
+from .pruning import PrunerName, make_pruner
+from .study import AsyncStudyOptimizer, create_study
+
+__all__ = [
+    "AsyncStudyOptimizer",
+    "EvaluationStore",
+    "Race",
+    "RacingPolicy",
+    "SuccessiveHalving",
+    "PrunerName",
+    "create_study",
+    "item_order",
+    "make_pruner",
+]
@@ -0,0 +1,29 @@
+from typing import Literal, Optional
+
+import optuna
+
+PrunerName = Literal["median", "successive_halving"]
+
+
+def make_pruner(name: Optional[PrunerName], n_startup_trials: int = 5) -> optuna.pruners.BasePruner:
+    """
+    Create the Optuna pruner of a trainer evaluating its trials on minibatches.
+
+    Args:
+        name (Optional[PrunerName]): "median" prunes a trial whose running score is below the
+            median of the previous trials after the same number of minibatches,
+            "successive_halving" keeps the best 1/3 of the trials at geometrically spaced
+            minibatches, and None never prunes.
+        n_startup_trials (int): Trials completed before the median pruner starts pruning.
+            Defaults to 5.
+
+    Returns:
+        optuna.pruners.BasePruner: The pruner.
+    """
+    if name is None:
+        return optuna.pruners.NopPruner()
+    if name == "median":
+        return optuna.pruners.MedianPruner(n_startup_trials=n_startup_trials, n_warmup_steps=0)
+    if name == "successive_halving":
+        return optuna.pruners.SuccessiveHalvingPruner(min_resource=1, reduction_factor=3)
+    raise ValueError(f"Unknown pruner: {name}")
@@ -0,0 +1,167 @@
+import math
+import random
+from typing import Any, Dict, List, Optional
+
+
+class RacingPolicy:
+    """
+    Early termination of candidate evaluations that cannot beat an incumbent score.
+
+    A raced evaluation scores the dataset items in a random order and keeps an upper
+    confidence bound on the candidate's mean score over the whole dataset. It stops as soon
+    as the bound is not above the incumbent, since the candidate then cannot beat it with
+    the configured confidence.
+
+    Two bounds are used, and the tighter one wins:
+
+    - The exact bound, the mean the candidate would get if every remaining item scored
+      `max_score`. It holds with certainty and is checked after every item.
+    - The Hoeffding-Serfling bound for sampling without replacement from the dataset. It is
+      checked at checkpoints growing geometrically from `min_items`, and the allowed error
+      is split among the checkpoints.
+
+    Racing assumes the global metric is the average of the item scores, and that scores lie
+    between 0 and `max_score`.
+
+    Args:
+        confidence (float): Probability that a stopped candidate could not have beaten the
+            incumbent. Defaults to 0.95.
+        min_items (int): Number of items scored before the statistical bound is first
+            checked. Defaults to 8.
+        growth (float): Growth factor of the checkpoints. Defaults to 1.5.
+        max_score (float): Highest item score. Defaults to 1.0.
+        seed (int): Seed of the item order. Candidates raced on the same dataset are scored
+            in the same order. Defaults to 0.
+    """
+
+    def __init__(
+        self,
+        confidence: float = 0.95,
+        min_items: int = 8,
+        growth: float = 1.5,
+        max_score: float = 1.0,
+        seed: int = 0,
+    ):
+        if not 0.0 < confidence < 1.0:
+            raise ValueError(f"confidence must be between 0 and 1, got {confidence}")
+        self.confidence = confidence
+        self.min_items = max(1, min_items)
+        self.growth = max(1.01, growth)
+        self.max_score = max_score
+        self.seed = seed
+        self.stats: Dict[str, int] = {"races": 0, "lost_races": 0, "saved_cells": 0}
+
+    def order(self, keys: List[str]) -> List[str]:
+        """
+        Shuffle item keys into the order they are scored in.
+
+        Args:
+            keys (List[str]): The keys of the items.
+
+        Returns:
+            List[str]: The keys in a random order, which is the same for the same keys.
+        """
+        keys = sorted(keys)
+        random.Random(self.seed).shuffle(keys)
+        return keys
+
+    def checkpoints(self, size: int) -> List[int]:
+        """Get the item counts at which the statistical bound is checked."""
+        points = []
+        count = self.min_items
+        while count < size:
+            points.append(count)
+            count = max(count + 1, int(math.ceil(count * self.growth)))
+        return points
+
+    def start(self, size: int, incumbent: float) -> "Race":
+        """
+        Start racing a candidate.
+
+        Args:
+            size (int): The number of items in the dataset.
+            incumbent (float): The score the candidate has to beat.
+
+        Returns:
+            Race: The race, to which item scores are added as they come.
+        """
+        self.stats["races"] += 1
+        return Race(self, size, incumbent)
+
+    def count_saved(self, cells: int):
+        self.stats["saved_cells"] += cells
+
+    def get_stats(self) -> Dict[str, Any]:
+        return dict(self.stats)
+
+
+class Race:
+    """
+    The state of a raced evaluation, see RacingPolicy.
+
+    Args:
+        policy (RacingPolicy): The policy.
+        size (int): The number of items in the dataset.
+        incumbent (float): The score the candidate has to beat.
+    """
+
+    def __init__(self, policy: RacingPolicy, size: int, incumbent: float):
+        self.policy = policy
+        self.size = size
+        self.incumbent = incumbent
+        self.count = 0
+        self.total = 0.0
+        self.lost = False
+        self._checkpoints = policy.checkpoints(size)
+        self._next_checkpoint = 0
+        self._log_term = math.log(max(1, len(self._checkpoints)) / (1.0 - policy.confidence))
+
+    def upper_bound(self, statistical: bool = True) -> float:
+        """
+        Get the upper bound of the candidate's mean score over the dataset.
+
+        Args:
+            statistical (bool): Whether to also use the statistical bound. Defaults to True.
+
+        Returns:
+            float: The bound.
+        """
+        max_score = self.policy.max_score
+        bound = (self.total + (self.size - self.count) * max_score) / self.size
+        if statistical and 0 < self.count < self.size:
+            mean = self.total / self.count
+            finite_population = 1.0 - (self.count - 1) / self.size
+            margin = max_score * math.sqrt(finite_population * self._log_term / (2 * self.count))
+            bound = min(bound, mean + margin)
+        return bound
+
+    def add(self, score: float) -> bool:
+        """
+        Add the score of an item.
+
+        Args:
+            score (float): The score.
+
+        Returns:
+            bool: True if the candidate lost the race and the evaluation should stop.
+        """
+        if self.lost:
+            return True
+        self.count += 1
+        self.total += min(max(score, 0.0), self.policy.max_score)
+        checkpoint = False
+        while (
+            self._next_checkpoint < len(self._checkpoints)
+            and self.count >= self._checkpoints[self._next_checkpoint]
+        ):
+            self._next_checkpoint += 1
+            checkpoint = True
+        if self.upper_bound(statistical=checkpoint) <= self.incumbent:
+            self.lost = True
+            self.policy.stats["lost_races"] += 1
+        return self.lost
+
+    @property
+    def mean(self) -> Optional[float]:
+        """The mean score of the items scored so far."""
+        return self.total / self.count if self.count else None
@@ -0,0 +1,129 @@
+from typing import Any, Dict, List, Optional, Tuple
+
+from ape.common.cache.keys import fast_hash, hash_parts
+from ape.common.prompt import Prompt
+from ape.common.types import DatasetItem, MetricResult
+
+# A cell is the prediction of a prompt on a dataset item, and its metric result
+Cell = Tuple[Any, MetricResult]
+
+
+class EvaluationStore:
+    """
+    Per-item evaluation results of a trainer, keyed by prompt fingerprint and dataset item.
+
+    Trainers score the same prompt on the same items many times, for example a batch with
+    the current best prompt at every step, or the trainset right after scoring it. The store
+    keeps every (prediction, MetricResult) cell computed with the trainer's generator and
+    metric, so an evaluation only computes the cells it is missing.
+
+    Cells whose prediction is empty, which is what a generator returns when its call
+    failed, are not stored so that they are computed again.
+    """
+
+    def __init__(self):
+        self._cells: Dict[str, Dict[str, Cell]] = {}
+        self.stats: Dict[str, int] = {
+            "evaluations": 0,
+            "computed_cells": 0,
+            "reused_cells": 0,
+        }
+
+    @staticmethod
+    def prompt_key(prompt: Prompt) -> str:
+        """Key of a prompt, its content fingerprint."""
+        return prompt.fingerprint()
+
+    @staticmethod
+    def item_key(item: DatasetItem) -> str:
+        """Key of a dataset item, the hash of its content."""
+        return hash_parts("item", item)
+
+    def get(self, prompt_key: str, item_key: str) -> Optional[Cell]:
+        """
+        Get a stored cell.
+
+        Args:
+            prompt_key (str): The key of the prompt.
+            item_key (str): The key of the dataset item.
+
+        Returns:
+            Optional[Cell]: The prediction and metric result, or None if not stored.
+        """
+        return self._cells.get(prompt_key, {}).get(item_key)
+
+    def set(self, prompt_key: str, item_key: str, pred: Any, result: MetricResult):
+        """
+        Store a cell, unless its prediction is empty.
+
+        Args:
+            prompt_key (str): The key of the prompt.
+            item_key (str): The key of the dataset item.
+            pred (Any): The prediction of the prompt on the item.
+            result (MetricResult): The metric result of the prediction.
+        """
+        if pred is None or pred == "" or pred == {}:
+            return
+        self._cells.setdefault(prompt_key, {})[item_key] = (pred, result)
+
+    def lookup(
+        self, prompt: Prompt, dataset: List[DatasetItem]
+    ) -> Tuple[str, List[str], Dict[str, Cell]]:
+        """
+        Look up the cells of an evaluation and count it in the statistics.
+
+        Args:
+            prompt (Prompt): The prompt evaluated.
+            dataset (List[DatasetItem]): The dataset evaluated.
+
+        Returns:
+            Tuple[str, List[str], Dict[str, Cell]]: The prompt key, the key of each item, and
+                the stored cells by item key.
+        """
+        prompt_key = self.prompt_key(prompt)
+        item_keys = [self.item_key(item) for item in dataset]
+        stored = self._cells.get(prompt_key, {})
+        found = {key: stored[key] for key in item_keys if key in stored}
+        self.stats["evaluations"] += 1
+        self.stats["reused_cells"] += sum(1 for key in item_keys if key in found)
+        return prompt_key, item_keys, found
+
+    def count_computed(self, cells: int):
+        self.stats["computed_cells"] += cells
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get the reuse statistics of the store.
+
+        Returns:
+            Dict[str, Any]: Evaluations, computed and reused cells, the share of reused cells,
+                and the number of prompts and cells stored.
+        """
+        cells = self.stats["computed_cells"] + self.stats["reused_cells"]
+        return {
+            **self.stats,
+            "reuse_rate": self.stats["reused_cells"] / cells if cells else 0.0,
+            "stored_prompts": len(self._cells),
+            "stored_cells": sum(len(cells) for cells in self._cells.values()),
+        }
+
+    def clear(self):
+        self._cells.clear()
+
+
+def item_order(dataset: List[DatasetItem], seed: int = 0) -> List[int]:
+    """
+    Shuffle the indices of a dataset into a seeded order.
+
+    Items are ordered by a seeded hash of their content, so every subset of a dataset comes
+    in the same relative order, and minibatches taken from it are the same for every prompt.
+
+    Args:
+        dataset (List[DatasetItem]): The dataset.
+        seed (int): The seed. Defaults to 0.
+
+    Returns:
+        List[int]: The indices of the items, shuffled.
+    """
+    ranks = [fast_hash(f"{seed}:{EvaluationStore.item_key(item)}") for item in dataset]
+    return sorted(range(len(dataset)), key=lambda index: ranks[index])
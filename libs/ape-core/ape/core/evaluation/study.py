@@ -0,0 +1,111 @@
+import asyncio
+from typing import Awaitable, Callable, Optional, Set
+
+import optuna
+from optuna.trial import TrialState
+
+from ape.common.utils.logging import logger
+
+
+def create_study(
+    seed: Optional[int] = None,
+    trial_concurrency: int = 1,
+    pruner: Optional[optuna.pruners.BasePruner] = None,
+) -> optuna.Study:
+    """
+    Create a study maximizing its objective with a multivariate TPE sampler.
+
+    With concurrent trials, the sampler uses the constant liar strategy: trials still
+    running count as if they had the worst score, so concurrent trials do not all sample
+    the same region.
+
+    Args:
+        seed (Optional[int]): Seed of the sampler. Defaults to None.
+        trial_concurrency (int): Number of trials run concurrently. Defaults to 1.
+        pruner (Optional[optuna.pruners.BasePruner]): The pruner. Defaults to no pruning.
+
+    Returns:
+        optuna.Study: The study.
+    """
+    return optuna.create_study(
+        direction="maximize",
+        sampler=optuna.samplers.TPESampler(
+            seed=seed, multivariate=True, constant_liar=trial_concurrency > 1
+        ),
+        pruner=pruner or optuna.pruners.NopPruner(),
+    )
+
+
+class AsyncStudyOptimizer:
+    """
+    Runs the trials of an Optuna study as coroutines on the running event loop.
+
+    `study.optimize` calls a synchronous objective, so async objectives had to run it in a
+    worker thread and drive their coroutines from there, one trial at a time. This optimizer
+    uses the ask and tell interface instead: it keeps up to `trial_concurrency` trials in
+    flight, asks for a new trial as soon as one finishes, and tells the study its result.
+
+    An objective raising `optuna.TrialPruned` is told as pruned. As with `study.optimize`, one
+    raising any other exception is told as failed, the trials in flight are cancelled and the
+    exception is raised. `Study.stop` only works inside `study.optimize`,
+    so objectives call `stop()` on the optimizer instead.
+
+    Args:
+        study (optuna.Study): The study.
+        trial_concurrency (int): Maximum number of trials in flight. Defaults to 4.
+    """
+
+    def __init__(self, study: optuna.Study, trial_concurrency: int = 4):
+        self.study = study
+        self.trial_concurrency = max(1, trial_concurrency)
+        self._stopped = False
+
+    def stop(self):
+        """Stop asking for new trials. Trials in flight still complete."""
+        self._stopped = True
+
+    async def _run(self, objective: Callable[[optuna.Trial], Awaitable[float]]):
+        trial = self.study.ask()
+        try:
+            value = await objective(trial)
+        except optuna.TrialPruned:
+            self.study.tell(trial, state=TrialState.PRUNED)
+        except Exception as e:
+            logger.error(f"Trial {trial.number} failed: {e}")
+            self.study.tell(trial, state=TrialState.FAIL)
+            raise
+        else:
+            self.study.tell(trial, value)
+
+    async def optimize(
+        self, objective: Callable[[optuna.Trial], Awaitable[float]], n_trials: int
+    ) -> optuna.Study:
+        """
+        Run trials until `n_trials` are done or the optimizer is stopped.
+
+        Args:
+            objective (Callable[[optuna.Trial], Awaitable[float]]): The async objective.
+            n_trials (int): The number of trials.
+
+        Returns:
+            optuna.Study: The study.
+        """
+        self._stopped = False
+        in_flight: Set[asyncio.Task] = set()
+        asked = 0
+        try:
+            while True:
+                while asked < n_trials and len(in_flight) < self.trial_concurrency:
+                    if self._stopped:
+                        break
+                    in_flight.add(asyncio.create_task(self._run(objective)))
+                    asked += 1
+                if not in_flight:
+                    break
+                done, in_flight = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    task.result()
+        finally:
+            for task in in_flight:
+                task.cancel()
+        return self.study
@@ -0,0 +1,111 @@
+import asyncio
+import math
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from ape.common.types import DatasetItem
+
+from .store import item_order
+
+
+class SuccessiveHalving:
+    """
+    Multi-fidelity scheduler selecting the best of a population of candidates.
+
+    Every candidate is scored on a small minibatch, the best `1 / eta` of them are promoted
+    to a budget `eta` times larger, and so on until the survivors are scored on the whole
+    dataset. Minibatches are prefixes of one shuffled order of the items, so each rung
+    extends the previous one and, with the trainer's EvaluationStore, only the new items of
+    a rung are generated and scored.
+
+    Args:
+        min_items (int): Number of items of the first rung. Defaults to 16.
+        eta (int): Reduction factor between rungs. Defaults to 3.
+        seed (int): Seed of the item order. Defaults to 0.
+    """
+
+    def __init__(self, min_items: int = 16, eta: int = 3, seed: int = 0):
+        if eta < 2:
+            raise ValueError(f"eta must be at least 2, got {eta}")
+        self.min_items = max(1, min_items)
+        self.eta = eta
+        self.seed = seed
+        self.stats: Dict[str, int] = {
+            "halving_runs": 0,
+            "halving_cells": 0,
+            "halving_saved_cells": 0,
+        }
+
+    def budgets(self, size: int) -> List[int]:
+        """
+        Get the number of items of each rung.
+
+        Args:
+            size (int): The number of items in the dataset.
+
+        Returns:
+            List[int]: Increasing budgets, the last one being `size`.
+        """
+        budgets = []
+        budget = self.min_items
+        while budget < size:
+            budgets.append(budget)
+            budget *= self.eta
+        budgets.append(size)
+        return budgets
+
+    def order(self, dataset: List[DatasetItem]) -> List[DatasetItem]:
+        """
+        Shuffle a dataset into the order its items are scored in, see `item_order`.
+
+        Args:
+            dataset (List[DatasetItem]): The dataset.
+
+        Returns:
+            List[DatasetItem]: The shuffled items.
+        """
+        return [dataset[index] for index in item_order(dataset, self.seed)]
+
+    async def run(
+        self,
+        evaluate: Callable[[int, int], Awaitable[float]],
+        sizes: List[int],
+        keep: int = 1,
+    ) -> List[Tuple[float, int, bool]]:
+        """
+        Run successive halving over candidates.
+
+        Args:
+            evaluate (Callable[[int, int], Awaitable[float]]): Scores a candidate, given its
+                index and a budget, on the first `budget` items of its shuffled dataset.
+            sizes (List[int]): The dataset size of each candidate.
+            keep (int): Number of candidates scored on their whole dataset. Defaults to 1.
+
+        Returns:
+            List[Tuple[float, int, bool]]: For each candidate, its score at the last rung it
+                reached, the budget of that rung, and whether it survived to the last rung.
+        """
+        self.stats["halving_runs"] += 1
+        results: List[Optional[Tuple[float, int, bool]]] = [None] * len(sizes)
+        alive = list(range(len(sizes)))
+        budgets = self.budgets(max(sizes, default=0))
+        for rung, budget in enumerate(budgets):
+            last = rung == len(budgets) - 1
+            scores = await asyncio.gather(
+                *[evaluate(index, min(budget, sizes[index])) for index in alive]
+            )
+            for index, score in zip(alive, scores):
+                results[index] = (score, min(budget, sizes[index]), last)
+            if last:
+                break
+            promoted = max(keep, math.ceil(len(alive) / self.eta))
+            if promoted < len(alive):
+                # Stable sort, ties are promoted in candidate order
+                alive = sorted(alive, key=lambda index: -results[index][0])[:promoted]
+
+        spent = sum(budget for _, budget, _ in results)
+        self.stats["halving_cells"] += spent
+        self.stats["halving_saved_cells"] += sum(sizes) - spent
+        return results
+
+    def get_stats(self) -> Dict[str, Any]:
+        return dict(self.stats)
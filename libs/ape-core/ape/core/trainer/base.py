@@ -4,15 +4,19 @@ import inspect
 import json
 import random
 from abc import ABC, abstractmethod
-from typing import Any, List, Optional, Tuple
+from collections import Counter
+from typing import Any, Callable, Collection, Dict, List, Optional, Tuple
 
 from ape.common.generator import BaseGenerator
-from ape.common.global_metric import BaseGlobalMetric
+from ape.common.global_metric import AverageGlobalMetric, BaseGlobalMetric
 from ape.common.metric import BaseMetric
-from ape.common.prompt import Prompt
+from ape.common.prompt import ContextBudgetExceeded, Prompt, TokenBudget
 from ape.common.types import GlobalMetricResult, MetricResult, DatasetItem
 from ape.common.utils.logging import logger
+from ape.common.utils.concurrency import AdaptiveConcurrencyLimiter, bounded_map
+from ape.common.utils.single_flight import SingleFlight
 from ape.core.core_prompts import ApeCorePrompts
+from ape.core.evaluation import EvaluationStore, RacingPolicy, SuccessiveHalving, item_order
 from ape.core.types.report import BaseReport
 from ape.core.utils import extract_prompt
 
@@ -26,6 +30,9 @@ class BaseTrainer(ABC):
         task_description: Optional[str] = None,
         metric_description: Optional[str] = None,
         testmode: Optional[bool] = False,
+        max_concurrency: int = 128,
+        racing_confidence: Optional[float] = None,
+        successive_halving: Optional[SuccessiveHalving] = None,
         **kwargs,
     ):
         self.generate = generator
@@ -35,6 +42,19 @@ class BaseTrainer(ABC):
         self.metric_description = metric_description
         self.dataset_summary = None
         self.testmode = testmode
+        # Shared by every evaluation of this trainer, including concurrent ones. The window
+        # counts items, and a packing generator answers `pack_size` items per request
+        pack_size = getattr(generator, "pack_size", 1)
+        self.concurrency = AdaptiveConcurrencyLimiter(
+            initial_limit=16 * pack_size, max_limit=max_concurrency * pack_size
+        )
+        # Per-item results of every prompt evaluated, reused across evaluations
+        self.evaluation_store = EvaluationStore()
+        # Opt-in early termination of evaluations passed an incumbent score, for example
+        # 0.95. Raced-out prompts get partial scores, so it is off by default
+        self.racing = RacingPolicy(confidence=racing_confidence) if racing_confidence else None
+        # Multi-fidelity selection in _evaluate_candidates, None scores every candidate fully
+        self.successive_halving = successive_halving
 
     @abstractmethod
     async def train(
@@ -59,48 +79,303 @@ class BaseTrainer(ABC):
     async def __call__(
         self, prompt: Prompt, trainset: List[DatasetItem], valset: List[DatasetItem]
     ) -> Tuple[Prompt, BaseReport]:
-        return await self.train(prompt=prompt, trainset=trainset, valset=valset)
+        stats_before = SingleFlight.get_stats()
+        evaluation_before = self.evaluation_store.get_stats()
+        schedulers = [
+            scheduler
+            for scheduler in (self.racing, self.successive_halving)
+            if scheduler is not None
+        ]
+        schedulers_before = [scheduler.get_stats() for scheduler in schedulers]
+        optimized_prompt, report = await self.train(prompt=prompt, trainset=trainset, valset=valset)
+        report.single_flight = {
+            name: {
+                key: value - stats_before.get(name, {}).get(key, 0)
+                for key, value in stats.items()
+                if key != "in_flight"
+            }
+            for name, stats in SingleFlight.get_stats().items()
+        }
+        evaluation = self.evaluation_store.get_stats()
+        for key in self.evaluation_store.stats:
+            evaluation[key] -= evaluation_before[key]
+        cells = evaluation["computed_cells"] + evaluation["reused_cells"]
+        evaluation["reuse_rate"] = evaluation["reused_cells"] / cells if cells else 0.0
+        for scheduler, before in zip(schedulers, schedulers_before):
+            for key, value in scheduler.get_stats().items():
+                evaluation[key] = value - before[key]
+        report.evaluation = evaluation
+        return optimized_prompt, report
+
+    def _fit_fewshot(
+        self, prompt: Prompt, dataset: List[DatasetItem], budget: TokenBudget
+    ) -> Prompt:
+        """
+        Drop the last few-shot examples of a candidate prompt until it fits the context
+        budget with the largest inputs of the dataset.
+
+        The candidate is fitted once, before it is evaluated, so the prompt that is scored
+        is the prompt that is returned, rather than one whose examples are dropped per call.
+
+        Args:
+            prompt (Prompt): The candidate prompt.
+            dataset (List[DatasetItem]): The dataset the candidate is evaluated on.
+            budget (TokenBudget): The budget, with `drop_fewshot` set.
+
+        Returns:
+            Prompt: The prompt, or a copy with fewer few-shot examples.
+        """
+        if not prompt.fewshot or not dataset:
+            return prompt
+        largest = max(dataset, key=lambda item: len(str(item["inputs"])))
+        try:
+            fitted, _ = budget.fit(prompt, largest["inputs"])
+        except ContextBudgetExceeded as e:
+            # Even without examples the largest item does not fit, the generator reports it
+            logger.warning(f"Candidate prompt does not fit its context budget: {e}")
+            return prompt
+        if len(fitted.fewshot) < len(prompt.fewshot):
+            logger.debug(
+                f"Dropped {len(prompt.fewshot) - len(fitted.fewshot)} few-shot examples "
+                "to fit the context budget"
+            )
+        return fitted
 
     async def _evaluate(
-        self, dataset: List[DatasetItem], prompt: Prompt
+        self, dataset: List[DatasetItem], prompt: Prompt, incumbent: Optional[float] = None
     ) -> Tuple[List[Any], List[MetricResult], GlobalMetricResult]:
         """
         Evaluate a dataset using the generator and metric.
 
+        Only the items this prompt has not been evaluated on yet are generated and scored.
+        The others are read from the evaluation store, and the global metric is computed over
+        all of them.
+
+        Callers that only need to know whether the prompt beats a score can pass it as
+        `incumbent` to race the evaluation, if the trainer has a `racing_confidence`. Items
+        are then scored in a random order, and the evaluation stops once the prompt cannot
+        beat the incumbent with the confidence of the trainer's racing policy. A stopped
+        evaluation returns None for the items it did not score, and the mean score of the
+        scored items, which is not above the incumbent.
+
         Args:
             dataset (List[DatasetItem]): The dataset to evaluate.
             prompt (Prompt): The prompt to use for generation.
+            incumbent (Optional[float]): The score to beat, to race the evaluation. Ignored
+                when racing is disabled. Defaults to None, which evaluates the whole dataset.
 
         Returns:
             GlobalMetricResult: The aggregated metric result for the dataset.
         """
-        # Asynchronously generate predictions and compute metrics for each item
-        generate_tasks = [
-            self.generate(
-                prompt=prompt,
-                inputs=item["inputs"],
-            )
-            for item in dataset
+        store = self.evaluation_store
+        prompt_key, item_keys, cells = store.lookup(prompt, dataset)
+
+        # Each item flows into its metric as soon as its generation finishes. The item holds
+        # a slot of the trainer's limiter across both stages, so the window slides over
+        # items instead of waiting on fixed barriers.
+        async def evaluate_item(item: DatasetItem) -> Tuple[Any, MetricResult]:
+            pred = await self.generate(prompt=prompt, inputs=item["inputs"])
+            result = await self.metric(dataset_item=item, pred=pred)
+            return pred, result
+
+        # Items repeated in the dataset are computed once
+        missing = {}
+        for key, item in zip(item_keys, dataset):
+            if key not in cells and key not in missing:
+                missing[key] = item
+
+        race = None
+        if incumbent is not None and self.racing is not None and dataset:
+            if isinstance(self.global_metric, AverageGlobalMetric):
+                race = self.racing.start(len(dataset), incumbent)
+                missing = {key: missing[key] for key in self.racing.order(missing)}
+            else:
+                logger.debug("Racing is skipped, the global metric is not an average")
+
+        if race is not None:
+            multiplicity = Counter(item_keys)
+            for key, (_, result) in cells.items():
+                for _ in range(multiplicity[key]):
+                    race.add(result.score)
+
+        computed = 0
+        if missing and not (race is not None and race.lost):
+            missing_keys = list(missing)
+            items = list(missing.values())
+            results = bounded_map(evaluate_item, items, self.concurrency)
+            try:
+                async for index, (pred, result) in results:
+                    computed += 1
+                    cells[missing_keys[index]] = (pred, result)
+                    store.set(prompt_key, missing_keys[index], pred, result)
+                    if race is not None:
+                        for _ in range(multiplicity[missing_keys[index]]):
+                            race.add(result.score)
+                        if race.lost:
+                            break
+            finally:
+                # Cancels the calls still in flight when the race is lost. A generation or
+                # metric call coalesced with another evaluation keeps running for that one
+                await results.aclose()
+            store.count_computed(computed)
+            logger.debug(f"Concurrency: {self.concurrency.stats()}")
+
+        preds: List[Any] = [cells[key][0] if key in cells else None for key in item_keys]
+        eval_results: List[MetricResult] = [
+            cells[key][1] if key in cells else None for key in item_keys
         ]
-        preds = []
-        for i in range(0, len(generate_tasks), 50):
-            preds.extend(await asyncio.gather(*generate_tasks[i:i+50]))
-
-        metric_tasks = [
-            self.metric(
-                dataset_item=item,
-                pred=pred,
+
+        if race is not None and race.lost:
+            self.racing.count_saved(len(missing) - computed)
+            logger.debug(
+                f"Race lost after {race.count}/{race.size} items: "
+                f"upper bound {race.upper_bound():.3f} <= incumbent {incumbent}"
             )
-            for item, pred in zip(dataset, preds)
-        ]
-        eval_results = []
-        for i in range(0, len(metric_tasks), 50):
-            eval_results.extend(await asyncio.gather(*metric_tasks[i:i+50]))
+            global_score = GlobalMetricResult(
+                score=race.mean,
+                trace={"race": {"items": race.count, "dataset": race.size, "incumbent": incumbent}},
+            )
+            return preds, eval_results, global_score
 
         # Compute the global metric
         global_score = await self.global_metric(eval_results)
         return preds, eval_results, global_score
 
+    async def _evaluate_minibatches(
+        self,
+        dataset: List[DatasetItem],
+        prompt: Prompt,
+        minibatch_size: int,
+        on_minibatch: Callable[[float, int], bool],
+        incumbent: Optional[float] = None,
+        excluded: Optional[Collection[int]] = None,
+    ) -> Tuple[List[Any], List[MetricResult], GlobalMetricResult]:
+        """
+        Evaluate a dataset one minibatch at a time, for callers that stop losing prompts early.
+
+        Minibatches follow a seeded order of the items, see `item_order`, so the partial
+        scores of different prompts after the same number of minibatches cover the same
+        items. Prompts that must not be scored on some items, such as the fewshot examples
+        of the prompt, pass their indices as `excluded`: they are skipped inside the same
+        minibatches instead of shifting the next items into them.
+
+        After each minibatch, `on_minibatch` gets the global score of the items evaluated so
+        far and the index of the minibatch, and returns True to stop. With an `incumbent`,
+        the evaluation is also raced against it between minibatches, as in `_evaluate`.
+
+        Args:
+            dataset (List[DatasetItem]): The dataset to evaluate.
+            prompt (Prompt): The prompt to use for generation.
+            minibatch_size (int): The number of items per minibatch.
+            on_minibatch (Callable[[float, int], bool]): Called after each minibatch.
+            incumbent (Optional[float]): The score to beat, to race the evaluation. Defaults
+                to None.
+            excluded (Optional[Collection[int]]): Indices of the items not to evaluate.
+                Defaults to None.
+
+        Returns:
+            Tuple[List[Any], List[MetricResult], GlobalMetricResult]: As `_evaluate`, with None
+                for the excluded items. A stopped evaluation returns None for the items it did
+                not score, and the score of the items it scored, with a `minibatch` entry in its
+                trace, or a `race` entry if it lost its race.
+        """
+        excluded = set(excluded or ())
+        size = len(dataset) - len(excluded)
+        race = None
+        if incumbent is not None and self.racing is not None and size:
+            if isinstance(self.global_metric, AverageGlobalMetric):
+                race = self.racing.start(size, incumbent)
+        order = item_order(dataset)
+        preds: List[Any] = [None] * len(dataset)
+        eval_results: List[MetricResult] = [None] * len(dataset)
+        scored: List[MetricResult] = []
+        global_score = await self.global_metric([])
+        for step, start in enumerate(range(0, len(order), max(1, minibatch_size))):
+            indices = [
+                index
+                for index in order[start : start + max(1, minibatch_size)]
+                if index not in excluded
+            ]
+            if not indices:
+                # Every item of this minibatch is excluded, there is nothing new to report
+                continue
+            batch_preds, batch_results, _ = await self._evaluate(
+                [dataset[index] for index in indices], prompt
+            )
+            for index, pred, result in zip(indices, batch_preds, batch_results):
+                preds[index] = pred
+                eval_results[index] = result
+            scored.extend(batch_results)
+            global_score = await self.global_metric(scored)
+            if len(scored) == size:
+                break
+            if race is not None:
+                for result in batch_results:
+                    race.add(result.score)
+            if race is not None and race.lost:
+                self.racing.count_saved(size - len(scored))
+                stop = {"race": {"items": len(scored), "dataset": size, "incumbent": incumbent}}
+            elif on_minibatch(global_score.score, step):
+                stop = {"minibatch": {"items": len(scored), "dataset": size}}
+            else:
+                continue
+            global_score = GlobalMetricResult(
+                score=global_score.score, trace={**(global_score.trace or {}), **stop}
+            )
+            break
+        return preds, eval_results, global_score
+
+    async def _evaluate_candidates(
+        self, prompts: List[Prompt], datasets: List[List[DatasetItem]], keep: int = 1
+    ) -> List[GlobalMetricResult]:
+        """
+        Score a population of candidate prompts to select the best ones.
+
+        With a successive halving scheduler, candidates are scored on growing minibatches
+        and only the best `keep` are scored on their whole dataset. The others get the score
+        of the last minibatch they were scored on, capped at the lowest score of the
+        survivors so they never rank above them, and a `halving` entry in their trace.
+        Without a scheduler, every candidate is scored on its whole dataset.
+
+        Args:
+            prompts (List[Prompt]): The candidates.
+            datasets (List[List[DatasetItem]]): The dataset of each candidate.
+            keep (int): Number of candidates to score on their whole dataset. Defaults to 1.
+
+        Returns:
+            List[GlobalMetricResult]: The score of each candidate.
+        """
+        if self.successive_halving is None:
+            results = await asyncio.gather(
+                *[self._evaluate(dataset, prompt) for prompt, dataset in zip(prompts, datasets)]
+            )
+            return [global_result for _, _, global_result in results]
+
+        ordered = [self.successive_halving.order(dataset) for dataset in datasets]
+        global_results: Dict[Tuple[int, int], GlobalMetricResult] = {}
+
+        async def evaluate(index: int, budget: int) -> float:
+            _, _, global_result = await self._evaluate(ordered[index][:budget], prompts[index])
+            global_results[index, budget] = global_result
+            return global_result.score
+
+        outcomes = await self.successive_halving.run(
+            evaluate, [len(dataset) for dataset in datasets], keep=keep
+        )
+        cap = min((score for score, _, survived in outcomes if survived), default=None)
+        scores = []
+        for index, (score, budget, survived) in enumerate(outcomes):
+            if survived:
+                scores.append(global_results[index, budget])
+                continue
+            scores.append(
+                GlobalMetricResult(
+                    score=min(score, cap) if cap is not None else score,
+                    trace={"halving": {"items": budget, "dataset": len(datasets[index])}},
+                )
+            )
+        return scores
+
     async def _generate_task_description(
         self,
         prompt: Prompt,
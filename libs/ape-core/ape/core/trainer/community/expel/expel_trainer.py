@@ -5,7 +5,7 @@ from typing import Any, Dict, List, Literal, Tuple
 from ape.common.generator import BaseGenerator
 from ape.common.global_metric import BaseGlobalMetric
 from ape.common.metric import BaseMetric
-from ape.common.prompt import Prompt
+from ape.common.prompt import Prompt, TokenBudget
 from ape.common.types import MetricResult, DatasetItem
 from ape.common.utils.logging import logger
 from ape.core.core_prompts import ApeCorePrompts
@@ -32,6 +32,8 @@ class ExpelTrainer(BaseTrainer):
         self.success_feedback_generator = ApeCorePrompts.get("expel-success-feedback-generator")
         self.failure_feedback_generator = ApeCorePrompts.get("expel-failure-feedback-generator")
         self.feedback_applier = ApeCorePrompts.get("expel-feedback-applier")
+        # The oldest prompt history is dropped first when the applier call gets too long
+        self.history_budget = TokenBudget(truncate_inputs=["prompt_history"])
 
         random.seed(random_seed)
 
@@ -364,7 +366,8 @@ class ExpelTrainer(BaseTrainer):
                     base_prompt=str(prompt.messages),
                     feedback=feedback,
                     prompt_history=prompt_history_str,
-                    _retry_count=retry_count
+                    _retry_count=retry_count,
+                    token_budget=self.history_budget,
                 )
 
                 new_prompt_message = new_prompt_raw["messages"]
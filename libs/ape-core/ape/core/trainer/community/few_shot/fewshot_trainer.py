@@ -8,7 +8,7 @@ import numpy as np
 from ape.common.generator import BaseGenerator
 from ape.common.global_metric import BaseGlobalMetric
 from ape.common.metric import BaseMetric
-from ape.common.prompt import Prompt
+from ape.common.prompt import Prompt, TokenBudget
 from ape.common.types import MetricResult, DatasetItem
 from ape.common.utils.logging import logger
 from ape.core.trainer.base import BaseTrainer
@@ -34,7 +34,9 @@ class FewShotTrainer(BaseTrainer):
         self.max_labeled_demos = max_labeled_demos
         self.success_score = success_score
         self.num_candidates = num_candidates
-        
+        # Few-shot sets are trimmed from the last example when they overflow the context
+        self.fewshot_budget = TokenBudget(drop_fewshot=True)
+
         random.seed(random_seed)
 
     async def train(
@@ -58,27 +60,55 @@ class FewShotTrainer(BaseTrainer):
 
         fewshot_candidates, fewshot_candidate_indices = await self.create_n_fewshot_demo_sets(trainset, preds, eval_results)
 
-        async def run_iteration(step: int, candidate: List[DatasetItem], indices: List[int]):
+        candidate_prompts = []
+        candidate_datasets = []
+        for candidate, indices in zip(fewshot_candidates, fewshot_candidate_indices):
             temp_prompt = copy.deepcopy(prompt)
             temp_prompt.fewshot = candidate
-            trainset_without_fewshot = [trainset[i] for i in range(len(trainset)) if i not in indices]
-            _, _, global_result = await self._evaluate(trainset_without_fewshot, temp_prompt)
+            temp_prompt = self._fit_fewshot(temp_prompt, trainset, self.fewshot_budget)
+            # Examples are dropped from the last, so only the kept ones leave the dataset
+            indices = indices[: len(temp_prompt.fewshot)]
+            candidate_prompts.append(temp_prompt)
+            candidate_datasets.append(
+                [trainset[i] for i in range(len(trainset)) if i not in indices]
+            )
+
+        # With a successive halving scheduler, only the best candidate is scored on the
+        # whole trainset
+        global_results = await self._evaluate_candidates(candidate_prompts, candidate_datasets)
+
+        async def run_iteration(step: int, candidate: List[DatasetItem]):
+            temp_prompt = candidate_prompts[step]
+            candidate = temp_prompt.fewshot
+            global_result = global_results[step]
+            # Input tokens of the prompt without the item inputs, i.e. the cost of the fewshot set
+            tokens = temp_prompt.count_tokens()
+            score_report = {"step": step, "score": global_result.score, "tokens": tokens}
+            if global_result.trace and "halving" in global_result.trace:
+                score_report["items"] = global_result.trace["halving"]["items"]
 
             if self.testmode:
                 _, _, val_global_result  = await self._evaluate(valset, temp_prompt)
-                report.scores.append({"step": step, "score": global_result.score, "val_score": val_global_result.score})
-            else:
-                report.scores.append({"step": step, "score": global_result.score})
+                score_report["val_score"] = val_global_result.score
+            report.scores.append(score_report)
             report.choices.append({"step": step, "fewshot": candidate})
 
             logger.debug(f"Step {step} completed. Score: {global_result.score}")
-            return global_result.score, candidate
-
-        results = await asyncio.gather(*[run_iteration(i, candidate, indices) for i, (candidate, indices) in enumerate(zip(fewshot_candidates, fewshot_candidate_indices))])
-
-        for score, fewshot in results:
-            if score > best_score:
+            return global_result.score, tokens, candidate
+
+        results = await asyncio.gather(
+            *[run_iteration(i, candidate) for i, candidate in enumerate(fewshot_candidates)]
+        )
+
+        # Among equally scoring fewshot sets, the cheapest one wins. Candidates dropped by
+        # successive halving were not scored on the whole trainset and are not eligible
+        best_tokens = float("inf")
+        for (score, tokens, fewshot), global_result in zip(results, global_results):
+            if global_result.trace and "halving" in global_result.trace:
+                continue
+            if score > best_score or (score == best_score and tokens < best_tokens):
                 best_score = score
+                best_tokens = tokens
                 best_fewshot = fewshot
 
         prompt.fewshot = best_fewshot
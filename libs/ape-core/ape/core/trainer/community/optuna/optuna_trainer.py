@@ -2,7 +2,7 @@ import asyncio
 import json
 import random
 import numpy as np
-from typing import Any, Dict, List, Tuple
+from typing import Any, Dict, List, Optional, Tuple
 
 import optuna
 
@@ -13,9 +13,11 @@ from ape.common.prompt.prompt_base import Prompt, format_fewshot
 from ape.common.prompt.utils import format_fewshot
 from ape.common.types import GlobalMetricResult, MetricResult, DatasetItem
 from ape.core.core_prompts import ApeCorePrompts
+from ape.core.evaluation.pruning import PrunerName, make_pruner
+from ape.core.evaluation.study import AsyncStudyOptimizer, create_study
 from ape.core.trainer.base import BaseTrainer
 from ape.core.types.report import OptunaTrainerReport
-from ape.core.utils import extract_prompt, get_response_format_instructions, run_async
+from ape.core.utils import extract_prompt, get_response_format_instructions
 
 
 class OptunaTrainer(BaseTrainer):
@@ -28,6 +30,9 @@ class OptunaTrainer(BaseTrainer):
         num_candidates: int = 10,
         max_steps: int = 20,
         minibatch_size: int = 25,
+        minibatch_full_eval_steps: int = 10,
+        pruner: Optional[PrunerName] = "median",
+        trial_concurrency: int = 4,
         **kwargs,
     ):
         """
@@ -45,6 +50,8 @@ class OptunaTrainer(BaseTrainer):
             view_data_batch_size (int, optional): Batch size for viewing data. Defaults to 10.
             minibatch_size (int, optional): Size of minibatches for evaluation. Defaults to 25.
             minibatch_full_eval_steps (int, optional): Number of steps for full evaluation on minibatches. Defaults to 10.
+            pruner (Optional[PrunerName], optional): Optuna pruner of the trials scored on minibatches, "median", "successive_halving" or None. Defaults to "median".
+            trial_concurrency (int, optional): Number of trials evaluated concurrently. Defaults to 4.
             **kwargs: Additional keyword arguments.
         """
         super().__init__(
@@ -57,6 +64,9 @@ class OptunaTrainer(BaseTrainer):
         self.num_candidates = num_candidates
         self.max_steps = max_steps
         self.minibatch_size = minibatch_size
+        self.minibatch_full_eval_steps = minibatch_full_eval_steps
+        self.pruner = pruner
+        self.trial_concurrency = trial_concurrency
 
         random.seed(self.random_seed)
         np.random.seed(self.random_seed)
@@ -117,8 +127,12 @@ class OptunaTrainer(BaseTrainer):
 
         # Initialize trial_logs and total_eval_calls
         trial_logs: Dict[int, Dict[str, Any]] = {}
+        # Trials are scored on minibatches and pruned when the trainset is larger than one
+        use_minibatches = bool(self.minibatch_size) and self.minibatch_size < len(trainset)
+        # Pruned candidates awaiting a full evaluation, by trial number
+        pruned_candidates: Dict[int, Tuple[float, Prompt]] = {}
 
-        def objective(trial: optuna.Trial) -> float:
+        async def objective(trial: optuna.Trial) -> float:
             nonlocal best_prompt, best_score, trial_logs, eval_based_candidates, prompt_engineering_based_candidates
 
             trial_logs[trial.number] = {}
@@ -149,13 +163,11 @@ class OptunaTrainer(BaseTrainer):
 
             while retry_count < max_retries:
                 try:
-                    merged_prompt_raw = run_async(
-                        self.merge_prompts(
-                            basic_prompt=str(prompt.messages),
-                            instruction_improved_prompt=str(selected_eval_based_candidate.messages),
-                            format_improved_prompt=str(selected_prompt_engineering_candidate.messages),
-                            _retry_count=retry_count
-                        )
+                    merged_prompt_raw = await self.merge_prompts(
+                        basic_prompt=str(prompt.messages),
+                        instruction_improved_prompt=str(selected_eval_based_candidate.messages),
+                        format_improved_prompt=str(selected_prompt_engineering_candidate.messages),
+                        _retry_count=retry_count
                     )
                     merged_prompt_message = merged_prompt_raw["messages"]   
                 
@@ -174,38 +186,76 @@ class OptunaTrainer(BaseTrainer):
 
             # Evaluate the candidate prompt on the train set
             try:
-                preds, eval_results, global_result = run_async(
-                    self._evaluate(
+                if use_minibatches:
+                    # Report the running score after each minibatch, and stop when pruned or,
+                    # with racing enabled, when the candidate cannot beat the best score
+                    def on_minibatch(value: float, step: int) -> bool:
+                        trial.report(value, step)
+                        return trial.should_prune()
+
+                    preds, eval_results, global_result = await self._evaluate_minibatches(
                         trainset,
                         candidate_prompt,
+                        self.minibatch_size,
+                        on_minibatch,
+                        incumbent=best_score,
+                    )
+                else:
+                    # With racing enabled, candidates that cannot beat the best score stop early
+                    preds, eval_results, global_result = await self._evaluate(
+                        trainset,
+                        candidate_prompt,
+                        incumbent=best_score,
                     )
-                )
                 score = global_result.score
             except Exception as e:
                 # If evaluation fails, assign a very low score
                 trial_logs[trial.number]["evaluation_error"] = str(e)
                 return float("-inf")
 
+            trace = global_result.trace or {}
+            partial = trace.get("race") or trace.get("minibatch")
+            pruned = "minibatch" in trace
+            num_eval_calls = partial["items"] if partial else len(trainset)
+
             # Update trial logs
             trial_logs[trial.number].update(
                 {
                     "score": score,
-                    "num_eval_calls": len(trainset),
+                    "num_eval_calls": num_eval_calls,
+                    "raced_out": partial is not None and not pruned,
+                    "pruned": pruned,
+                    "pruned_eval_calls": len(trainset) - num_eval_calls if pruned else 0,
                 }
             )
 
-            # Update best prompt if necessary
-            if score > best_score:
+            # Update best prompt if necessary, a pruned trial only has a partial score
+            if pruned:
+                report.pruned_trials += 1
+                report.pruned_eval_calls += len(trainset) - num_eval_calls
+                pruned_candidates[trial.number] = (score, candidate_prompt)
+                trial_logs[trial.number]["best_score_update"] = False
+            elif score > best_score:
                 best_score = score
                 best_prompt = candidate_prompt.deepcopy()
                 trial_logs[trial.number]["best_score_update"] = True
             else:
                 trial_logs[trial.number]["best_score_update"] = False
 
+            # Periodically give the most promising pruned candidate a full evaluation
+            full_eval_step = self.minibatch_full_eval_steps and (
+                (trial.number + 1) % self.minibatch_full_eval_steps == 0
+            )
+            if use_minibatches and full_eval_step:
+                await evaluate_top_pruned_candidate()
+
             # Update report
             report.trial_logs = trial_logs
+            if pruned:
+                report.scores.append({"step": trial.number, "score": score, "pruned": True})
+                raise optuna.TrialPruned()
             if self.testmode:
-                _, _, val_global_result  = run_async(self._evaluate(valset, candidate_prompt))
+                _, _, val_global_result  = await self._evaluate(valset, candidate_prompt)
                 report.scores.append({"step": trial.number, "score": score, "val_score": val_global_result.score})
             else:
                 report.scores.append(
@@ -217,18 +267,39 @@ class OptunaTrainer(BaseTrainer):
 
             # If score meets or exceeds the goal, stop the study
             if score >= 1.0:
-                trial.study.stop()
+                optimizer.stop()
 
             return score
 
+        async def evaluate_top_pruned_candidate():
+            nonlocal best_prompt, best_score
+            if not pruned_candidates:
+                return
+            number = max(pruned_candidates, key=lambda n: pruned_candidates[n][0])
+            _, candidate_prompt = pruned_candidates.pop(number)
+            # It resumes from the cells scored in its trial, raced against the best score
+            # when racing is enabled
+            _, _, global_result = await self._evaluate(
+                trainset, candidate_prompt, incumbent=best_score
+            )
+            trial_logs[number]["full_eval_score"] = global_result.score
+            if global_result.score > best_score:
+                best_score = global_result.score
+                best_prompt = candidate_prompt.deepcopy()
+                trial_logs[number]["best_score_update"] = True
+
         # Initialize Optuna study
-        study = optuna.create_study(
-            direction="maximize",
-            sampler=optuna.samplers.TPESampler(seed=self.random_seed, multivariate=True),
+        study = create_study(
+            seed=self.random_seed,
+            trial_concurrency=self.trial_concurrency,
+            pruner=make_pruner(self.pruner if use_minibatches else None),
         )
+        optimizer = AsyncStudyOptimizer(study, trial_concurrency=self.trial_concurrency)
 
         # Optimize the study
-        await asyncio.to_thread(study.optimize, objective, n_trials=self.max_steps)
+        await optimizer.optimize(objective, n_trials=self.max_steps)
+        if use_minibatches and best_score < 1.0:
+            await evaluate_top_pruned_candidate()
         report.best_score = best_score
         return best_prompt, report
 
@@ -130,16 +130,10 @@ class TextGradEvoTrainer(BaseTrainer):
                     for text_gradient in text_gradients
                 ]   
             )
-            parent_generation_scores = await asyncio.gather(
-                *[
-                    self._evaluate(dataset=trainset, prompt=prompt)
-                    for prompt in parent_generation_prompts
-                ]
+            parent_generation_scores, best_score_index = await self.score_generation(
+                parent_generation_prompts, trainset, best_trainset_score
             )
-            parent_generation_scores = [score[2].score for score in parent_generation_scores]
-            
-            best_score = max(parent_generation_scores)
-            best_score_index = parent_generation_scores.index(best_score)
+            best_score = parent_generation_scores[best_score_index]
             if best_score > best_trainset_score:
                 best_prompt = parent_generation_prompts[best_score_index]
                 best_trainset_score = best_score
@@ -176,17 +170,12 @@ class TextGradEvoTrainer(BaseTrainer):
                             parent_generation_prompts,
                             parent_generation_scores
                         )
-                        new_generation_scores = await asyncio.gather(
-                            *[
-                                self._evaluate(dataset=trainset, prompt=prompt)
-                                for prompt in new_generation_prompts
-                            ]
+                        new_generation_scores, best_score_index = await self.score_generation(
+                            new_generation_prompts, trainset, best_trainset_score
                         )
-                        new_generation_scores = [score[2].score for score in new_generation_scores]
-                        
-                        best_score = max(new_generation_scores)
+                        best_score = new_generation_scores[best_score_index]
                         if best_score > best_trainset_score:
-                            best_prompt = new_generation_prompts[new_generation_scores.index(best_score)]
+                            best_prompt = new_generation_prompts[best_score_index]
                             best_trainset_score = best_score
                             evolution_step_info = {
                                 "best_score": best_trainset_score,
@@ -240,6 +229,47 @@ class TextGradEvoTrainer(BaseTrainer):
                 
         return best_prompt, report
 
+    async def score_generation(
+        self, prompts: List[Prompt], trainset: List[DatasetItem], best_score: float
+    ) -> Tuple[List[float], int]:
+        """
+        Score a generation of prompts on the trainset.
+
+        With a successive halving scheduler only the best prompt is scored on the whole
+        trainset. Otherwise each prompt is raced against the best score when the trainer
+        has racing enabled. Either way, the prompts that are dropped early keep the score of
+        the items they were scored on as their fitness.
+
+        Args:
+            prompts (List[Prompt]): The generation.
+            trainset (List[DatasetItem]): The training dataset.
+            best_score (float): The best trainset score so far.
+
+        Returns:
+            Tuple[List[float], int]: The score of each prompt, and the index of the best
+                prompt among those scored on the whole trainset.
+        """
+        if self.successive_halving is not None:
+            global_results = await self._evaluate_candidates(
+                prompts, [trainset] * len(prompts)
+            )
+        else:
+            results = await asyncio.gather(
+                *[
+                    self._evaluate(dataset=trainset, prompt=prompt, incumbent=best_score)
+                    for prompt in prompts
+                ]
+            )
+            global_results = [global_result for _, _, global_result in results]
+        scores = [global_result.score for global_result in global_results]
+        partial = [
+            bool(result.trace) and ("race" in result.trace or "halving" in result.trace)
+            for result in global_results
+        ]
+        # A full score beats a partial one with the same value
+        best_index = max(range(len(prompts)), key=lambda j: (scores[j], not partial[j]))
+        return scores, best_index
+
     async def _text_gradient_generator(
         self,
         prompt: Prompt,
@@ -6,6 +6,7 @@ from collections import deque
 from tqdm import tqdm
 from typing import Any, Dict, List, Literal, Optional, Tuple
 from ape.common.prompt.prompt_base import Prompt
+from ape.common.prompt.token_budget import TokenBudget
 from ape.common.types import GlobalMetricResult, MetricResult, DatasetItem
 from ape.common.generator import BaseGenerator
 from ape.common.global_metric import BaseGlobalMetric
@@ -35,6 +36,8 @@ class TextGradientTrainer(BaseTrainer):
 
         self.text_gradient_generator_prompt = ApeCorePrompts.get("text-gradient-generator")
         self.text_gradient_applier_prompt = ApeCorePrompts.get("text-gradient-applier")
+        # The oldest prompt history is dropped first when the applier call gets too long
+        self.history_budget = TokenBudget(truncate_inputs=["prompt_history"])
 
         random.seed(random_seed)
 
@@ -273,7 +276,8 @@ class TextGradientTrainer(BaseTrainer):
                     base_prompt=str(prompt.messages),
                     feedback=text_gradient,
                     prompt_history=prompt_history_str,
-                    _retry_count=retry_count
+                    _retry_count=retry_count,
+                    token_budget=self.history_budget,
                 )
 
                 new_prompt_message = new_prompt_raw["messages"]
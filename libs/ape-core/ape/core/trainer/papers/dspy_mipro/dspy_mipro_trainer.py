@@ -8,14 +8,16 @@ import optuna
 from ape.common.generator import BaseGenerator
 from ape.common.global_metric import BaseGlobalMetric
 from ape.common.metric import BaseMetric
-from ape.common.prompt import Prompt
+from ape.common.prompt import Prompt, TokenBudget
 from ape.common.prompt.utils import format_fewshot
 from ape.common.types import MetricResult, DatasetItem
 from ape.common.utils import logger
 from ape.core.core_prompts import ApeCorePrompts
+from ape.core.evaluation.pruning import PrunerName, make_pruner
+from ape.core.evaluation.study import AsyncStudyOptimizer, create_study
 from ape.core.trainer.base import BaseTrainer
 from ape.core.types.report import OptunaTrainerReport
-from ape.core.utils import extract_prompt, get_response_format_instructions, run_async
+from ape.core.utils import extract_prompt, get_response_format_instructions
 
 
 class DspyMiproTrainer(BaseTrainer):
@@ -31,6 +33,9 @@ class DspyMiproTrainer(BaseTrainer):
         max_bootstrapped_demos: int = 5,
         max_labeled_demos: int = 2,
         success_score: float = 1.0,
+        minibatch_full_eval_steps: int = 10,
+        pruner: Optional[PrunerName] = "median",
+        trial_concurrency: int = 4,
         **kwargs,
     ):
         """
@@ -44,6 +49,9 @@ class DspyMiproTrainer(BaseTrainer):
             num_candidates (int, optional): Number of candidate prompts to generate. Defaults to 10.
             max_steps (int, optional): Maximum number of optimization steps. Defaults to 30.
             minibatch_size (int, optional): Size of minibatches for evaluation. Defaults to 25.
+            minibatch_full_eval_steps (int, optional): Every this many trials, the most promising pruned candidate is evaluated on the full trainset. Defaults to 10.
+            pruner (Optional[PrunerName], optional): Optuna pruner of the trials scored on minibatches, "median", "successive_halving" or None. Defaults to "median".
+            trial_concurrency (int, optional): Number of trials evaluated concurrently. Defaults to 4.
             max_bootstrapped_demos (int, optional): Maximum number of bootstrapped demos. Defaults to 5.
             max_labeled_demos (int, optional): Maximum number of labeled demos. Defaults to 2.
             success_score (float, optional): Score threshold for sampling. Defaults to 1.0.
@@ -59,9 +67,14 @@ class DspyMiproTrainer(BaseTrainer):
         self.num_candidates = num_candidates
         self.max_steps = max_steps
         self.minibatch_size = minibatch_size
+        self.minibatch_full_eval_steps = minibatch_full_eval_steps
+        self.pruner = pruner
+        self.trial_concurrency = trial_concurrency
         self.max_bootstrapped_demos = max_bootstrapped_demos
         self.max_labeled_demos = max_labeled_demos
         self.success_score = success_score
+        # Few-shot sets are trimmed from the last example when they overflow the context
+        self.fewshot_budget = TokenBudget(drop_fewshot=True)
 
         random.seed(self.random_seed)
         np.random.seed(self.random_seed)
@@ -127,8 +140,12 @@ class DspyMiproTrainer(BaseTrainer):
         best_prompt = prompt.deepcopy()
 
         trial_logs: Dict[int, Dict[str, Any]] = {}
+        # Trials are scored on minibatches and pruned when the trainset is larger than one
+        use_minibatches = bool(self.minibatch_size) and self.minibatch_size < len(trainset)
+        # Pruned candidates awaiting a full evaluation, with their dataset, by trial number
+        pruned_candidates: Dict[int, Tuple[float, Prompt, List[DatasetItem]]] = {}
 
-        def objective(trial: optuna.Trial) -> float:
+        async def objective(trial: optuna.Trial) -> float:
             nonlocal best_prompt, best_score, trial_logs
 
             logger.debug(f"Starting trial {trial.number}")
@@ -152,32 +169,75 @@ class DspyMiproTrainer(BaseTrainer):
             candidate_prompt = prompt.deepcopy()
             candidate_prompt.messages = selected_instruction_candidate.messages
             candidate_prompt.fewshot = selected_fewshot
+            candidate_prompt = self._fit_fewshot(candidate_prompt, trainset, self.fewshot_budget)
+            # Examples are dropped from the last, so the items dropped from the prompt are
+            # evaluated again like the rest of the trainset
+            selected_fewshot_indices = selected_fewshot_indices[: len(candidate_prompt.fewshot)]
 
+            trainset_without_fewshot = [
+                trainset[i] for i in range(len(trainset)) if i not in selected_fewshot_indices
+            ]
             try:
-                trainset_without_fewshot = [
-                    trainset[i] for i in range(len(trainset)) if i not in selected_fewshot_indices
-                ]
                 logger.debug(f"Evaluating candidate prompt for trial {trial.number}")
-                preds, eval_results, global_result = run_async(
-                    self._evaluate(
+                if use_minibatches:
+                    # Report the running score after each minibatch, and stop when pruned or,
+                    # with racing enabled, when the candidate cannot beat the best score
+                    def on_minibatch(value: float, step: int) -> bool:
+                        trial.report(value, step)
+                        return trial.should_prune()
+
+                    # Minibatches are taken from the whole trainset and skip the fewshot
+                    # items, so every trial scores the same items at the same step
+                    preds, eval_results, global_result = await self._evaluate_minibatches(
+                        trainset,
+                        candidate_prompt,
+                        self.minibatch_size,
+                        on_minibatch,
+                        incumbent=best_score,
+                        excluded=selected_fewshot_indices,
+                    )
+                else:
+                    # With racing enabled, candidates that cannot beat the best score stop early
+                    preds, eval_results, global_result = await self._evaluate(
                         trainset_without_fewshot,
                         candidate_prompt,
+                        incumbent=best_score,
                     )
-                )
                 score = global_result.score
             except Exception as e:
                 logger.error(f"Error in trial {trial.number}: {e}")
                 trial_logs[trial.number]["evaluation_error"] = str(e)
                 return float("-inf")
 
+            trace = global_result.trace or {}
+            partial = trace.get("race") or trace.get("minibatch")
+            pruned = "minibatch" in trace
+            num_eval_calls = partial["items"] if partial else len(trainset_without_fewshot)
+
             trial_logs[trial.number].update(
                 {
                     "score": score,
-                    "num_eval_calls": len(trainset_without_fewshot),
+                    "num_eval_calls": num_eval_calls,
+                    "raced_out": partial is not None and not pruned,
+                    "pruned": pruned,
+                    "pruned_eval_calls": (
+                        len(trainset_without_fewshot) - num_eval_calls if pruned else 0
+                    ),
                 }
             )
 
-            if score > best_score:
+            # A pruned trial only has a partial score
+            if pruned:
+                logger.debug(f"Trial {trial.number} pruned after {num_eval_calls} items")
+                report.pruned_trials += 1
+                report.pruned_eval_calls += len(trainset_without_fewshot) - num_eval_calls
+                pruned_candidates[trial.number] = (
+                    score,
+                    candidate_prompt,
+                    trainset_without_fewshot,
+                )
+                trial_logs[trial.number]["best_score_update"] = False
+            elif score > best_score:
                 logger.info(f"New best score: {score} (trial {trial.number})")
                 best_score = score
                 best_prompt = candidate_prompt.deepcopy()
@@ -185,27 +245,60 @@ class DspyMiproTrainer(BaseTrainer):
             else:
                 trial_logs[trial.number]["best_score_update"] = False
 
+            # Periodically give the most promising pruned candidate a full evaluation
+            full_eval_step = self.minibatch_full_eval_steps and (
+                (trial.number + 1) % self.minibatch_full_eval_steps == 0
+            )
+            if use_minibatches and full_eval_step:
+                await evaluate_top_pruned_candidate()
+
             report.trial_logs = trial_logs
+            if pruned:
+                report.scores.append({"step": trial.number, "score": score, "pruned": True})
+                raise optuna.TrialPruned()
             if self.testmode:
-                _, _, val_global_result  = run_async(self._evaluate(valset, candidate_prompt))
+                _, _, val_global_result  = await self._evaluate(valset, candidate_prompt)
                 report.scores.append({"step": trial.number, "score": score, "val_score": val_global_result.score})
             else:
                 report.scores.append({"step": trial.number, "score": score})
 
             if score >= 1.0:
                 logger.info(f"Perfect score achieved in trial {trial.number}")
-                trial.study.stop()
+                optimizer.stop()
 
             return score
 
+        async def evaluate_top_pruned_candidate():
+            nonlocal best_prompt, best_score
+            if not pruned_candidates:
+                return
+            number = max(pruned_candidates, key=lambda n: pruned_candidates[n][0])
+            _, candidate_prompt, dataset = pruned_candidates.pop(number)
+            logger.debug(f"Full evaluation of pruned trial {number}")
+            # It resumes from the cells scored in its trial, raced against the best score
+            # when racing is enabled
+            _, _, global_result = await self._evaluate(
+                dataset, candidate_prompt, incumbent=best_score
+            )
+            trial_logs[number]["full_eval_score"] = global_result.score
+            if global_result.score > best_score:
+                logger.info(f"New best score: {global_result.score} (trial {number})")
+                best_score = global_result.score
+                best_prompt = candidate_prompt.deepcopy()
+                trial_logs[number]["best_score_update"] = True
+
         logger.debug("Creating Optuna study")
-        study = optuna.create_study(
-            direction="maximize",
-            sampler=optuna.samplers.TPESampler(seed=self.random_seed, multivariate=True),
+        study = create_study(
+            seed=self.random_seed,
+            trial_concurrency=self.trial_concurrency,
+            pruner=make_pruner(self.pruner if use_minibatches else None),
         )
+        optimizer = AsyncStudyOptimizer(study, trial_concurrency=self.trial_concurrency)
 
         logger.debug(f"Starting optimization with {self.max_steps} trials")
-        await asyncio.to_thread(study.optimize, objective, n_trials=self.max_steps)
+        await optimizer.optimize(objective, n_trials=self.max_steps)
+        if use_minibatches and best_score < 1.0:
+            await evaluate_top_pruned_candidate()
 
         report.best_score = best_score
         logger.info(f"Optimization completed. Best score: {best_score}")
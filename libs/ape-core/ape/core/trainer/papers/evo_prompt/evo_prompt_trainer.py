@@ -90,11 +90,10 @@ class EvoPromptTrainer(BaseTrainer):
             logger.info(f"Step {step}: Best Score = {best_score}, Avg Score = {avg_score}")
             
             if self.testmode:
-                semaphore = asyncio.Semaphore(5)
-                async def eval_with_semaphore(p):
-                    async with semaphore:
-                        return await self._evaluate(valset, self.indices2prompts[p])
-                val_eval_tasks = [eval_with_semaphore(p) for p in self.population]
+                # Calls are bounded by the trainer's adaptive concurrency limiter
+                val_eval_tasks = [
+                    self._evaluate(valset, self.indices2prompts[p]) for p in self.population
+                ]
                 val_results = await asyncio.gather(*val_eval_tasks)
                 val_scores = [global_score.score for _, _, global_score in val_results]
                 best_val_score = max(val_scores)
@@ -150,27 +149,18 @@ class EvoPromptTrainer(BaseTrainer):
         self.population = [await self._add_prompt(p) for p in paraphrased_prompts]
         self.prompts2mark = {p: "paraphrased_initial" for p in self.population}
 
-        # Evaluate the initial population in parallel using a semaphore
-        semaphore = asyncio.Semaphore(5)  # Adjust the value as needed
-        async def evaluate_with_semaphore(p):
-            async with semaphore:
-                return await self._evaluate(trainset, self.indices2prompts[p])
-        
+        # Evaluate the initial population in parallel, calls are bounded by the
+        # trainer's adaptive concurrency limiter
         eval_tasks = [
-            evaluate_with_semaphore(p) for p in self.population
+            self._evaluate(trainset, self.indices2prompts[p]) for p in self.population
         ]
         eval_results = await asyncio.gather(*eval_tasks)
         for p, (_, _, global_score) in zip(self.population, eval_results):
             self.evaluated_prompts[p] = global_score.score
         
         if self.testmode:
-            semaphore = asyncio.Semaphore(5)  # Limit concurrent evaluations to 5
-            async def evaluate_with_semaphore(p):
-                async with semaphore:
-                    return await self._evaluate(valset, self.indices2prompts[p])
-            
             val_eval_tasks = [
-                evaluate_with_semaphore(p) for p in self.population
+                self._evaluate(valset, self.indices2prompts[p]) for p in self.population
             ]
             val_results = await asyncio.gather(*val_eval_tasks)
             val_scores = [global_score.score for _, _, global_score in val_results]
@@ -196,21 +186,27 @@ class EvoPromptTrainer(BaseTrainer):
             })
         report.best_score = max(self.evaluated_prompts.values())
 
-    async def evaluate_population(self, trainset: List[DatasetItem]):
-        # Evaluate each prompt in the population using a semaphore
-        semaphore = asyncio.Semaphore(5)  # Limit concurrent evaluations to 5
-        eval_tasks = []
-
-        async def evaluate_with_semaphore(prompt_index):
-            async with semaphore:
-                return prompt_index, await self._evaluate(trainset, self.indices2prompts[prompt_index])
-
-        for prompt_index in self.population:
-            if prompt_index not in self.evaluated_prompts:
-                eval_tasks.append(evaluate_with_semaphore(prompt_index))
+    def selection_threshold(self) -> Optional[float]:
+        """
+        Score a new prompt has to beat to enter the next population, used to race its
+        evaluation. Only top-k selection discards prompts on their score.
+        """
+        if self.child_selection_mode != 'topk' or len(self.evaluated_prompts) < self.popsize:
+            return None
+        return sorted(self.evaluated_prompts.values(), reverse=True)[self.popsize - 1]
 
-        results = await asyncio.gather(*eval_tasks) if eval_tasks else []
-        for (prompt_index, _), (_, _, global_score) in zip(eval_tasks, results):
+    async def evaluate_population(self, trainset: List[DatasetItem]):
+        # Evaluate each new prompt in the population, calls are bounded by the trainer's
+        # adaptive concurrency limiter
+        prompt_indices = [p for p in self.population if p not in self.evaluated_prompts]
+        threshold = self.selection_threshold()
+        results = await asyncio.gather(
+            *[
+                self._evaluate(trainset, self.indices2prompts[p], incumbent=threshold)
+                for p in prompt_indices
+            ]
+        )
+        for prompt_index, (_, _, global_score) in zip(prompt_indices, results):
             self.evaluated_prompts[prompt_index] = global_score.score
 
     async def generate_new_prompts(self, trainset: List[DatasetItem]):
@@ -227,6 +223,8 @@ class EvoPromptTrainer(BaseTrainer):
         if self.child_selection_mode == 'child':
             # Completely replace the population with new children
             new_population = self.new_children
+        elif self.child_selection_mode == 'topk' and self.successive_halving is not None:
+            new_population = await self.select_topk(trainset)
         elif self.child_selection_mode == 'topk':
             # Select the top `popsize` prompts based on evaluated scores
             sorted_prompts = sorted(
@@ -239,6 +237,38 @@ class EvoPromptTrainer(BaseTrainer):
             raise ValueError(f"Unknown child selection mode: {self.child_selection_mode}")
         self.population = new_population
 
+    def defers_child_evaluation(self) -> bool:
+        """Whether new children are scored together by successive halving in `select_topk`."""
+        return self.successive_halving is not None and self.child_selection_mode == 'topk'
+
+    async def select_topk(self, trainset: List[DatasetItem]) -> List[int]:
+        """
+        Select the next population among the current one and the new children with
+        successive halving. Members of the current population are already scored on the
+        trainset, so their minibatch scores are read from the evaluation store.
+
+        Returns:
+            List[int]: The indices of the next population.
+        """
+        candidates = list(self.population)
+        for child in self.new_children:
+            if child not in candidates:
+                candidates.append(child)
+        global_results = await self._evaluate_candidates(
+            [self.indices2prompts[p] for p in candidates],
+            [trainset] * len(candidates),
+            keep=self.popsize,
+        )
+        survivors = []
+        for p, global_result in zip(candidates, global_results):
+            dropped = global_result.trace and "halving" in global_result.trace
+            if p not in self.evaluated_prompts or not dropped:
+                self.evaluated_prompts[p] = global_result.score
+            if not dropped:
+                survivors.append(p)
+        survivors.sort(key=lambda p: self.evaluated_prompts[p], reverse=True)
+        return survivors[:self.popsize]
+
     async def generate_new_prompts_ga(self, trainset: List[DatasetItem]):
         k = self.popsize
         fitness = np.array([self.evaluated_prompts[prompt_index] for prompt_index in self.population])
@@ -277,8 +307,13 @@ class EvoPromptTrainer(BaseTrainer):
             self.prompts2mark[child_prompt_index] = "evolved"
             
             # Evaluate the new prompt if not already evaluated
-            if child_prompt_index not in self.evaluated_prompts:
-                _, _, global_score = await self._evaluate(trainset, child_prompt)
+            if (
+                child_prompt_index not in self.evaluated_prompts
+                and not self.defers_child_evaluation()
+            ):
+                _, _, global_score = await self._evaluate(
+                    trainset, child_prompt, incumbent=self.selection_threshold()
+                )
                 self.evaluated_prompts[child_prompt_index] = global_score.score
             
             return child_prompt_index
@@ -316,8 +351,13 @@ class EvoPromptTrainer(BaseTrainer):
             self.prompts2mark[de_prompt_index] = "evolved"
 
             # Evaluate the new prompt if not already evaluated
-            if de_prompt_index not in self.evaluated_prompts:
-                _, _, global_score = await self._evaluate(trainset, de_prompt)
+            if (
+                de_prompt_index not in self.evaluated_prompts
+                and not self.defers_child_evaluation()
+            ):
+                _, _, global_score = await self._evaluate(
+                    trainset, de_prompt, incumbent=self.selection_threshold()
+                )
                 self.evaluated_prompts[de_prompt_index] = global_score.score
 
             return de_prompt_index
@@ -346,8 +386,13 @@ class EvoPromptTrainer(BaseTrainer):
         for p in paraphrased_prompts:
             p_index = await self._add_prompt(p)
             self.prompts2mark[p_index] = "paraphrased"
-            if p_index not in self.evaluated_prompts:
-                _, _, global_score = await self._evaluate(trainset, p)
+            if (
+                p_index not in self.evaluated_prompts
+                and not self.defers_child_evaluation()
+            ):
+                _, _, global_score = await self._evaluate(
+                    trainset, p, incumbent=self.selection_threshold()
+                )
                 self.evaluated_prompts[p_index] = global_score.score
             new_children.append(p_index)
 
@@ -5,17 +5,26 @@ from pydantic import BaseModel
 class BaseReport(BaseModel):
     scores: List[Dict[str, Any]]
     best_score: float = 0.0
+    # Calls and coalesced calls per SingleFlight ("prompt", "generator", "metric") during training
+    single_flight: Dict[str, Dict[str, int]] = {}
+    # Evaluation cells (prompt, dataset item) computed and reused from the EvaluationStore,
+    # and cells saved by racing and successive halving
+    evaluation: Dict[str, Any] = {}
 
 
 class TextGradientTrainerReport(BaseReport):
     text_gradients: List[Dict[str, Any]]
 
+
 class ExpelTrainerReport(BaseReport):
     feedbacks: List[Dict[str, Any]]
 
 
 class OptunaTrainerReport(BaseReport):
     trial_logs: Dict[str, Any]
+    # Trials pruned after a minibatch, and the evaluation calls they did not make
+    pruned_trials: int = 0
+    pruned_eval_calls: int = 0
 
 
 class FewShotTrainerReport(BaseReport):
@@ -26,5 +35,6 @@ class FewShotTrainerReport(BaseReport):
 class EvoPromptReport(BaseReport):
     pass
 
+
 class TextGradEvoTrainerReport(BaseReport):
     evolution_steps: List[Dict[str, Any]]